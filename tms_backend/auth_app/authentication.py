@@ -1,6 +1,16 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.tokens import BlacklistedToken, OutstandingToken
+
+from auth_app.models import User
+from auth_app.services import TokenRevocationCache, TokenVersionCache
+
 
 class CustomJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -11,9 +21,49 @@ class CustomJWTAuthentication(JWTAuthentication):
         user, token = result
         if user.is_deleted:
             raise AuthenticationFailed("Your account is deactivated. Contact admin.")
-        if OutstandingToken.objects.filter(token=token).exists():
-            if BlacklistedToken.objects.filter(token=token).exists():
-                raise AuthenticationFailed("Token has been blacklisted. Please log in again.")
+        if TokenRevocationCache.is_revoked(token):
+            raise AuthenticationFailed("Token has been blacklisted. Please log in again.")
 
         return user, token
 
+    def get_user(self, validated_token):
+        # Without a shared cache the token version could be stale, so the user row is loaded
+        # (the auth_app.E001 check reports that configuration).
+        stateless = settings.JWT_STATELESS_USER and settings.SHARED_CACHE
+        if not stateless or 'token_version' not in validated_token or 'role' not in validated_token:
+            return super().get_user(validated_token)
+
+        current_version = TokenVersionCache.get(validated_token['user_id'])
+        if current_version is None:
+            raise AuthenticationFailed("User not found.", code="user_not_found")
+        if current_version != validated_token['token_version']:
+            raise AuthenticationFailed("Your session is out of date. Please log in again.", code="token_outdated")
+        return User.from_token_claims(validated_token)
+
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware that authenticates websocket connections with the
+    ``?token=<access token>`` query parameter, since browsers cannot set an
+    Authorization header on a websocket handshake.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        raw_token = query.get("token", [None])[0]
+        if raw_token:
+            scope = dict(scope, user=await self.get_user(raw_token))
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        authentication = CustomJWTAuthentication()
+        try:
+            validated_token = authentication.get_validated_token(raw_token)
+            user = authentication.get_user(validated_token)
+        except (InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
+        if user.is_deleted or TokenRevocationCache.is_revoked(validated_token):
+            return AnonymousUser()
+        return user
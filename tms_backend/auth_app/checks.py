@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_stateless_tokens(app_configs, **kwargs):
+    """Stateless authentication trusts cached token versions, which every process has to see."""
+    if settings.JWT_STATELESS_USER and not settings.SHARED_CACHE:
+        return [Error(
+            "JWT_STATELESS_USER needs a cache shared by every process.",
+            hint="Set REDIS_URL. With a per-process cache, other workers keep accepting tokens "
+                 "issued before a role change or deactivation.",
+            id="auth_app.E001",
+        )]
+    return []
@@ -1,15 +1,19 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
 from auth_app.models import User
+from auth_app.services import AdminRegistrationBroadcast
 
 class AdminNotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        """Connect to the WebSocket group for admin notifications."""
-        self.group_name = "admin_notifications"
+        """Connect to the WebSocket group for admin notifications and send the current pending registrations."""
+        self.group_name = AdminRegistrationBroadcast.GROUP
         if self.scope["user"].is_authenticated and self.scope["user"].role == User.SYSTEM_ADMIN:
-            await self.channel_layer.group_add(self.admin_group_name, self.channel_name)
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            snapshot = await database_sync_to_async(AdminRegistrationBroadcast.snapshot)()
+            await self.send(text_data=json.dumps({"type": "snapshot", **snapshot}))
         else:
             await self.close()
 
@@ -29,4 +33,6 @@ class AdminNotificationConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             "message": message,
             "created_at": created_at,
-        }))
\ No newline at end of file
+            "user_id": event.get("user_id"),
+            "pending_count": event.get("pending_count"),
+        }))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auth_app.services import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails in batches over one SMTP connection, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--batch-size", type=int, default=50, help="Emails sent per SMTP connection.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when nothing is due.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        processed = 0
+
+        try:
+            while True:
+                close_old_connections()
+                sent = EmailOutbox.send_pending(batch_size=batch_size)
+                processed += sent
+                if sent:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} queued email(s)."))
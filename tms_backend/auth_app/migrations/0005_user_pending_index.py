@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('auth_app', '0004_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_pending', True)), fields=['-updated_at'], name='auth_user_pending_idx'),
+        ),
+    ]
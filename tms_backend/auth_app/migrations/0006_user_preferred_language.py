@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0005_user_pending_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='preferred_language',
+            field=models.CharField(blank=True, default='', max_length=15),
+        ),
+    ]
@@ -51,6 +51,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     created_at = models.DateTimeField(default=now)
     updated_at = models.DateTimeField(auto_now=True)
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name="employees")
+    token_version = models.PositiveIntegerField(default=0)
+    # One of settings.LANGUAGES; blank means LANGUAGE_CODE. Notifications are rendered in it.
+    preferred_language = models.CharField(max_length=15, blank=True, default='')
+
+    # Changing any of these invalidates tokens that carry the old claims.
+    TOKEN_CLAIM_FIELDS = ('role', 'department_id', 'is_active', 'is_deleted')
+    # Fields whose changes User.save and the user signals react to; routine
+    # writes that touch none of them (e.g. last_login) skip that work.
+    TRACKED_FIELDS = TOKEN_CLAIM_FIELDS + ('is_pending',)
     
 
     USERNAME_FIELD = 'email'
@@ -58,9 +67,74 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            # Pending registrations, newest first, for the admin websocket snapshot.
+            models.Index(fields=['-updated_at'], condition=models.Q(is_pending=True), name='auth_user_pending_idx'),
+        ]
+
     def __str__(self):
         return self.email
     
+    @classmethod
+    def from_token_claims(cls, token):
+        """
+        Build a user from access-token claims without querying the database.
+        Fields that are not in the token stay deferred and are loaded together on first access.
+        """
+        claims = {
+            'id': token['user_id'],
+            'email': token.get('email'),
+            'role': token['role'],
+            'department_id': token.get('department_id'),
+            'is_active': True,
+            'is_deleted': False,
+            'token_version': token['token_version'],
+        }
+        # from_db expects values in concrete field order.
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        return cls.from_db('default', field_names, [claims[name] for name in field_names])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_original_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Loading one deferred field loads the rest with it, so a user built
+        # from token claims costs at most one extra query.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_original_values(None if fields is None else self._attnames(fields))
+
+    def _remember_original_values(self, fields=None):
+        """Record the stored values of TRACKED_FIELDS so saves can tell what changed without re-reading the row."""
+        original = self.__dict__.setdefault('_original_values', {})
+        for name in self.TRACKED_FIELDS:
+            if name in self.__dict__ and (fields is None or name in fields):
+                original[name] = self.__dict__[name]
+
+    def _attnames(self, field_names):
+        return {self._meta.get_field(name).attname for name in field_names}
+
+    def changed_fields(self, fields=None, update_fields=None):
+        """
+        Names of tracked fields whose value differs from the one last loaded or
+        saved. With ``update_fields``, only fields that save would write count.
+        """
+        original = self.__dict__.get('_original_values', {})
+        names = fields or self.TRACKED_FIELDS
+        if update_fields is not None:
+            saved = self._attnames(update_fields)
+            names = [name for name in names if name in saved]
+        return {
+            name for name in names
+            if name in original and name in self.__dict__ and self.__dict__[name] != original[name]
+        }
+
     def deactivate(self):
         self.is_active = False
         self.is_deleted = True
@@ -71,7 +145,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         self.is_deleted = False
         self.save()
 
-    def save(self, *args, **kwargs):
+    def _sync_managed_department(self):
         if self.role == self.DEPARTMENT_MANAGER and self.department:
             existing_department = Department.objects.filter(department_manager=self).exclude(id=self.department.id).first()
 
@@ -80,13 +154,27 @@ class User(AbstractBaseUser, PermissionsMixin):
 
             # Assign the user as the department manager only if there's no conflict
             self.department.department_manager = self
-            self.department.save()
+            self.department.save(update_fields=['department_manager'])
 
-        elif self.department and self.department.department_manager == self and self.role != self.DEPARTMENT_MANAGER:
+        elif self.department and self.department.department_manager_id == self.pk and self.role != self.DEPARTMENT_MANAGER:
             self.department.department_manager = None
-            self.department.save()
+            self.department.save(update_fields=['department_manager'])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed = self.changed_fields(update_fields=update_fields)
+
+        # Only role or department changes can affect who manages a department.
+        if self._state.adding or changed & {'role', 'department_id'}:
+            self._sync_managed_department()
+
+        if not self._state.adding and changed & set(self.TOKEN_CLAIM_FIELDS):
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
 
         super().save(*args, **kwargs)
+        self._remember_original_values(None if update_fields is None else self._attnames(update_fields))
     
 class UserStatusHistory(models.Model):
     STATUS_CHOICES = (
@@ -99,4 +187,41 @@ class UserStatusHistory(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)    
   
     def __str__(self):
-        return self.status
\ No newline at end of file
+        return self.status
+
+
+class OutboundEmail(models.Model):
+    """
+    Email queued in the same transaction as the change it reports. The
+    ``send_queued_emails`` worker sends pending rows in batches over one SMTP
+    connection and retries failures with exponential backoff.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
@@ -1,6 +1,12 @@
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from .models import Department, User, UserStatusHistory
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from auth_app.services import TokenRevocationCache
 
 
 
@@ -56,10 +62,11 @@ class AdminApproveSerializer(serializers.ModelSerializer):
             instance.save()
             return instance    
 class UserDetailSerializer(serializers.ModelSerializer):
-  
+    preferred_language = serializers.ChoiceField(choices=settings.LANGUAGES, required=False, allow_blank=True)
+
     class Meta:
         model = User
-        fields = ['id', 'full_name', 'email', 'phone_number', 'role', 'department', 'is_active', 'is_pending', 'created_at', 'updated_at']
+        fields = ['id', 'full_name', 'email', 'phone_number', 'role', 'department', 'preferred_language', 'is_active', 'is_pending', 'created_at', 'updated_at']
         read_only_fields = ['id', 'is_active', 'is_pending', 'created_at', 'updated_at']
 
 class UserListSerializer(serializers.ModelSerializer):
@@ -111,4 +118,25 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['email'] = user.email
         token['role'] = user.role  # Ensure 'role' is a field in your User model
-        return token
\ No newline at end of file
+        token['department_id'] = user.department_id
+        token['token_version'] = user.token_version
+        return token
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # The new access token copies the refresh token's claims, so claims from
+        # before a role change or deactivation must not be refreshed. The token
+        # is fully verified by the parent class below.
+        refresh = self.token_class(attrs["refresh"], verify=False)
+        if 'token_version' in refresh:
+            current_version = User.objects.filter(id=refresh.get(jwt_settings.USER_ID_CLAIM)).values_list(
+                'token_version', flat=True
+            ).first()
+            if current_version != refresh['token_version']:
+                raise AuthenticationFailed("Your session is out of date. Please log in again.", code="token_outdated")
+
+        data = super().validate(attrs)
+        if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+            # The rotated-out refresh token was just blacklisted; mirror that in the cache.
+            TokenRevocationCache.revoke_jti(RefreshToken(attrs["refresh"], verify=False).get("jti"))
+        return data
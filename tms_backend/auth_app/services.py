@@ -1,7 +1,143 @@
-from django.core.mail import send_mail
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from rest_framework.pagination import PageNumberPagination
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
 
-def send_approval_email(user):
+from auth_app.models import OutboundEmail, User, UserStatusHistory
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutbox:
+    """
+    Transactional email queue.
+
+    ``enqueue`` only writes an ``OutboundEmail`` row, so a view never waits on
+    the mail server and an SMTP outage cannot fail a request whose changes are
+    already written. ``send_pending`` claims due rows with ``SKIP LOCKED``,
+    commits the claim, sends them over a single SMTP connection and reschedules
+    failures with exponential backoff until ``EMAIL_MAX_ATTEMPTS`` is reached.
+    """
+
+    @classmethod
+    def enqueue(cls, subject, body, recipients, from_email=None) -> OutboundEmail:
+        email = OutboundEmail.objects.create(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients=list(recipients),
+        )
+        if settings.EMAIL_DELIVERY_MODE == 'inline':
+            transaction.on_commit(lambda: cls.send_pending(OutboundEmail.objects.filter(id=email.id)))
+        return email
+
+    @classmethod
+    def enqueue_many(cls, messages) -> list[OutboundEmail]:
+        """Queue ``(subject, body, recipients)`` tuples with one insert."""
+        emails = OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, recipients=list(recipients))
+            for subject, body, recipients in messages
+        ])
+        if emails and settings.EMAIL_DELIVERY_MODE == 'inline':
+            ids = [email.id for email in emails]
+            transaction.on_commit(lambda: cls.send_pending(OutboundEmail.objects.filter(id__in=ids)))
+        return emails
+
+    @staticmethod
+    def backoff(attempts: int) -> timedelta:
+        return timedelta(seconds=settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+    @classmethod
+    def send_pending(cls, queryset=None, batch_size: int = 50) -> int:
+        """
+        Send one batch of due emails. Returns the number of emails processed.
+
+        The batch is claimed in a short transaction that pushes its
+        ``next_attempt_at`` out by ``EMAIL_CLAIM_TIMEOUT``, so no row lock or
+        transaction is held while the mail server is talked to. If the worker
+        dies mid-batch, the unsent rows become due again once the claim runs out.
+        """
+        if queryset is None:
+            queryset = OutboundEmail.objects.all()
+
+        with transaction.atomic():
+            emails = list(
+                queryset.select_for_update(skip_locked=True)
+                .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=timezone.now())
+                .order_by('id')[:batch_size]
+            )
+            if not emails:
+                return 0
+            OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=timezone.now() + timedelta(seconds=settings.EMAIL_CLAIM_TIMEOUT)
+            )
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except (smtplib.SMTPException, OSError) as exc:
+            logger.warning("Could not connect to the mail server: %s", exc)
+            for email in emails:
+                cls._failed(email, exc)
+        else:
+            try:
+                for email in emails:
+                    cls._send(connection, email)
+            finally:
+                connection.close()
+
+        OutboundEmail.objects.bulk_update(
+            emails, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+        )
+        return len(emails)
+
+    @classmethod
+    def _send(cls, connection, email: OutboundEmail) -> None:
+        message = EmailMessage(
+            email.subject, email.body, email.from_email, email.recipients, connection=connection
+        )
+        try:
+            try:
+                message.send()
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the reused connection; reconnect once.
+                connection.close()
+                connection.open()
+                message.send()
+        except (smtplib.SMTPException, OSError) as exc:
+            logger.warning("Failed to send email %s: %s", email.id, exc)
+            cls._failed(email, exc)
+            return
+
+        email.status = OutboundEmail.SENT
+        email.sent_at = timezone.now()
+        email.last_error = None
+
+    @classmethod
+    def _failed(cls, email: OutboundEmail, exc: Exception) -> None:
+        email.attempts += 1
+        email.last_error = str(exc)
+        if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+            email.status = OutboundEmail.FAILED
+        else:
+            email.next_attempt_at = timezone.now() + cls.backoff(email.attempts)
+
+
+def approval_email(user):
     subject = "Registration Approved"
     redirect_link=f"http://localhost:8000/api/login/"
     message = (
@@ -10,11 +146,9 @@ def send_approval_email(user):
         f"{redirect_link}.\n\n"
         "Best regards,\nAdmin Team"
     )
-    from_email = 'mebrhit765@gmail.com'  
-    recipient_list = [user.email]
-    send_mail(subject, message, from_email, recipient_list)
+    return subject, message, [user.email]
 
-def send_rejection_email(user, rejection_message):
+def rejection_email(user, rejection_message):
     subject = "Registration Rejected"
     resubmit_link = f"http://localhost:8000/resubmit/{user.id}"  
     message = (
@@ -25,9 +159,15 @@ def send_rejection_email(user, rejection_message):
         f"{resubmit_link}\n\n"
         "Best regards,\nAdmin Team"
     )
-    from_email = 'mebrhit765@gmail.com'  
-    recipient_list = [user.email]
-    send_mail(subject, message, from_email, recipient_list)
+    return subject, message, [user.email]
+
+def send_approval_email(user):
+    """Queue the approval email; it is sent once the surrounding transaction commits."""
+    return EmailOutbox.enqueue(*approval_email(user))
+
+def send_rejection_email(user, rejection_message):
+    """Queue the rejection email; it is sent once the surrounding transaction commits."""
+    return EmailOutbox.enqueue(*rejection_email(user, rejection_message))
 
 
 
@@ -49,4 +189,275 @@ def send_rejection_email(user, rejection_message):
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 30
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class TokenRevocationCache:
+    """
+    Revoked JWT ids and per-user "revoked before" cut-offs.
+
+    Revocations are written to Django's shared cache for the lifetime of an
+    access token. Lookups are memoised in-process for
+    ``TOKEN_REVOCATION_LOCAL_TTL`` seconds, so most requests authenticate without
+    touching the cache or the database, and a revocation made by another
+    process takes effect within that window.
+
+    Without ``SHARED_CACHE`` the cache only holds this process's revocations,
+    so a token id it does not know is looked up in the ``BlacklistedToken``
+    table, where logout and refresh rotation record theirs. Deactivated users
+    are refused through ``User.is_deleted``, which is read from the database.
+    """
+    JTI_KEY = "jwt:revoked:{}"
+    USER_KEY = "jwt:revoked_before:{}"
+    MAX_LOCAL_ENTRIES = 10000
+
+    _local = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _timeout():
+        lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+        return int(lifetime.total_seconds())
+
+    @classmethod
+    def _remember(cls, values: dict) -> None:
+        expires_at = time.monotonic() + settings.TOKEN_REVOCATION_LOCAL_TTL
+        with cls._lock:
+            if len(cls._local) > cls.MAX_LOCAL_ENTRIES:
+                cls._local.clear()
+            for key, value in values.items():
+                cls._local[key] = (value, expires_at)
+
+    @classmethod
+    def _lookup(cls, keys: list) -> dict:
+        now = time.monotonic()
+        found, missing = {}, []
+        for key in keys:
+            entry = cls._local.get(key)
+            if entry and entry[1] > now:
+                found[key] = entry[0]
+            else:
+                missing.append(key)
+        if missing:
+            fetched = cache.get_many(missing)
+            fresh = {key: fetched.get(key) for key in missing}
+            cls._remember(fresh)
+            found.update(fresh)
+        return found
+
+    @classmethod
+    def revoke_jti(cls, *jtis) -> None:
+        values = {cls.JTI_KEY.format(jti): True for jti in jtis if jti}
+        cache.set_many(values, cls._timeout())
+        cls._remember(values)
+
+    @classmethod
+    def revoke_users(cls, user_ids) -> None:
+        """Reject every token issued to these users up to now."""
+        cutoff = int(time.time())
+        values = {cls.USER_KEY.format(user_id): cutoff for user_id in user_ids}
+        cache.set_many(values, cls._timeout())
+        cls._remember(values)
+
+    @classmethod
+    def is_revoked(cls, token) -> bool:
+        jti = token.get(jwt_settings.JTI_CLAIM)
+        jti_key = cls.JTI_KEY.format(jti)
+        user_key = cls.USER_KEY.format(token.get(jwt_settings.USER_ID_CLAIM))
+        values = cls._lookup([jti_key, user_key])
+        if values.get(jti_key) is None and not settings.SHARED_CACHE:
+            # Remembered as False, so the table is read at most once per local TTL.
+            values[jti_key] = BlacklistedToken.objects.filter(token__jti=jti).exists()
+            cls._remember({jti_key: values[jti_key]})
+        if values.get(jti_key):
+            return True
+        cutoff, issued_at = values.get(user_key), token.get("iat")
+        return cutoff is not None and issued_at is not None and issued_at <= cutoff
+
+
+class TokenVersionCache:
+    """
+    Current ``User.token_version`` per user, cached so stateless authentication
+    can reject tokens minted before a role change or deactivation without
+    loading the user row.
+
+    Entries are dropped when the version changes and otherwise live no longer
+    than an access token, so a missed invalidation is bounded by the same
+    window as the claims it guards.
+    """
+    KEY = "jwt:token_version:{}"
+
+    @staticmethod
+    def _timeout():
+        return int(jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+    @classmethod
+    def get(cls, user_id):
+        version = cache.get(cls.KEY.format(user_id))
+        if version is None:
+            version = User.objects.filter(id=user_id).values_list('token_version', flat=True).first()
+            if version is not None:
+                cache.set(cls.KEY.format(user_id), version, cls._timeout())
+        return version
+
+    @classmethod
+    def invalidate(cls, user_ids) -> None:
+        cache.delete_many([cls.KEY.format(user_id) for user_id in user_ids])
+
+
+def blacklist_access_token(token) -> None:
+    """
+    Record an access token in the blacklist tables, which simplejwt only keeps
+    for refresh tokens, so processes without a shared cache see it revoked.
+    """
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=token[jwt_settings.JTI_CLAIM],
+        defaults={
+            'user_id': token.get(jwt_settings.USER_ID_CLAIM),
+            'token': str(token),
+            'created_at': datetime_from_epoch(token['iat']),
+            'expires_at': datetime_from_epoch(token['exp']),
+        },
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+
+
+def blacklist_outstanding_tokens(user_ids) -> int:
+    """Blacklist every unexpired refresh token of the given users with a single insert."""
+    token_ids = OutstandingToken.objects.filter(
+        user_id__in=user_ids,
+        expires_at__gt=timezone.now(),
+        blacklistedtoken__isnull=True,
+    ).values_list('id', flat=True)
+    created = BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id in token_ids],
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def deactivate_users(user_ids) -> list:
+    """
+    Deactivate users in bulk and revoke their sessions.
+
+    Mirrors ``User.deactivate`` followed by the ``pre_save`` signal, but with
+    set-based queries so the cost does not grow with the number of users.
+    Returns the ids that were actually deactivated.
+    """
+    with transaction.atomic():
+        ids = list(
+            User.objects.select_for_update()
+            .filter(id__in=user_ids, is_deleted=False)
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return []
+        User.objects.filter(id__in=ids).update(
+            is_active=False,
+            is_deleted=True,
+            token_version=F('token_version') + 1,
+            updated_at=timezone.now(),
+        )
+        blacklist_outstanding_tokens(ids)
+        transaction.on_commit(lambda: TokenVersionCache.invalidate(ids))
+        transaction.on_commit(lambda: TokenRevocationCache.revoke_users(ids))
+    return ids
+
+
+def review_registrations(user_ids, action, rejection_message=None) -> list:
+    """
+    Approve or reject pending registrations in bulk.
+
+    Does what ``AdminApprovalView.post`` does per user with one locking
+    SELECT, one UPDATE, one history insert and one email insert, whatever the
+    number of users. Users that are no longer pending are skipped. Returns the
+    ids that were reviewed.
+    """
+    approve = action == 'approve'
+    with transaction.atomic():
+        users = list(
+            User.objects.select_for_update()
+            .filter(id__in=user_ids, is_pending=True)
+            .only('id', 'full_name', 'email')
+            .order_by('id')
+        )
+        if not users:
+            return []
+        ids = [user.id for user in users]
+
+        # is_active is a token claim, so bump token_version as User.save would.
+        User.objects.filter(id__in=ids).update(
+            is_active=approve,
+            is_pending=False,
+            token_version=F('token_version') + 1,
+            updated_at=timezone.now(),
+        )
+        UserStatusHistory.objects.bulk_create([
+            UserStatusHistory(user=user, status=action, rejection_message=None if approve else rejection_message)
+            for user in users
+        ])
+        EmailOutbox.enqueue_many(
+            approval_email(user) if approve else rejection_email(user, rejection_message)
+            for user in users
+        )
+        transaction.on_commit(lambda: TokenVersionCache.invalidate(ids))
+    return ids
+
+
+class AdminRegistrationBroadcast:
+    """
+    Registration events for the ``admin_notifications`` websocket group.
+
+    ``schedule`` only sends the event once the transaction commits, so
+    rolled-back saves are never announced. The first event for a user is sent
+    right away and claims a cache key for ``ADMIN_BROADCAST_WINDOW`` seconds;
+    further events for that user inside the window are dropped, so several
+    saves of one registration reach admins as one event. Nothing is held in
+    memory, so nothing is lost when a worker exits.
+    """
+    GROUP = "admin_notifications"
+    KEY = "admin:registration_broadcast:{}"
+
+    @classmethod
+    def schedule(cls, user, message):
+        event = {
+            "type": "send_notification",
+            "message": message,
+            "user_id": user.id,
+            "created_at": str(user.updated_at),
+        }
+        transaction.on_commit(lambda: cls._push(user.id, event))
+
+    @classmethod
+    def _push(cls, user_id, event):
+        window = settings.ADMIN_BROADCAST_WINDOW
+        if window and not cache.add(cls.KEY.format(user_id), True, window):
+            return
+        pending_count = User.objects.filter(is_pending=True).count()
+        try:
+            async_to_sync(get_channel_layer().group_send)(cls.GROUP, {**event, "pending_count": pending_count})
+        except Exception:
+            logger.exception("Failed to broadcast registration of user %s", user_id)
+
+    @staticmethod
+    def snapshot():
+        """The pending registration count and the most recent pending registrations."""
+        latest = (
+            User.objects.filter(is_pending=True)
+            .select_related('department')
+            .order_by('-updated_at')[:settings.ADMIN_SNAPSHOT_SIZE]
+        )
+        return {
+            "pending_count": User.objects.filter(is_pending=True).count(),
+            "latest": [
+                {
+                    "id": user.id,
+                    "full_name": user.full_name,
+                    "email": user.email,
+                    "department": user.department.name if user.department else None,
+                    "created_at": str(user.created_at),
+                    "updated_at": str(user.updated_at),
+                }
+                for user in latest
+            ],
+        }
@@ -1,40 +1,29 @@
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from django.db.models.signals import pre_save,post_save
+from django.db import transaction
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from .models import User
+from .services import AdminRegistrationBroadcast, TokenRevocationCache, TokenVersionCache, blacklist_outstanding_tokens
 
 @receiver(pre_save, sender=User)
-def revoke_tokens_on_deactivation(sender, instance, **kwargs):
-    if instance.id:
-        try:
-            old_instance = User.objects.get(id=instance.id)
-            if not old_instance.is_deleted and instance.is_deleted:
-                tokens = OutstandingToken.objects.filter(user=instance)
-                for token in tokens:
-                    BlacklistedToken.objects.get_or_create(token=token)  # Blacklist tokens instead of deleting
-        except User.DoesNotExist:
-            pass  
+def revoke_tokens_on_deactivation(sender, instance, update_fields=None, **kwargs):
+    changed = instance.changed_fields(instance.TOKEN_CLAIM_FIELDS, update_fields=update_fields)
+    if not changed:
+        return
+
+    # User.save has already bumped token_version for these changes.
+    transaction.on_commit(lambda: TokenVersionCache.invalidate([instance.id]))
+    if 'is_deleted' in changed and instance.is_deleted:
+        blacklist_outstanding_tokens([instance.id])
+        transaction.on_commit(lambda: TokenRevocationCache.revoke_users([instance.id]))
 
 
 @receiver(post_save, sender=User)
-def send_admin_notification(sender, instance, created, **kwargs):
-    """Send real-time notifications to System Admin when a user registers or resubmits."""
-    if instance.is_pending:
+def send_admin_notification(sender, instance, created, update_fields=None, **kwargs):
+    """Notify System Admins when a user registers or resubmits, once the save commits."""
+    if instance.is_pending and (created or 'is_pending' in instance.changed_fields(update_fields=update_fields)):
         message = (
             f"New registration request from {instance.full_name}"
             if created
             else f"Resubmission request received for {instance.full_name}"
         )
-
-        # Send WebSocket notification
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "admin_notifications",
-            {
-                "type": "send_notification",
-                "message": message,
-                "created_at": str(instance.updated_at),
-            }
-        )
+        AdminRegistrationBroadcast.schedule(instance, message)
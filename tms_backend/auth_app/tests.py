@@ -1,3 +1,637 @@
-from django.test import TestCase
+"""
+Authentication, token revocation, realtime push and account email tests.
 
-# Create your tests here.
+The websocket tests run the real ASGI application against a Redis channel
+layer served by an in-process fakeredis server, so group fan-out goes through
+the same Redis protocol as production. fakeredis is a dev dependency
+(``pipenv install --dev``); without it only those tests are skipped.
+"""
+import io
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
+
+from asgiref.sync import sync_to_async
+from channels.layers import channel_layers, get_channel_layer
+from channels.testing import WebsocketCommunicator
+from channels_redis.core import RedisChannelLayer
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from auth_app.checks import check_stateless_tokens
+from auth_app.models import Department, OutboundEmail, User, UserStatusHistory
+from auth_app.serializers import CustomTokenObtainPairSerializer
+from auth_app.services import (
+    AdminRegistrationBroadcast,
+    EmailOutbox,
+    TokenRevocationCache,
+    TokenVersionCache,
+    deactivate_users,
+    send_approval_email,
+)
+from auth_app.views import BulkAdminApprovalView, BulkDeactivateUsersView
+
+try:
+    from fakeredis import TcpFakeServer
+except ImportError:
+    TcpFakeServer = None
+
+
+def _user(role, email, **fields):
+    """An active user holding ``role``; set after creation, as User.save inspects department managers."""
+    user = User.objects.create(email=email, full_name=email.split("@")[0].title(), is_active=True, is_pending=False, **fields)
+    if role != User.EMPLOYEE:
+        User.objects.filter(id=user.id).update(role=role)
+        user.refresh_from_db()
+    return user
+
+
+def _access_token(user, lifetime=None):
+    token = CustomTokenObtainPairSerializer().get_token(user).access_token
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return token
+
+
+class RevocationCacheMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        TokenRevocationCache._local.clear()
+
+
+@skipIf(TcpFakeServer is None, "fakeredis is not installed")
+class UserNotificationSocketTests(RevocationCacheMixin, TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=cls.redis_server.serve_forever, daemon=True).start()
+        host, port = cls.redis_server.server_address
+        cls.redis_url = f"redis://{host}:{port}/0"
+        cls.enterClassContext(override_settings(CHANNEL_LAYERS={
+            "default": {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {"hosts": [cls.redis_url]},
+            },
+        }))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.redis_server.shutdown()
+        cls.redis_server.server_close()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.user = _user(User.EMPLOYEE, "employee@socket.test", department=cls.department)
+
+    def setUp(self):
+        super().setUp()
+        # Each async test runs on its own event loop; a layer kept from an earlier
+        # test still holds that loop's receive state and drops messages.
+        channel_layers.backends.clear()
+
+    def _communicator(self, token=None):
+        from tms_backend.asgi import application
+
+        path = "/ws/user-notifications/" + (f"?token={token}" if token else "")
+        return WebsocketCommunicator(application, path)
+
+    async def _token(self, lifetime=None):
+        # Minting a token records its refresh token, so it has to leave the event loop.
+        return await sync_to_async(_access_token)(self.user, lifetime)
+
+    async def _connect(self, token=None):
+        communicator = self._communicator(token)
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    def _notify(self):
+        from core.models import TransportRequest
+        from core.services import NotificationService
+
+        request = TransportRequest.objects.create(
+            requester=self.user, start_day="2025-05-01", return_day="2025-05-02", start_time="08:00",
+            destination="Adama", reason="Field visit",
+        )
+        request.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_recipients("new_request", request, [self.user])
+
+    def test_uses_redis_channel_layer(self):
+        self.assertIsInstance(get_channel_layer(), RedisChannelLayer)
+
+    async def test_valid_token_receives_unread_count_and_pushes(self):
+        communicator, connected = await self._connect(await self._token())
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {"type": "unread_count", "unread_count": 0})
+
+        await sync_to_async(self._notify)()
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["type"], "notification")
+        self.assertEqual(message["notification"]["notification_type"], "new_request")
+        self.assertEqual(message["unread_delta"], 1)
+        await communicator.disconnect()
+
+    async def test_group_send_from_another_process_reaches_the_socket(self):
+        communicator, connected = await self._connect(await self._token())
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+
+        # A separate layer instance stands in for another worker process.
+        other_process = RedisChannelLayer(hosts=[self.redis_url])
+        await other_process.group_send(f"user_{self.user.id}", {"type": "unread.changed", "unread_count": 7})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "unread_count", "unread_count": 7})
+        await communicator.disconnect()
+        await other_process.flush()
+
+    async def test_missing_token_is_rejected(self):
+        _, connected = await self._connect()
+        self.assertFalse(connected)
+
+    async def test_expired_token_is_rejected(self):
+        _, connected = await self._connect(await self._token(lifetime=-timedelta(seconds=1)))
+        self.assertFalse(connected)
+
+    async def test_revoked_token_is_rejected(self):
+        token = await self._token()
+        await sync_to_async(TokenRevocationCache.revoke_jti)(token["jti"])
+        _, connected = await self._connect(token)
+        self.assertFalse(connected)
+
+    async def test_deactivated_user_is_rejected(self):
+        token = await self._token()
+        await sync_to_async(User.objects.filter(id=self.user.id).update)(is_deleted=True)
+        _, connected = await self._connect(token)
+        self.assertFalse(connected)
+
+
+class TokenRevocationTests(RevocationCacheMixin, APITestCase):
+    PASSWORD = "correct-horse-battery"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.user = _user(User.EMPLOYEE, "employee@tokens.test", department=cls.department)
+        cls.user.set_password(cls.PASSWORD)
+        cls.user.save(update_fields=["password"])
+
+    def _login(self):
+        response = self.client.post(reverse("token_obtain_pair"), {"email": self.user.email, "password": self.PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"], response.data["refresh"]
+
+    def _me(self, access):
+        return self.client.get(reverse("current-user"), HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def _forget_local_revocations(self):
+        """Stand in for another process, which has seen none of this one's revocations."""
+        cache.clear()
+        TokenRevocationCache._local.clear()
+
+    @override_settings(SHARED_CACHE=True)
+    def test_authenticated_request_does_not_query_the_blacklist(self):
+        access, _ = self._login()
+        self._me(access)
+        TokenRevocationCache._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._me(access).status_code, 200)
+        self.assertFalse([query["sql"] for query in queries if "token_blacklist" in query["sql"]])
+
+    def test_without_a_shared_cache_the_blacklist_is_read_once_per_local_ttl(self):
+        access, _ = self._login()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._me(access).status_code, 200)
+            self.assertEqual(self._me(access).status_code, 200)
+        self.assertEqual(len([query for query in queries if "token_blacklist" in query["sql"]]), 1)
+
+    def test_without_a_shared_cache_logout_reaches_other_processes(self):
+        access, refresh = self._login()
+        response = self.client.post(reverse("logout"), {"refresh": refresh}, HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, 200)
+
+        self._forget_local_revocations()
+        self.assertEqual(self._me(access).status_code, 401)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": refresh}).status_code, 401)
+
+    def test_without_a_shared_cache_deactivation_reaches_other_processes(self):
+        access, _ = self._login()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).deactivate()
+
+        self._forget_local_revocations()
+        self.assertEqual(self._me(access).status_code, 401)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        access, refresh = self._login()
+        response = self.client.post(reverse("logout"), {"refresh": refresh}, HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self._me(access).status_code, 401)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": refresh}).status_code, 401)
+
+    def test_refresh_rotation_revokes_the_old_refresh_token(self):
+        _, refresh = self._login()
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._me(response.data["access"]).status_code, 200)
+
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": refresh}).status_code, 401)
+
+    def test_deactivation_revokes_issued_tokens(self):
+        access, refresh = self._login()
+        self.assertEqual(self._me(access).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).deactivate()
+
+        self.assertEqual(self._me(access).status_code, 401)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": refresh}).status_code, 401)
+
+    @override_settings(TOKEN_REVOCATION_LOCAL_TTL=60)
+    def test_revocation_by_another_process_applies_within_the_local_ttl(self):
+        access, _ = self._login()
+        self.assertEqual(self._me(access).status_code, 200)
+
+        # Another process only writes the shared cache; this one still has the lookup memoised.
+        jti = AccessToken(access)["jti"]
+        cache.set(TokenRevocationCache.JTI_KEY.format(jti), True)
+        self.assertEqual(self._me(access).status_code, 200)
+
+        with mock.patch("auth_app.services.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(self._me(access).status_code, 401)
+
+
+@override_settings(JWT_STATELESS_USER=True, SHARED_CACHE=True)
+class StatelessTokenTests(RevocationCacheMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.user = _user(User.EMPLOYEE, "employee@claims.test", department=cls.department)
+
+    def _get(self, token, name="notification-unread-count"):
+        return self.client.get(reverse(name), HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def _version(self):
+        return User.objects.values_list("token_version", flat=True).get(id=self.user.id)
+
+    def test_request_is_authenticated_from_claims(self):
+        token = _access_token(self.user)
+        self._get(token)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._get(token).status_code, 200)
+        self.assertFalse([query["sql"] for query in queries if '"auth_app_user"' in query["sql"]])
+
+    def test_claims_user_loads_the_rest_of_the_row_once(self):
+        user = User.from_token_claims(_access_token(self.user))
+        self.assertEqual(user.role, User.EMPLOYEE)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.full_name, self.user.full_name)
+            self.assertEqual(user.phone_number, self.user.phone_number)
+
+    def test_routine_saves_keep_the_token_version(self):
+        token = _access_token(self.user)
+        user = User.objects.get(id=self.user.id)
+        user.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=["last_login"])
+        self.assertEqual(self._version(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).save()
+        self.assertEqual(self._version(), 0)
+        self.assertEqual(self._get(token).status_code, 200)
+
+    def test_role_change_rejects_tokens_with_the_old_claims(self):
+        token = _access_token(self.user)
+        self.assertEqual(self._get(token).status_code, 200)
+
+        user = User.objects.get(id=self.user.id)
+        user.role = User.TRANSPORT_MANAGER
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self._version(), 1)
+
+        response = self._get(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "token_outdated")
+        self.assertEqual(self._get(_access_token(user)).status_code, 200)
+
+    def test_deactivation_rejects_existing_tokens(self):
+        token = _access_token(self.user)
+        self.assertEqual(self._get(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).deactivate()
+        self.assertEqual(self._version(), 1)
+        self.assertEqual(self._get(token).status_code, 401)
+
+    def test_role_change_stops_refreshing_the_old_claims(self):
+        refresh = CustomTokenObtainPairSerializer().get_token(self.user)
+        User.objects.filter(id=self.user.id).update(role=User.TRANSPORT_MANAGER, token_version=1)
+
+        response = self.client.post(reverse("token_refresh"), {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "token_outdated")
+
+    def test_cached_version_lives_no_longer_than_an_access_token(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.assertEqual(TokenVersionCache.get(self.user.id), 0)
+        cache_set.assert_called_once_with(f"jwt:token_version:{self.user.id}", 0, 15 * 60)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_local_cache_loads_the_user_row(self):
+        token = _access_token(self.user)
+        self.assertEqual([error.id for error in check_stateless_tokens(None)], ["auth_app.E001"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._get(token).status_code, 200)
+        self.assertTrue([query["sql"] for query in queries if '"auth_app_user"' in query["sql"]])
+
+        # A version bump seen only by the database still rejects the token.
+        User.objects.filter(id=self.user.id).update(is_deleted=True, token_version=1)
+        self.assertEqual(self._get(token).status_code, 401)
+
+
+class BulkDeactivationTests(RevocationCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.users = [_user(User.EMPLOYEE, f"employee{index}@bulk.test", department=cls.department) for index in range(2)]
+        cls.admin = _user(User.SYSTEM_ADMIN, "admin@bulk.test")
+
+    def test_deactivation_matches_a_saved_deactivation(self):
+        ids = [user.id for user in self.users]
+        User.objects.filter(id__in=ids).update(updated_at=timezone.now() - timedelta(days=30))
+        token = _access_token(self.users[0])
+        before = timezone.now()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertCountEqual(deactivate_users(ids), ids)
+        self.assertEqual(deactivate_users(ids), [])
+
+        for user in User.objects.filter(id__in=ids):
+            self.assertFalse(user.is_active)
+            self.assertTrue(user.is_deleted)
+            self.assertEqual(user.token_version, 1)
+            self.assertGreaterEqual(user.updated_at, before)
+        self.assertTrue(TokenRevocationCache.is_revoked(token))
+
+    def test_at_most_max_users_per_request(self):
+        ids = [user.id for user in self.users]
+        with mock.patch.object(BulkDeactivateUsersView, "MAX_USERS", 1):
+            response = self.client.post(
+                reverse("bulk-deactivate"), {"user_ids": ids}, content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {_access_token(self.admin)}",
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(id__in=ids, is_active=True).count(), 2)
+
+
+@override_settings(ADMIN_BROADCAST_WINDOW=60, CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class AdminRegistrationBroadcastTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.admin = _user(User.SYSTEM_ADMIN, "admin@broadcast.test")
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        channel_layers.backends.clear()
+
+    def _applicant(self, index):
+        return User.objects.create(
+            email=f"applicant{index}@broadcast.test", full_name=f"Applicant {index}", department=self.department,
+            is_active=False, is_pending=True,
+        )
+
+    def _broadcasts(self):
+        return mock.patch.object(get_channel_layer(), "group_send", new_callable=mock.AsyncMock)
+
+    def test_one_event_per_user_per_window(self):
+        with self._broadcasts() as group_send, self.captureOnCommitCallbacks(execute=True):
+            first, second = self._applicant(1), self._applicant(2)
+            AdminRegistrationBroadcast.schedule(first, "Resubmission request received for Applicant 1")
+
+        self.assertEqual([call.args[1]["user_id"] for call in group_send.await_args_list], [first.id, second.id])
+        event = group_send.await_args_list[0].args[1]
+        self.assertEqual(group_send.await_args_list[0].args[0], AdminRegistrationBroadcast.GROUP)
+        self.assertEqual(event["message"], "New registration request from Applicant 1")
+        self.assertEqual(event["pending_count"], 2)
+
+        # Once the window has passed the user is announced again.
+        cache.delete(AdminRegistrationBroadcast.KEY.format(first.id))
+        with self._broadcasts() as group_send, self.captureOnCommitCallbacks(execute=True):
+            AdminRegistrationBroadcast.schedule(first, "Resubmission request received for Applicant 1")
+        self.assertEqual(group_send.await_count, 1)
+
+    def test_rolled_back_registration_is_not_broadcast(self):
+        with self._broadcasts() as group_send, self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self._applicant(1)
+                raise RuntimeError("registration failed")
+        group_send.assert_not_awaited()
+
+    @override_settings(ADMIN_BROADCAST_WINDOW=0)
+    def test_without_a_window_every_event_is_sent(self):
+        applicant = self._applicant(1)
+        with self._broadcasts() as group_send, self.captureOnCommitCallbacks(execute=True):
+            AdminRegistrationBroadcast.schedule(applicant, "first")
+            AdminRegistrationBroadcast.schedule(applicant, "second")
+        self.assertEqual([call.args[1]["message"] for call in group_send.await_args_list], ["first", "second"])
+
+    @override_settings(ADMIN_SNAPSHOT_SIZE=2)
+    async def test_admin_receives_a_snapshot_on_connect(self):
+        from tms_backend.asgi import application
+
+        applicants = [await sync_to_async(self._applicant)(index) for index in range(3)]
+        token = await sync_to_async(_access_token)(self.admin)
+        communicator = WebsocketCommunicator(application, f"/ws/notifications/?token={token}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["pending_count"], 3)
+        self.assertEqual([entry["id"] for entry in snapshot["latest"]], [applicants[2].id, applicants[1].id])
+        self.assertEqual(snapshot["latest"][0]["department"], "Operations")
+        await communicator.disconnect()
+
+    async def test_non_admin_is_refused(self):
+        from tms_backend.asgi import application
+
+        employee = await sync_to_async(_user)(User.EMPLOYEE, "employee@broadcast.test")
+        token = await sync_to_async(_access_token)(employee)
+        connected, _ = await WebsocketCommunicator(application, f"/ws/notifications/?token={token}").connect()
+        self.assertFalse(connected)
+
+
+class BulkRegistrationReviewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.admin = _user(User.SYSTEM_ADMIN, "admin@review.test")
+        cls.pending = [
+            User.objects.create(
+                email=f"applicant{index}@review.test", full_name=f"Applicant {index}", department=cls.department,
+                is_active=False, is_pending=True,
+            )
+            for index in range(2)
+        ]
+        cls.reviewed = _user(User.EMPLOYEE, "member@review.test", department=cls.department)
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def _review(self, user_ids, action, **data):
+        return self.client.post(reverse("bulk-approve"), {"user_ids": user_ids, "action": action, **data}, format="json")
+
+    def _pending_ids(self):
+        return [user.id for user in self.pending]
+
+    def test_approval_activates_pending_users_and_skips_reviewed_ones(self):
+        response = self._review([*self._pending_ids(), self.reviewed.id], "approve")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["reviewed"], self._pending_ids())
+        self.assertEqual(response.data["skipped"], [self.reviewed.id])
+        for user in User.objects.filter(id__in=self._pending_ids()):
+            self.assertTrue(user.is_active)
+            self.assertFalse(user.is_pending)
+            self.assertEqual(user.token_version, 1)
+        self.assertEqual(User.objects.get(id=self.reviewed.id).token_version, 0)
+
+        history = UserStatusHistory.objects.filter(user__in=self._pending_ids())
+        self.assertCountEqual(history.values_list("user_id", "status"), [(user_id, "approve") for user_id in self._pending_ids()])
+        emails = OutboundEmail.objects.order_by("id")
+        self.assertEqual([email.recipients for email in emails], [[user.email] for user in self.pending])
+        self.assertEqual({email.subject for email in emails}, {"Registration Approved"})
+
+    def test_users_are_only_reviewed_once(self):
+        self._review(self._pending_ids(), "approve")
+        response = self._review(self._pending_ids(), "reject", rejection_message="Duplicate account")
+
+        self.assertEqual(response.data["reviewed"], [])
+        self.assertEqual(response.data["skipped"], self._pending_ids())
+        self.assertEqual(UserStatusHistory.objects.count(), 2)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+        self.assertTrue(User.objects.get(id=self.pending[0].id).is_active)
+
+    def test_rejection_requires_and_stores_a_message(self):
+        response = self._review(self._pending_ids(), "reject", rejection_message="  ")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(id__in=self._pending_ids(), is_pending=True).count(), 2)
+
+        response = self._review(self._pending_ids(), "reject", rejection_message="Department does not match")
+        self.assertEqual(response.status_code, 200)
+        for user in User.objects.filter(id__in=self._pending_ids()):
+            self.assertFalse(user.is_active)
+            self.assertFalse(user.is_pending)
+        self.assertEqual(
+            set(UserStatusHistory.objects.values_list("status", "rejection_message")),
+            {("reject", "Department does not match")},
+        )
+        for email in OutboundEmail.objects.all():
+            self.assertEqual(email.subject, "Registration Rejected")
+            self.assertIn("Department does not match", email.body)
+
+    def test_at_most_max_users_per_request(self):
+        with mock.patch.object(BulkAdminApprovalView, "MAX_USERS", 1):
+            response = self._review(self._pending_ids(), "approve")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(id__in=self._pending_ids(), is_pending=True).count(), 2)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_invalid_requests_are_refused(self):
+        self.assertEqual(self._review([], "approve").status_code, 400)
+        self.assertEqual(self._review(["x"], "approve").status_code, 400)
+        self.assertEqual(self._review(self._pending_ids(), "promote").status_code, 400)
+
+        self.client.force_authenticate(self.reviewed)
+        self.assertEqual(self._review(self._pending_ids(), "approve").status_code, 403)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend", EMAIL_DELIVERY_MODE="outbox", EMAIL_RETRY_BACKOFF=60,
+)
+class EmailOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = _user(User.EMPLOYEE, "applicant@email.test")
+
+    def test_worker_sends_queued_emails(self):
+        email = send_approval_email(self.user)
+        self.assertEqual(mail.outbox, [])
+
+        call_command("send_queued_emails", "--once", stdout=io.StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Registration Approved")
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.SENT)
+        self.assertIsNotNone(email.sent_at)
+
+    def test_batch_is_claimed_before_it_is_sent(self):
+        email = send_approval_email(self.user)
+        depth = len(connection.atomic_blocks)
+        seen = {}
+
+        def send_messages(backend, messages):
+            # Sent outside the claiming transaction, with the claim already written.
+            seen["depth"] = len(connection.atomic_blocks)
+            seen["next_attempt_at"] = OutboundEmail.objects.get(id=email.id).next_attempt_at
+            seen["second_worker"] = EmailOutbox.send_pending()
+            return len(messages)
+
+        before = timezone.now()
+        with mock.patch.object(LocmemEmailBackend, "send_messages", autospec=True, side_effect=send_messages):
+            self.assertEqual(EmailOutbox.send_pending(), 1)
+
+        self.assertEqual(seen["depth"], depth)
+        self.assertGreater(seen["next_attempt_at"], before + timedelta(minutes=10))
+        self.assertEqual(seen["second_worker"], 0)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.SENT)
+
+    def test_failed_send_is_retried_after_backoff(self):
+        email = send_approval_email(self.user)
+        failure = smtplib.SMTPRecipientsRefused({self.user.email: (550, b"mailbox unavailable")})
+
+        before = timezone.now()
+        with mock.patch.object(LocmemEmailBackend, "send_messages", side_effect=failure), \
+                self.assertLogs("auth_app.services", "WARNING"):
+            self.assertEqual(EmailOutbox.send_pending(), 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("mailbox unavailable", email.last_error)
+        self.assertLess(email.next_attempt_at, before + timedelta(seconds=120))
+        self.assertEqual(EmailOutbox.send_pending(), 0)
+
+        OutboundEmail.objects.filter(id=email.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(EmailOutbox.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
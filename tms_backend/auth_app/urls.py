@@ -1,8 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
-
-from auth_app.views import AdminApprovalView, ApprovedUsersView, CustomTokenObtainPairView, DeactivateUserView, DepartmentEmployeesView, DepartmentViewSet, LogoutView, ReactivateUserView, UserDetailView, UserListView, UserRegistrationView, UserResubmissionView, UserStatusHistoryViewSet
+from auth_app.views import AdminApprovalView, ApprovedUsersView, BulkAdminApprovalView, BulkDeactivateUsersView, CustomTokenObtainPairView, CustomTokenRefreshView, DeactivateUserView, DepartmentEmployeesView, DepartmentViewSet, LogoutView, ReactivateUserView, UserDetailView, UserListView, UserRegistrationView, UserResubmissionView, UserStatusHistoryViewSet
     
 
 
@@ -14,10 +12,11 @@ urlpatterns = [
     path('',include(router.urls)),
     # path("admin/", admin.site.urls),
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('api/logout/',LogoutView.as_view(),name='logout'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('approve/<int:user_id>/', AdminApprovalView.as_view(), name='approve'),
+    path('approve/bulk/', BulkAdminApprovalView.as_view(), name='bulk-approve'),
     path('users/', AdminApprovalView.as_view(), name='users'),
     path('users-list/', UserListView.as_view(), name='user-list'),
     path('api/users/me/',UserDetailView.as_view(),name='current-user'),
@@ -25,6 +24,7 @@ urlpatterns = [
     path("resubmit/<int:user_id>/", UserResubmissionView.as_view(), name="resubmit"),
     path("activate/<int:user_id>/",ReactivateUserView.as_view(),name="activate"),
     path("deactivate/<int:user_id>/",DeactivateUserView.as_view(),name="activate"),
+    path("deactivate/bulk/", BulkDeactivateUsersView.as_view(), name="bulk-deactivate"),
     path("update-role/<int:user_id>/", AdminApprovalView.as_view(), name="update-role"),
     path('approved-users/', ApprovedUsersView.as_view(), name='approved-users'),
     path("departments/<int:department_id>/employees/", DepartmentEmployeesView.as_view(), name="department-employees"),
@@ -1,4 +1,5 @@
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, viewsets, generics
@@ -6,18 +7,25 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.pagination import PageNumberPagination
 
-from auth_app.serializers import CustomTokenObtainPairSerializer
+from auth_app.serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 from auth_app.permissions import IsSystemAdmin, ReadOnlyOrAuthenticated
-from auth_app.services import StandardResultsSetPagination, send_approval_email, send_rejection_email
-from core import serializers
+from auth_app.services import StandardResultsSetPagination, TokenRevocationCache, blacklist_access_token, deactivate_users, review_registrations, send_approval_email, send_rejection_email
+from rest_framework import serializers
 from .models import Department, User, UserStatusHistory
 from .serializers import DepartmentSerializer, UserDetailSerializer, UserListSerializer, UserRegistrationSerializer, AdminApproveSerializer, UserStatusHistorySerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
 class UserRegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -126,31 +134,22 @@ class AdminApprovalView(APIView):
 
         serializer = AdminApproveSerializer(user, data=request_data, partial=True)
         if serializer.is_valid():
-            UserStatusHistory.objects.create(
-                user=user,
-                status=action,
-                rejection_message=rejection_message if action == UserStatusHistory.STATUS_CHOICES[1][0] else None,
-            )
-
-            try:
+            # The email is only queued, so the history row, the user update and
+            # the email commit together and nothing here waits on SMTP.
+            with transaction.atomic():
+                UserStatusHistory.objects.create(
+                    user=user,
+                    status=action,
+                    rejection_message=rejection_message if action == UserStatusHistory.STATUS_CHOICES[1][0] else None,
+                )
+                serializer.save()
                 if action == UserStatusHistory.STATUS_CHOICES[0][0]:
                     send_approval_email(user)
                 elif action == UserStatusHistory.STATUS_CHOICES[1][0]:
                     send_rejection_email(user, rejection_message)
-                serializer.save()
-            except Exception as e:
-                return Response(
-                    {
-                        "error": (
-                            f"User {action}d, but email could not be sent. "
-                            f"Error: {str(e)}"
-                        )
-                    },
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
 
             return Response(
-                {"message": f"User {action}d successfully, and email sent."},
+                {"message": f"User {action}d successfully, and email queued."},
                 status=status.HTTP_200_OK,
             )
         else:
@@ -214,9 +213,10 @@ class UserResubmissionView(APIView):
 
         serializer = UserDetailSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            user.is_pending = True  
-            user.save()
+            with transaction.atomic():
+                serializer.save()
+                user.is_pending = True  
+                user.save()
 
             return Response({"message": "Your details have been updated and sent for review."}, status=status.HTTP_200_OK)
 
@@ -235,6 +235,73 @@ class DeactivateUserView(APIView):
         except User.DoesNotExist:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
+class BulkAdminApprovalView(APIView):
+    permission_classes = [IsSystemAdmin]
+    MAX_USERS = 1000
+
+    def post(self, request):
+        user_ids = request.data.get("user_ids")
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response({"error": "user_ids must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > self.MAX_USERS:
+            return Response(
+                {"error": f"At most {self.MAX_USERS} users can be reviewed at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            user_ids = {int(user_id) for user_id in user_ids}
+        except (TypeError, ValueError):
+            return Response({"error": "user_ids must contain integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        action = request.data.get("action")
+        if action not in dict(UserStatusHistory.STATUS_CHOICES):
+            return Response(
+                {"error": "Invalid action. Please specify 'approve' or 'reject'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rejection_message = (request.data.get("rejection_message") or "").strip()
+        if action == UserStatusHistory.STATUS_CHOICES[1][0] and not rejection_message:
+            return Response(
+                {"error": "Rejection message is required for rejection."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        reviewed = review_registrations(user_ids, action, rejection_message)
+        return Response(
+            {
+                "message": f"{len(reviewed)} user(s) {dict(UserStatusHistory.STATUS_CHOICES)[action].lower()}, and emails queued.",
+                "reviewed": reviewed,
+                "skipped": sorted(user_ids - set(reviewed)),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+class BulkDeactivateUsersView(APIView):
+    permission_classes = [IsSystemAdmin]
+    MAX_USERS = BulkAdminApprovalView.MAX_USERS
+
+    def post(self, request):
+        user_ids = request.data.get("user_ids")
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response({"error": "user_ids must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > self.MAX_USERS:
+            return Response(
+                {"error": f"At most {self.MAX_USERS} users can be deactivated at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            user_ids = {int(user_id) for user_id in user_ids}
+        except (TypeError, ValueError):
+            return Response({"error": "user_ids must contain integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.id in user_ids:
+            return Response({"error": "You cannot deactivate your own account."}, status=status.HTTP_400_BAD_REQUEST)
+
+        deactivated = deactivate_users(user_ids)
+        return Response(
+            {"message": f"{len(deactivated)} user(s) deactivated.", "deactivated": deactivated},
+            status=status.HTTP_200_OK,
+        )
+
 class ReactivateUserView(APIView):
     permission_classes = [IsSystemAdmin]  
 
@@ -248,16 +315,17 @@ class ReactivateUserView(APIView):
         
 
 class UserStatusHistoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = UserStatusHistory.objects.all().order_by('-timestamp')
+    queryset = UserStatusHistory.objects.select_related('user').order_by('-timestamp')
     serializer_class = UserStatusHistorySerializer
     permission_classes = [permissions.IsAuthenticated] 
     pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if user.is_superuser or user.role == user.SYSTEM_ADMIN:
-            return UserStatusHistory.objects.all().order_by('-timestamp')
-        return UserStatusHistory.objects.filter(user=user).order_by('-timestamp')
+            return queryset
+        return queryset.filter(user=user)
 class UserListView(generics.ListAPIView):
     queryset = User.objects.filter(role = User.EMPLOYEE,is_active=True,is_deleted=False)
     serializer_class = UserListSerializer
@@ -360,11 +428,14 @@ class LogoutView(APIView):
 
             refresh = RefreshToken(refresh_token)  
             refresh.blacklist()
+            if request.auth:
+                blacklist_access_token(request.auth)
+            TokenRevocationCache.revoke_jti(refresh.get("jti"), request.auth.get("jti") if request.auth else None)
             
             return Response({"message": "Successfully logged out"}, status=status.HTTP_200_OK)
         
-        except Exception as e:
-            print(f"Logout error: {e}")  
+        except Exception:
+            logger.exception("Logout failed for user %s", request.user.pk)
             return Response({"error": "An error occurred during logout"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)        
         
         
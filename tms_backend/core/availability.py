@@ -0,0 +1,154 @@
+"""
+Date-range vehicle availability.
+
+A vehicle is booked by every approved, not yet completed ``TransportRequest``
+or ``HighCostTransportRequest`` it is assigned to, for the inclusive window
+``start_day``..``return_day``. Two windows overlap when each starts on or
+before the other ends, which the partial ``(vehicle, start_day, return_day)``
+indexes on both models answer without scanning past requests.
+
+A vehicle booked for a later day stays available until its trip starts;
+``start_due_trips`` (``python manage.py start_due_trips``) then moves it to in
+use, as ``book_vehicle`` does straight away for trips starting today.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import accumulate
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.dashboard import FleetDashboard
+from core.models import HighCostTransportRequest, TransportRequest, Vehicle
+
+BOOKING_MODELS = (TransportRequest, HighCostTransportRequest)
+
+# Vehicles in these states cannot be booked for any date.
+UNBOOKABLE_STATUSES = (Vehicle.SERVICE, Vehicle.MAINTENANCE)
+
+
+class VehicleUnavailable(Exception):
+    pass
+
+
+def _booked(model, start_day, return_day, exclude=None):
+    bookings = model.objects.filter(
+        status='approved',
+        trip_completed=False,
+        vehicle__isnull=False,
+        start_day__lte=return_day,
+        return_day__gte=start_day,
+    )
+    if isinstance(exclude, model):
+        bookings = bookings.exclude(pk=exclude.pk)
+    return bookings
+
+
+def available_vehicles(start_day, return_day, min_capacity=0, exclude=None):
+    """Vehicles with at least ``min_capacity`` seats and no booking overlapping the window."""
+    queryset = Vehicle.objects.exclude(status__in=UNBOOKABLE_STATUSES).filter(capacity__gte=min_capacity)
+    for model in BOOKING_MODELS:
+        overlapping = _booked(model, start_day, return_day, exclude).filter(vehicle=OuterRef('pk'))
+        queryset = queryset.exclude(Exists(overlapping))
+    return queryset
+
+
+def is_vehicle_free(vehicle, start_day, return_day, exclude=None):
+    if vehicle.status in UNBOOKABLE_STATUSES:
+        return False
+    return not any(
+        _booked(model, start_day, return_day, exclude).filter(vehicle=vehicle).exists()
+        for model in BOOKING_MODELS
+    )
+
+
+def book_vehicle(vehicle_id, booking):
+    """
+    Reserve a vehicle for ``booking``'s window and return it.
+
+    The vehicle row is locked until the surrounding transaction ends, so two
+    bookings of the same vehicle are checked one after the other. A trip that
+    has already started also moves the vehicle to in use. Raises
+    ``VehicleUnavailable`` when the vehicle cannot take the booking.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError("book_vehicle() must be called inside a transaction.")
+
+    vehicle = Vehicle.objects.select_for_update().select_related('driver').filter(id=vehicle_id).first()
+    if not vehicle:
+        raise VehicleUnavailable("Invalid vehicle ID.")
+    if not is_vehicle_free(vehicle, booking.start_day, booking.return_day, exclude=booking):
+        raise VehicleUnavailable("Vehicle is not available for the requested dates.")
+    if booking.start_day <= timezone.localdate() and not vehicle.claim():
+        raise VehicleUnavailable("Vehicle is not available.")
+    return vehicle
+
+
+def start_due_trips(day=None):
+    """
+    Move every available vehicle whose booking covers ``day`` (today by
+    default) to in use, in one UPDATE. Returns the number of vehicles moved.
+    """
+    day = day or timezone.localdate()
+    travelling = Q()
+    for model in BOOKING_MODELS:
+        travelling |= Q(Exists(_booked(model, day, day).filter(vehicle=OuterRef('pk'))))
+    with transaction.atomic():
+        started = Vehicle.objects.filter(travelling, status=Vehicle.AVAILABLE).update(status=Vehicle.IN_USE)
+        # A queryset update sends no post_save, so move the rollup here.
+        FleetDashboard.adjust({
+            FleetDashboard.vehicle_key(Vehicle.AVAILABLE): -started,
+            FleetDashboard.vehicle_key(Vehicle.IN_USE): started,
+        })
+    return started
+
+
+class AvailabilityIndex:
+    """
+    In-memory interval index over the bookings in a planning horizon.
+
+    Built with one query per booking model plus one for the vehicles, after
+    which each availability question costs O(log n) per vehicle instead of a
+    query.
+    Per vehicle, bookings are sorted by start day alongside a running maximum of
+    their return days: the bookings starting on or before ``return_day`` are a
+    prefix of that list, and the window is free when none of them ends on or
+    after ``start_day``.
+    """
+
+    def __init__(self, vehicles, bookings):
+        self.vehicles = list(vehicles)
+        intervals = defaultdict(list)
+        for vehicle_id, start, end in bookings:
+            intervals[vehicle_id].append((start, end))
+
+        self._starts = {}
+        self._max_ends = {}
+        for vehicle_id, spans in intervals.items():
+            spans.sort()
+            self._starts[vehicle_id] = [start for start, _ in spans]
+            self._max_ends[vehicle_id] = list(accumulate((end for _, end in spans), max))
+
+    @classmethod
+    def build(cls, start_day, return_day):
+        vehicles = Vehicle.objects.exclude(status__in=UNBOOKABLE_STATUSES).select_related('driver').order_by('id')
+        bookings = []
+        for model in BOOKING_MODELS:
+            bookings.extend(
+                _booked(model, start_day, return_day).values_list('vehicle_id', 'start_day', 'return_day')
+            )
+        return cls(vehicles, bookings)
+
+    def is_free(self, vehicle_id, start_day, return_day):
+        starts = self._starts.get(vehicle_id)
+        if not starts:
+            return True
+        i = bisect_right(starts, return_day)
+        return i == 0 or self._max_ends[vehicle_id][i - 1] < start_day
+
+    def free_vehicles(self, start_day, return_day, min_capacity=0):
+        return [
+            vehicle for vehicle in self.vehicles
+            if vehicle.capacity >= min_capacity and self.is_free(vehicle.id, start_day, return_day)
+        ]
@@ -0,0 +1,40 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from core.services import NotificationService
+
+
+class UserNotificationConsumer(AsyncJsonWebsocketConsumer):
+    """Push new notifications and unread-count changes to the connected user."""
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = f"user_{user.id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({
+            "type": "unread_count",
+            "unread_count": await database_sync_to_async(NotificationService.get_unread_count)(user.id),
+        })
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        await self.send_json({
+            "type": "notification",
+            "notification": event["notification"],
+            "unread_delta": event.get("unread_delta", 1),
+        })
+
+    async def unread_changed(self, event):
+        payload = {"type": "unread_count"}
+        for key in ("unread_count", "unread_delta", "notification_id"):
+            if key in event:
+                payload[key] = event[key]
+        await self.send_json(payload)
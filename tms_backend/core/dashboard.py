@@ -0,0 +1,194 @@
+"""
+Fleet dashboard rollups.
+
+Every figure on the transport manager dashboard is a ``DashboardCounter`` row
+that is adjusted once the transaction making the change it counts commits, so
+reading the dashboard is a single small query instead of aggregates over the
+request tables.
+
+Counters follow ``post_save`` / ``post_delete`` of vehicles and requests, plus
+the queryset updates that move them explicitly (``Vehicle.claim`` and
+``start_due_trips``). Anything else leaves them behind and needs
+``python manage.py rebuild_dashboard`` afterwards:
+
+- ``bulk_create``, ``QuerySet.update`` or raw SQL on vehicles or requests,
+  including admin bulk actions and data migrations;
+- a cost field edited after the request was approved, as spend is counted
+  at approval;
+- a process that dies between a commit and applying its deltas.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, DateTimeField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from auth_app.models import User
+from core.models import (
+    ActionLog,
+    DashboardCounter,
+    HighCostTransportRequest,
+    MaintenanceRequest,
+    RefuelingRequest,
+    TransportRequest,
+    Vehicle,
+)
+
+OPEN_STATUSES = ('pending', 'forwarded')
+
+
+class FleetDashboard:
+    # label -> (model, field whose value counts as spend once approved)
+    REQUEST_KINDS = {
+        'transport': (TransportRequest, None),
+        'highcost': (HighCostTransportRequest, 'total_cost'),
+        'maintenance': (MaintenanceRequest, 'maintenance_total_cost'),
+        'fuel': (RefuelingRequest, 'total_cost'),
+    }
+
+    @staticmethod
+    def vehicle_key(status):
+        return f"vehicles:{status}"
+
+    @staticmethod
+    def stage_key(kind, role):
+        return f"requests:{kind}:{role}"
+
+    @staticmethod
+    def spend_key(kind, month):
+        return f"spend:{kind}:{month:%Y-%m}"
+
+    @classmethod
+    def kind_of(cls, model):
+        for kind, (kind_model, _) in cls.REQUEST_KINDS.items():
+            if kind_model is model:
+                return kind
+        return None
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Add ``deltas`` (key -> amount) to the counters when the current
+        transaction commits; a rolled-back change never reaches them.
+
+        The counter rows are shared by every request, so they are only locked
+        by the short transaction applying the deltas, not for as long as the
+        transaction that made the change stays open.
+        """
+        deltas = {key: amount for key, amount in deltas.items() if amount}
+        if deltas:
+            transaction.on_commit(lambda: cls.apply(deltas))
+
+    @classmethod
+    def apply(cls, deltas):
+        """Add ``deltas`` to the counters now, creating missing rows."""
+        with transaction.atomic():
+            DashboardCounter.objects.bulk_create(
+                [DashboardCounter(key=key) for key in deltas], ignore_conflicts=True
+            )
+            now = timezone.now()
+            for key, amount in sorted(deltas.items()):
+                DashboardCounter.objects.filter(key=key).update(value=F('value') + amount, updated_at=now)
+
+    @classmethod
+    def vehicle_status_changed(cls, old_status, new_status):
+        deltas = Counter()
+        if old_status:
+            deltas[cls.vehicle_key(old_status)] -= 1
+        if new_status:
+            deltas[cls.vehicle_key(new_status)] += 1
+        cls.adjust(deltas)
+
+    @classmethod
+    def request_changed(cls, request_obj, old_state, new_state):
+        """
+        Move ``request_obj`` between stages. ``old_state`` / ``new_state`` are
+        ``TrackedStateMixin`` states, or None when the request did not exist
+        before / no longer exists.
+        """
+        kind = cls.kind_of(type(request_obj))
+        deltas = Counter()
+        if old_state and old_state['status'] in OPEN_STATUSES:
+            deltas[cls.stage_key(kind, old_state['current_approver_role'])] -= 1
+        if new_state and new_state['status'] in OPEN_STATUSES:
+            deltas[cls.stage_key(kind, new_state['current_approver_role'])] += 1
+
+        cost_field = cls.REQUEST_KINDS[kind][1]
+        newly_approved = new_state and new_state['status'] == 'approved' and (
+            not old_state or old_state['status'] != 'approved'
+        )
+        if cost_field and newly_approved:
+            deltas[cls.spend_key(kind, timezone.localdate())] += getattr(request_obj, cost_field) or 0
+        cls.adjust(deltas)
+
+    @classmethod
+    def snapshot(cls):
+        """The dashboard for the current month, read from the rollups in one query."""
+        month = timezone.localdate()
+        spend_keys = {cls.spend_key(kind, month): kind for kind, (_, field) in cls.REQUEST_KINDS.items() if field}
+        counters = dict(
+            DashboardCounter.objects.filter(
+                Q(key__startswith='vehicles:') | Q(key__startswith='requests:') | Q(key__in=spend_keys)
+            ).values_list('key', 'value')
+        )
+
+        role_names = dict(User.ROLE_CHOICES)
+        pending = {kind: {} for kind in cls.REQUEST_KINDS}
+        for key, value in counters.items():
+            if key.startswith('requests:') and value:
+                _, kind, role = key.split(':')
+                pending[kind][role_names.get(int(role), role)] = int(value)
+
+        return {
+            'vehicles': {
+                status: int(counters.get(cls.vehicle_key(status), 0))
+                for status, _ in Vehicle.VEHICLE_STATUS_CHOICES
+            },
+            'pending_requests': pending,
+            'month_to_date_spend': {
+                'month': f"{month:%Y-%m}",
+                **{kind: counters.get(key, Decimal('0.00')) for key, kind in spend_keys.items()},
+            },
+        }
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter from the source tables. Returns the number of counters written."""
+        values = Counter()
+        for row in Vehicle.objects.values('status').annotate(total=Count('id')):
+            values[cls.vehicle_key(row['status'])] += row['total']
+
+        for kind, (model, cost_field) in cls.REQUEST_KINDS.items():
+            stages = (
+                model.objects.filter(status__in=OPEN_STATUSES)
+                .values('current_approver_role').annotate(total=Count('id'))
+            )
+            for row in stages:
+                values[cls.stage_key(kind, row['current_approver_role'])] += row['total']
+
+            if not cost_field:
+                continue
+            # Approvals are dated by their action log entry, falling back to the
+            # request's last update for rows approved before it was recorded.
+            approved_at = ActionLog.objects.filter(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id=OuterRef('pk'),
+                action='approved',
+            ).order_by('-timestamp').values('timestamp')[:1]
+            spend = (
+                model.objects.filter(status='approved')
+                .annotate(month=TruncMonth(Coalesce(Subquery(approved_at), 'updated_at', output_field=DateTimeField())))
+                .values('month').annotate(total=Sum(cost_field))
+            )
+            for row in spend:
+                values[cls.spend_key(kind, row['month'])] += row['total'] or 0
+
+        with transaction.atomic():
+            DashboardCounter.objects.all().delete()
+            DashboardCounter.objects.bulk_create(
+                [DashboardCounter(key=key, value=value) for key, value in values.items()]
+            )
+        return len(values)
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Expand pending notification intents into notifications and websocket pushes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Intents claimed per transaction.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        processed_ids = set()
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            # Websocket clients are connected to the web processes, not to this one.
+            logger.error(
+                "The channel layer is in-memory, so notifications delivered here are never pushed to "
+                "websockets. Set REDIS_URL or CHANNEL_REDIS_URL to the Redis server the web processes use."
+            )
+
+        try:
+            while True:
+                close_old_connections()
+                processed = NotificationService.deliver_intents(batch_size=batch_size)
+                processed_ids.update(intent.id for intent in processed)
+                if processed:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(processed_ids)} notification intent(s)."))
@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_app.models import User
+from core.mileage import KilometerBatchError, ingest_kilometers, parse_kilometer_csv
+
+
+class Command(BaseCommand):
+    help = "Record monthly kilometers for many vehicles from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV with vehicle,month,kilometers_driven columns, or a JSON list of entries.")
+        parser.add_argument("--format", choices=["csv", "json"],
+                            help="File format; guessed from the extension when omitted.")
+        parser.add_argument("--recorded-by", help="Email of the user the logs are recorded by.")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist.")
+        text = path.read_text(encoding="utf-8-sig")
+
+        file_format = options["format"] or ("json" if path.suffix.lower() == ".json" else "csv")
+        if file_format == "json":
+            try:
+                entries = json.loads(text)
+            except ValueError as exc:
+                raise CommandError(f"Invalid JSON: {exc}")
+        else:
+            entries = parse_kilometer_csv(text)
+        if not isinstance(entries, list):
+            raise CommandError("JSON input must be a list of entries.")
+
+        recorded_by = None
+        if options["recorded_by"]:
+            recorded_by = User.objects.filter(email=options["recorded_by"]).first()
+            if recorded_by is None:
+                raise CommandError(f"No user with email {options['recorded_by']}.")
+
+        try:
+            logs, due_vehicles = ingest_kilometers(entries, recorded_by=recorded_by)
+        except KilometerBatchError as exc:
+            for position, error in exc.errors.items():
+                self.stderr.write(f"Entry {position}: {error}")
+            raise CommandError("No kilometers were recorded.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recorded {len(logs)} monthly log(s); {len(due_vehicles)} vehicle(s) due for service."
+        ))
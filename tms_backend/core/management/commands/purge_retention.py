@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import POLICIES, purge
+
+
+class Command(BaseCommand):
+    help = "Archive and delete notifications, action logs and status history past their retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", action="append", dest="policies", choices=sorted(POLICIES),
+                            help="Only apply this policy (can be repeated). Defaults to all of them.")
+        parser.add_argument("--days", type=int, help="Override the retention period in days.")
+        parser.add_argument("--batch-size", type=int, help="Rows archived and deleted per transaction.")
+        parser.add_argument("--pause", type=float, help="Seconds to sleep between batches.")
+        parser.add_argument("--no-archive", action="store_true", help="Delete without writing archive files.")
+
+    def handle(self, *args, **options):
+        if options["days"] is not None and options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+
+        for name in options["policies"] or POLICIES:
+            purged = purge(
+                POLICIES[name],
+                days=options["days"],
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+                archive=not options["no_archive"],
+                stdout=self.stdout if options["verbosity"] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(f"{name}: purged {purged} row(s)."))
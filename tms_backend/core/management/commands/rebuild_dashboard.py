@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.dashboard import FleetDashboard
+
+
+class Command(BaseCommand):
+    help = "Recompute the fleet dashboard rollups from the vehicle and request tables."
+
+    def handle(self, *args, **options):
+        written = FleetDashboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} dashboard counter(s)."))
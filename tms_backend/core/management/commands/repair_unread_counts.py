@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.services import UnreadNotificationCounter
+
+
+class Command(BaseCommand):
+    help = "Recompute cached unread-notification counts from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                            help="Only repair this user id (can be repeated).")
+
+    def handle(self, *args, **options):
+        refreshed = UnreadNotificationCounter.rebuild(options["user_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired unread counts for {refreshed} user(s)."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.availability import start_due_trips
+
+
+class Command(BaseCommand):
+    help = "Move vehicles to in use once the trip they are booked for has started."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Sweep the bookings once and exit.")
+        parser.add_argument("--interval", type=float, default=900.0, help="Seconds between sweeps.")
+
+    def handle(self, *args, **options):
+        started = 0
+
+        try:
+            while True:
+                close_old_connections()
+                started += start_due_trips()
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {started} vehicle(s) to in use."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.mileage import sweep_service_due
+
+
+class Command(BaseCommand):
+    help = "Alert on vehicles past their service interval that have no open service_due notification."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Sweep the fleet once and exit.")
+        parser.add_argument("--interval", type=float, default=3600.0, help="Seconds between sweeps.")
+
+    def handle(self, *args, **options):
+        alerted = 0
+
+        try:
+            while True:
+                close_old_connections()
+                alerted += len(sweep_service_due())
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Sent service alerts for {alerted} vehicle(s)."))
@@ -0,0 +1,159 @@
+"""
+In-process request metrics in the Prometheus text format.
+
+``RequestMetricsMiddleware`` observes every request into the histograms below,
+labelled by resolved URL name, the caller's role and the HTTP method. Each
+worker process keeps its own series; Prometheus scrapes every worker and sums
+them, so nothing here is shared or written to the database.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # labels -> [per-bucket counts (the last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_number(bound))])
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_number(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class MetricsRegistry:
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_LABELS = ('view', 'role', 'method')
+
+REQUESTS = REGISTRY.register(Counter(
+    'tms_http_requests_total', 'Requests served, by response status.', (*REQUEST_LABELS, 'status'),
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'tms_http_request_duration_seconds', 'Wall time from the middleware to the last response byte.',
+    DURATION_BUCKETS, REQUEST_LABELS,
+))
+DB_QUERIES = REGISTRY.register(Histogram(
+    'tms_http_request_db_queries', 'Database queries run while serving a request.', QUERY_BUCKETS, REQUEST_LABELS,
+))
+DB_DURATION = REGISTRY.register(Histogram(
+    'tms_http_request_db_duration_seconds', 'Time spent in database queries while serving a request.',
+    DURATION_BUCKETS, REQUEST_LABELS,
+))
+RESPONSE_SIZE = REGISTRY.register(Histogram(
+    'tms_http_response_size_bytes', 'Response body size.', SIZE_BUCKETS, REQUEST_LABELS,
+))
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` hook that counts and times every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+    def wrap(self):
+        return connection.execute_wrapper(self)
+
+
+def observe_request(labels, status, duration, queries, db_duration, size):
+    REQUESTS.inc((*labels, str(status)))
+    REQUEST_DURATION.observe(duration, labels)
+    DB_QUERIES.observe(queries, labels)
+    DB_DURATION.observe(db_duration, labels)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, labels)
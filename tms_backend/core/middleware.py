@@ -0,0 +1,177 @@
+import cProfile
+import logging
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from auth_app.authentication import CustomJWTAuthentication
+from auth_app.models import User
+from core.metrics import QueryTimer, observe_request
+from core.profiling import new_profile_id, save_profile
+
+logger = logging.getLogger('core.requests')
+
+ROLE_LABELS = {role: label.lower().replace(' ', '_') for role, label in User.ROLE_CHOICES}
+
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.url_name else 'unresolved'
+
+
+def _role_label(request):
+    # DRF copies the authenticated user back onto the Django request.
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return ROLE_LABELS.get(getattr(user, 'role', None), 'unknown')
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, query count, query time and response size for every
+    request into ``core.metrics``, labelled by URL name, role and method.
+
+    Queries are timed through ``connection.execute_wrapper``. Streaming
+    responses are measured as they are consumed, including the queries the
+    stream runs, and recorded once the last chunk has gone out. Requests slower
+    than ``REQUEST_METRICS_SLOW_SECONDS`` are also logged with their numbers.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with timer.wrap():
+            response = self.get_response(request)
+
+        labels = (_view_label(request), _role_label(request), request.method)
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._measure_stream(
+                response.streaming_content, labels, response.status_code, started, timer
+            )
+        else:
+            size = None if response.streaming else len(response.content)
+            self._record(labels, response.status_code, started, timer, size)
+        return response
+
+    def _measure_stream(self, content, labels, status, started, timer):
+        size = 0
+        chunks = iter(content)
+        try:
+            while True:
+                with timer.wrap():
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._record(labels, status, started, timer, size)
+
+    def _record(self, labels, status, started, timer, size):
+        duration = time.perf_counter() - started
+        observe_request(labels, status, duration, timer.count, timer.duration, size)
+        if duration >= settings.REQUEST_METRICS_SLOW_SECONDS:
+            view, role, method = labels
+            logger.warning("Slow request to %s", view, extra={
+                'view': view,
+                'role': role,
+                'method': method,
+                'status': status,
+                'duration_ms': round(duration * 1000, 1),
+                'db_queries': timer.count,
+                'db_duration_ms': round(timer.duration * 1000, 1),
+                'response_bytes': size,
+            })
+
+
+class RequestProfilerMiddleware:
+    """
+    Run a request under cProfile and tracemalloc when a system admin asks for
+    it with an ``X-Profile: 1`` header or a ``profile=1`` query parameter.
+    The profile id comes back in the ``X-Profile-Id`` response header.
+
+    Unflagged requests only pay for the flag check. The caller's token is
+    checked here because DRF authenticates later, inside the view. One request
+    is profiled at a time; tracemalloc is process-wide, so allocations made by
+    other threads meanwhile show up in the report too. A streaming response is
+    profiled until the view returns it, not while its body is sent.
+    """
+
+    HEADER = 'X-Profile'
+    PARAM = 'profile'
+    FLAG_VALUES = {'1', 'true', 'yes'}
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        flag = request.headers.get(self.HEADER) or request.GET.get(self.PARAM)
+        if not flag or flag.lower() not in self.FLAG_VALUES:
+            return self.get_response(request)
+        user = self._system_admin(request)
+        if user is None:
+            return self.get_response(request)
+        if not self.lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile-Skipped'] = 'another request is being profiled'
+            return response
+        try:
+            return self._profile(request, user)
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def _system_admin(request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = CustomJWTAuthentication().authenticate(request)
+            except (AuthenticationFailed, InvalidToken):
+                return None
+            user = result[0] if result else None
+        return user if user is not None and user.role == User.SYSTEM_ADMIN else None
+
+    def _profile(self, request, user):
+        profile_id = new_profile_id()
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(settings.REQUEST_PROFILE_TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+
+        save_profile(profile_id, profiler, snapshot, peak_bytes, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': _view_label(request),
+            'user_id': user.pk,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+        })
+        logger.info("Profiled request to %s", request.path, extra={'profile_id': profile_id})
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_notificationintent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='highcosttransportrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='core_highco_status_7fb5e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='core_mainte_status_27def4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refuelingrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='core_refuel_status_02f79b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='core_transp_status_6c7964_idx'),
+        ),
+    ]
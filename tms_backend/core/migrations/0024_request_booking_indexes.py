@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_request_status_created_at_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='highcosttransportrequest',
+            index=models.Index(condition=models.Q(('status', 'approved'), ('trip_completed', False)), fields=['vehicle', 'start_day', 'return_day'], name='core_highcost_booking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportrequest',
+            index=models.Index(condition=models.Q(('status', 'approved'), ('trip_completed', False)), fields=['vehicle', 'start_day', 'return_day'], name='core_transport_booking_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:02
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_dashboardcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('total_kilometers'), '-', models.F('last_service_kilometers')), name='core_vehicle_km_since_service'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0026_vehicle_km_since_service_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notificationintent',
+            name='core_notifi_status_fa9585_idx',
+        ),
+        migrations.AddField(
+            model_name='notificationintent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='notificationintent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='core_notifi_status_dec8fe_idx'),
+        ),
+    ]
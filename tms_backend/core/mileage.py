@@ -0,0 +1,193 @@
+"""
+Monthly kilometer ingestion.
+
+A batch of ``(vehicle, month, kilometers_driven)`` entries is validated as a
+whole and then recorded set-wise: one query resolves the vehicles, one finds
+months already recorded, one ``bulk_create`` writes the logs, one ``UPDATE``
+adds every vehicle's kilometers with ``F()`` and a single pass notifies the
+vehicles that became due for service. The number of queries is the same for
+one vehicle as for the whole fleet.
+
+Service alerts come from ``sweep_service_due``, which finds every vehicle past
+its interval without an open ``service_due`` notification in one query. It
+runs for the vehicles of each batch and periodically for the whole fleet
+(``python manage.py sweep_service_due``); an alert stays open until the
+vehicle's ``last_service_kilometers`` is updated.
+"""
+import csv
+import io
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Q, Value, When
+
+from auth_app.models import User
+from core.models import MonthlyKilometerLog, Notification, Vehicle
+from core.serializers import MonthlyKilometerEntrySerializer
+from core.services import NotificationService
+
+MAX_ENTRIES = 5000
+
+
+class KilometerBatchError(Exception):
+    """The batch was rejected; ``errors`` maps entry positions to their problems."""
+
+    def __init__(self, errors):
+        super().__init__("Monthly kilometer batch is invalid.")
+        self.errors = errors
+
+
+def parse_kilometer_csv(text):
+    """Entries from CSV text with a ``vehicle,month,kilometers_driven`` header."""
+    return [
+        {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def _resolve_vehicles(keys):
+    """Map each key (vehicle id or license plate) to its vehicle, in one query."""
+    ids = {int(key) for key in keys if key.isdigit()}
+    vehicles = list(Vehicle.objects.filter(Q(id__in=ids) | Q(license_plate__in=keys)).select_related('driver'))
+    by_id = {str(vehicle.id): vehicle for vehicle in vehicles}
+    by_plate = {vehicle.license_plate: vehicle for vehicle in vehicles}
+    # An id wins over a plate that happens to be the same digits.
+    return {key: by_id.get(key) or by_plate.get(key) for key in keys}
+
+
+def validate_entries(entries):
+    """
+    Validate a whole batch and return ``[(vehicle, month, kilometers)]``.
+    Raises ``KilometerBatchError`` listing every bad entry, so nothing is
+    recorded unless all of them can be.
+    """
+    if len(entries) > MAX_ENTRIES:
+        raise KilometerBatchError({'entries': [f"At most {MAX_ENTRIES} entries can be recorded at once."]})
+
+    serializer = MonthlyKilometerEntrySerializer(data=entries, many=True)
+    if not serializer.is_valid():
+        raise KilometerBatchError({
+            index: error for index, error in enumerate(serializer.errors) if error
+        })
+    rows = serializer.validated_data
+
+    vehicles = _resolve_vehicles({row['vehicle'] for row in rows})
+    recorded = set(
+        MonthlyKilometerLog.objects.filter(
+            vehicle_id__in={vehicle.id for vehicle in vehicles.values() if vehicle}, month__in={row['month'] for row in rows}
+        ).values_list('vehicle_id', 'month')
+    )
+
+    errors = {}
+    seen = set()
+    resolved = []
+    for index, row in enumerate(rows):
+        vehicle = vehicles.get(row['vehicle'])
+        if vehicle is None:
+            errors[index] = {'vehicle': [f"Vehicle {row['vehicle']} does not exist."]}
+            continue
+        key = (vehicle.id, row['month'])
+        if key in recorded:
+            errors[index] = {'month': [f"Kilometers for {row['month']} already recorded for this vehicle."]}
+        elif key in seen:
+            errors[index] = {'month': [f"{row['month']} is listed more than once for this vehicle."]}
+        seen.add(key)
+        resolved.append((vehicle, row['month'], row['kilometers_driven']))
+    if errors:
+        raise KilometerBatchError(errors)
+    return resolved
+
+
+def record_kilometers(entries, recorded_by=None):
+    """
+    Record validated ``(vehicle, month, kilometers)`` entries and notify the
+    vehicles now due for service. Returns ``(logs, due_vehicles)``.
+    """
+    totals = defaultdict(float)
+    for vehicle, _, kilometers in entries:
+        totals[vehicle.id] += kilometers
+
+    with transaction.atomic():
+        logs = MonthlyKilometerLog.objects.bulk_create([
+            MonthlyKilometerLog(vehicle=vehicle, month=month, kilometers_driven=kilometers, recorded_by=recorded_by)
+            for vehicle, month, kilometers in entries
+        ])
+        Vehicle.objects.filter(id__in=totals).update(
+            total_kilometers=F('total_kilometers') + Case(
+                *(When(id=vehicle_id, then=Value(total)) for vehicle_id, total in totals.items()),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        due_vehicles = sweep_service_due(vehicle_ids=totals)
+    return logs, due_vehicles
+
+
+def service_interval():
+    """Per-vehicle service interval in km: the model's, else the fuel type's, else the default."""
+    intervals = settings.VEHICLE_SERVICE_INTERVALS_KM
+    whens = [
+        *(When(model=model, then=Value(float(km))) for model, km in intervals['model'].items()),
+        *(When(fuel_type=fuel_type, then=Value(float(km))) for fuel_type, km in intervals['fuel_type'].items()),
+    ]
+    default = Value(float(intervals['default']))
+    return Case(*whens, default=default, output_field=FloatField()) if whens else default
+
+
+def vehicles_due_for_service(vehicle_ids=None):
+    """Vehicles past their service interval that have no open service_due alert."""
+    intervals = settings.VEHICLE_SERVICE_INTERVALS_KM
+    shortest = min([intervals['default'], *intervals['fuel_type'].values(), *intervals['model'].values()])
+    open_alerts = Notification.objects.filter(
+        vehicle=OuterRef('pk'), notification_type='service_due', action_required=True
+    )
+    queryset = (
+        Vehicle.objects
+        .alias(km_since_service=F('total_kilometers') - F('last_service_kilometers'))
+        # Narrow through the expression index first, then apply each vehicle's own interval.
+        .filter(km_since_service__gte=shortest)
+        .exclude(Exists(open_alerts))
+        .select_related('driver')
+    )
+    if intervals['fuel_type'] or intervals['model']:
+        queryset = queryset.alias(interval=service_interval()).filter(km_since_service__gte=F('interval'))
+    if vehicle_ids is not None:
+        queryset = queryset.filter(id__in=vehicle_ids)
+    return queryset
+
+
+def sweep_service_due(vehicle_ids=None):
+    """Alert on every vehicle that became due for service; returns those vehicles."""
+    with transaction.atomic():
+        vehicles = list(vehicles_due_for_service(vehicle_ids))
+        notify_service_due(vehicles)
+    return vehicles
+
+
+def close_service_alerts(vehicle_ids):
+    """Mark the open service_due alerts of freshly serviced vehicles as handled."""
+    return Notification.objects.filter(
+        vehicle_id__in=vehicle_ids, notification_type='service_due', action_required=True
+    ).update(action_required=False)
+
+
+def notify_service_due(vehicles):
+    """Notify transport managers, general system users and each driver, in one batch."""
+    if not vehicles:
+        return []
+    staff = list(User.objects.filter(role__in=[User.TRANSPORT_MANAGER, User.GENERAL_SYSTEM], is_active=True))
+    return NotificationService.send_service_notifications({
+        vehicle: staff + ([vehicle.driver] if vehicle.driver else [])
+        for vehicle in vehicles
+    })
+
+
+def ingest_kilometers(entries, recorded_by=None):
+    """Validate then record a batch of raw entries."""
+    entries = validate_entries(entries)
+    try:
+        return record_kilometers(entries, recorded_by)
+    except IntegrityError:
+        # Another batch recorded one of these months after validation ran.
+        raise KilometerBatchError({'entries': ["Some of these months were recorded meanwhile; submit the batch again."]})
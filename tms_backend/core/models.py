@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
@@ -7,12 +8,36 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.utils.timezone import now
 
 
 User = get_user_model()
 
 
-class Vehicle(models.Model):
+class TrackedStateMixin:
+    """
+    Remembers the stored values of ``TRACKED_FIELDS`` when a row is loaded, so
+    post_save handlers can tell which state a save moved the object out of.
+    ``loaded_state`` is None for objects that were not read from the database.
+    """
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def tracked_state(self):
+        return {field: self.__dict__.get(field) for field in self.TRACKED_FIELDS}
+
+    def remember_state(self):
+        self.loaded_state = self.tracked_state()
+
+
+class Vehicle(TrackedStateMixin, models.Model):
+    TRACKED_FIELDS = ('status', 'last_service_kilometers')
+
     
     AVAILABLE = 'available'
     IN_USE = 'in_use'
@@ -67,6 +92,12 @@ class Vehicle(models.Model):
     )  
 
 
+    class Meta:
+        indexes = [
+            # The service-due sweep filters on kilometers run since the last service.
+            models.Index(F('total_kilometers') - F('last_service_kilometers'), name='core_vehicle_km_since_service'),
+        ]
+
     def clean(self):
         if self.source == self.RENTED and not self.rental_company:
             raise ValidationError({"rental_company": "Rental company is required for rented vehicles."})
@@ -74,27 +105,41 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.model} ({self.license_plate}) - {self.get_source_display()}"
     
+    def claim(self):
+        """
+        Atomically move an available vehicle to in use.
+        Returns True if this call won the vehicle, False if it was no longer available.
+        """
+        from core.dashboard import FleetDashboard
+
+        claimed = Vehicle.objects.filter(pk=self.pk, status=self.AVAILABLE).update(status=self.IN_USE)
+        if claimed:
+            # A queryset update sends no post_save, so move the rollup here.
+            FleetDashboard.vehicle_status_changed(self.AVAILABLE, self.IN_USE)
+            self.status = self.IN_USE
+            self.remember_state()
+        return bool(claimed)
+
     def mark_as_in_use(self):
         """Mark the vehicle as in use when assigned to a transport request."""
-        if self.status != self.AVAILABLE:
+        if not self.claim():
             raise ValidationError(_("Vehicle must be available to be assigned."))
-        self.status = self.IN_USE
-        self.save()
 
     def mark_as_available(self):
         """Mark the vehicle as available when the request is completed."""
-        self.status = self.AVAILABLE
-        self.save()
+        self._set_status(self.AVAILABLE)
 
     def mark_as_service(self):
         """Mark the vehicle as in service."""
-        self.status = self.SERVICE
-        self.save()
+        self._set_status(self.SERVICE)
 
     def mark_as_maintenance(self):
         """Mark the vehicle as under maintenance."""
-        self.status = self.MAINTENANCE
-        self.save()
+        self._set_status(self.MAINTENANCE)
+
+    def _set_status(self, status):
+        self.status = status
+        self.save(update_fields=['status'])
 
 class MonthlyKilometerLog(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
@@ -106,7 +151,8 @@ class MonthlyKilometerLog(models.Model):
     class Meta:
         unique_together = ('vehicle', 'month')
 
-class TransportRequest(models.Model):
+class TransportRequest(TrackedStateMixin, models.Model):
+    TRACKED_FIELDS = ('status', 'current_approver_role')
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('forwarded', 'Forwarded'),
@@ -129,11 +175,22 @@ class TransportRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id']),
+            # Vehicle bookings, for date-range availability (core.availability).
+            models.Index(
+                fields=['vehicle', 'start_day', 'return_day'],
+                condition=Q(status='approved', trip_completed=False),
+                name='core_transport_booking_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.requester.get_full_name()} - {self.destination} ({self.status})"
        
-class HighCostTransportRequest(models.Model):
+class HighCostTransportRequest(TrackedStateMixin, models.Model):
+    TRACKED_FIELDS = ('status', 'current_approver_role')
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('forwarded', 'Forwarded'),
@@ -162,6 +219,16 @@ class HighCostTransportRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id']),
+            # Vehicle bookings, for date-range availability (core.availability).
+            models.Index(
+                fields=['vehicle', 'start_day', 'return_day'],
+                condition=Q(status='approved', trip_completed=False),
+                name='core_highcost_booking_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.requester.get_full_name()} - {self.destination} ({self.status})"
@@ -209,8 +276,10 @@ class Notification(models.Model):
         return f"{self.notification_type} - {self.recipient.full_name}"
 
     def mark_as_read(self):
+        from core.services import NotificationService
+
+        NotificationService.mark_as_read(self.id)
         self.is_read = True
-        self.save()
 
 class TransportRequestActionLog(models.Model):
     transport_request = models.ForeignKey(TransportRequest, on_delete=models.CASCADE, related_name='action_logs')
@@ -224,7 +293,8 @@ class TransportRequestActionLog(models.Model):
     def __str__(self):
         return f"{self.action_by.get_full_name()} {self.action} {self.transport_request.destination} on {self.timestamp}"
     
-class MaintenanceRequest(models.Model):
+class MaintenanceRequest(TrackedStateMixin, models.Model):
+    TRACKED_FIELDS = ('status', 'current_approver_role')
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("forwarded", "Forwarded"),
@@ -245,10 +315,16 @@ class MaintenanceRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.requester} - {self.status} - {self.requesters_car}"
 
-class RefuelingRequest(models.Model):
+class RefuelingRequest(TrackedStateMixin, models.Model):
+    TRACKED_FIELDS = ('status', 'current_approver_role')
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("forwarded", "Forwarded"),
@@ -270,6 +346,11 @@ class RefuelingRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  
     updated_at = models.DateTimeField(auto_now=True) 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.requester} - {self.status} - {self.requesters_car.license_plate}"
     
@@ -290,4 +371,56 @@ class ActionLog(models.Model):
     remarks = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        return f"{self.action_by.get_full_name()} {self.action} {self.content_type} #{self.object_id} on {self.timestamp}"
\ No newline at end of file
+        return f"{self.action_by.get_full_name()} {self.action} {self.content_type} #{self.object_id} on {self.timestamp}"
+
+class NotificationIntent(models.Model):
+    """
+    Outbox row recorded by the approval views in the same transaction as the
+    state change. A worker expands it into Notification rows later on and
+    retries failures with exponential backoff.
+    """
+    PENDING = 'pending'
+    DELIVERED = 'delivered'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DELIVERED, 'Delivered'),
+        (FAILED, 'Failed'),
+    ]
+
+    notification_type = models.CharField(max_length=100)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    request_object = GenericForeignKey('content_type', 'object_id')
+    recipient_ids = models.JSONField(default=list, blank=True)
+    recipient_roles = models.JSONField(default=list, blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} for {self.content_type} #{self.object_id} ({self.status})"
+
+
+class DashboardCounter(models.Model):
+    """
+    One pre-aggregated figure of the fleet dashboard, e.g. ``vehicles:available``.
+    Kept current by core.dashboard.FleetDashboard on every state change.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
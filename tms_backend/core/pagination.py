@@ -0,0 +1,115 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(obj) -> str:
+    """Opaque token pointing just past ``obj`` in ``(-created_at, -id)`` order."""
+    payload = json.dumps({"c": obj.created_at.isoformat(), "i": obj.pk}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Return the ``(created_at, id)`` pair stored in a cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(payload["c"])
+        pk = int(payload["i"])
+    except (TypeError, KeyError, ValueError) as exc:
+        raise ValueError("Invalid cursor.") from exc
+    if created_at is None:
+        raise ValueError("Invalid cursor.")
+    return created_at, pk
+
+
+def paginate_keyset(queryset, cursor=None, page_size=20):
+    """
+    Return ``(items, next_cursor)`` for one page of ``queryset``, newest first.
+
+    Rows are located with a ``(created_at, id) < (cursor)`` seek instead of an
+    OFFSET, so every page costs the same as the first one.
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    items = list(queryset[:page_size + 1])
+    if len(items) > page_size:
+        items = items[:page_size]
+        return items, encode_cursor(items[-1])
+    return items, None
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over ``(created_at, id)``.
+    Clients follow ``next`` (or pass ``next_cursor`` as ``?cursor=``) to get the following page.
+
+    Responses carry no ``count`` or ``previous`` and there are no page numbers:
+    a ``?page=`` left over from the old page-number pagination is rejected
+    with a 400 rather than quietly returning the first page again.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    unsupported_query_params = ("page",)
+
+    def check_query_params(self, request):
+        unsupported = [param for param in self.unsupported_query_params if param in request.query_params]
+        if unsupported:
+            raise ValidationError({
+                param: f"Page numbers are not supported; follow 'next' or pass '{self.cursor_query_param}' instead."
+                for param in unsupported
+            })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.check_query_params(request)
+        try:
+            items, self.next_cursor = paginate_keyset(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request),
+            )
+        except ValueError as exc:
+            raise ValidationError({self.cursor_query_param: str(exc)})
+        return items
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "next_cursor": self.next_cursor,
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "next_cursor": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -1,3 +1,7 @@
+import hmac
+
+from django.conf import settings
+
 from auth_app import permissions
 
 
@@ -9,4 +13,28 @@ class IsAllowedVehicleUser(permissions.BasePermission):
     ALLOWED_ROLES = {2, 3, 4, 5, 6}  # Allowed roles: Department Manager, Finance Manager, Transport Manager, CEO, Driver
 
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role in self.ALLOWED_ROLES
\ No newline at end of file
+        return request.user.is_authenticated and request.user.role in self.ALLOWED_ROLES
+
+
+class IsExportUser(permissions.BasePermission):
+    """
+    Finance and audit roles that may download full request history exports.
+    """
+
+    ALLOWED_ROLES = {3, 5, 7}  # Allowed roles: Finance Manager, CEO, System Admin
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in self.ALLOWED_ROLES
+
+
+class IsMetricsScraper(permissions.BasePermission):
+    """
+    System admins, or a scraper presenting ``METRICS_TOKEN`` in the
+    ``X-Metrics-Token`` header.
+    """
+
+    def has_permission(self, request, view):
+        token = request.headers.get('X-Metrics-Token')
+        if token and settings.METRICS_TOKEN:
+            return hmac.compare_digest(token, settings.METRICS_TOKEN)
+        return request.user.is_authenticated and request.user.role == 7  # System Admin
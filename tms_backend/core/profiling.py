@@ -0,0 +1,123 @@
+"""
+On-demand request profiles.
+
+``RequestProfilerMiddleware`` runs a flagged request under cProfile and
+tracemalloc and hands the result to ``save_profile``, which writes two files
+under ``REQUEST_PROFILE_DIR``: ``<id>.prof``, a pstats dump that snakeviz or
+``python -m pstats`` can open, and ``<id>.json``, a report with the request's
+details, the most expensive functions and the largest allocation sites. Only
+the newest ``REQUEST_PROFILE_KEEP`` profiles are kept.
+"""
+import json
+import os
+import pstats
+import re
+import tracemalloc
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.utils import timezone
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+_PROFILE_ID = re.compile(r'^[0-9A-Za-z-]+$')
+
+
+def profile_dir():
+    return Path(settings.REQUEST_PROFILE_DIR)
+
+
+def new_profile_id():
+    return f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid4().hex[:8]}"
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    functions = []
+    for function in stats.fcn_list[:TOP_FUNCTIONS]:
+        filename, line, name = function
+        primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[function]
+        functions.append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'own_seconds': round(own_time, 6),
+            'cumulative_seconds': round(cumulative_time, 6),
+        })
+    return functions
+
+
+def _top_allocations(snapshot):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return [
+        {
+            'location': f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+            'bytes': statistic.size,
+            'blocks': statistic.count,
+        }
+        for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    ]
+
+
+def _write_atomically(path, write):
+    partial = path.with_name(f".{path.name}.partial")
+    write(partial)
+    os.replace(partial, path)
+
+
+def save_profile(profile_id, profiler, snapshot, peak_bytes, details):
+    """Write the pstats dump and the JSON report of one profiled request."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    report = {
+        'id': profile_id,
+        'created_at': timezone.now().isoformat(),
+        **details,
+        'peak_traced_bytes': peak_bytes,
+        'functions': _top_functions(profiler),
+        'allocations': _top_allocations(snapshot),
+    }
+    _write_atomically(directory / f"{profile_id}.prof", lambda path: profiler.dump_stats(str(path)))
+    _write_atomically(directory / f"{profile_id}.json", lambda path: path.write_text(json.dumps(report, default=str)))
+    _prune(directory)
+    return report
+
+
+def _prune(directory):
+    reports = sorted(directory.glob('*.json'), reverse=True)
+    for stale in reports[settings.REQUEST_PROFILE_KEEP:]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Every stored report without its function and allocation tables, newest first."""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    summaries = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            report = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        report.pop('functions', None)
+        report.pop('allocations', None)
+        summaries.append(report)
+    return summaries
+
+
+def profile_path(profile_id, suffix):
+    """Path of a stored profile file, or None if ``profile_id`` is unknown."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = profile_dir() / f"{profile_id}{suffix}"
+    return path if path.is_file() else None
+
+
+def load_report(profile_id):
+    path = profile_path(profile_id, '.json')
+    return json.loads(path.read_text()) if path else None
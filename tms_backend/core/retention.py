@@ -0,0 +1,168 @@
+"""
+Retention for append-only tables: notifications, action logs and user
+status history.
+
+Rows older than a policy's age are removed in primary-key batches of bounded
+size, each in its own short transaction with a pause in between, so a purge
+never holds long locks or produces one huge WAL burst. Before a batch is
+deleted it is written to a gzip-compressed NDJSON file under
+``RETENTION_ARCHIVE_DIR/<policy>/``, named after the batch's primary-key
+range, which is what ``lookup`` uses to read purged rows back.
+
+A policy can ``keep`` rows that are still in use regardless of age: open
+``service_due`` alerts are what ``sweep_service_due`` checks before alerting
+again, so purging one would re-alert the vehicle on the next sweep.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from auth_app.models import UserStatusHistory
+from core.models import ActionLog, Notification, TransportRequestActionLog
+
+
+class RetentionPolicy:
+    def __init__(self, name, model, date_field, before_delete=None, keep=None):
+        self.name = name
+        self.model = model
+        self.date_field = date_field
+        self.before_delete = before_delete
+        self.keep = keep
+
+    @property
+    def days(self):
+        return settings.RETENTION_DAYS[self.name]
+
+    @property
+    def archive_dir(self):
+        return Path(settings.RETENTION_ARCHIVE_DIR) / self.name
+
+    @property
+    def fields(self):
+        return [field.attname for field in self.model._meta.concrete_fields]
+
+    def expired(self, days=None):
+        cutoff = timezone.now() - timedelta(days=self.days if days is None else days)
+        expired = self.model.objects.filter(**{f"{self.date_field}__lt": cutoff})
+        return expired.exclude(self.keep) if self.keep is not None else expired
+
+    def records(self, pks):
+        return self.model.objects.filter(pk__in=pks).order_by('pk').values(*self.fields)
+
+
+def _release_unread(pks):
+    from core.services import UnreadNotificationCounter
+
+    unread = Notification.objects.filter(pk__in=pks, is_read=False).values('recipient_id').annotate(total=Count('id'))
+    UnreadNotificationCounter.increment({row['recipient_id']: -row['total'] for row in unread})
+
+
+POLICIES = {
+    policy.name: policy for policy in (
+        RetentionPolicy(
+            'notifications', Notification, 'created_at', before_delete=_release_unread,
+            keep=Q(notification_type='service_due', action_required=True),
+        ),
+        RetentionPolicy('action-log', ActionLog, 'timestamp'),
+        RetentionPolicy('transport-action-log', TransportRequestActionLog, 'timestamp'),
+        RetentionPolicy('user-status-history', UserStatusHistory, 'timestamp'),
+    )
+}
+
+
+def _write_archive(policy, records):
+    """Write one batch to ``<first pk>-<last pk>.ndjson.gz`` and make sure it is on disk."""
+    policy.archive_dir.mkdir(parents=True, exist_ok=True)
+    path = policy.archive_dir / f"{records[0]['id']:012d}-{records[-1]['id']:012d}.ndjson.gz"
+    partial = path.with_name(f".{path.name}.partial")
+    with open(partial, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            for record in records:
+                archive.write(json.dumps(record, cls=DjangoJSONEncoder).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+    return path
+
+
+def purge(policy, days=None, batch_size=None, pause=None, archive=True, stdout=None):
+    """
+    Archive and delete ``policy``'s expired rows in batches. Returns the number
+    of rows removed.
+
+    Each batch is archived before its DELETE commits. If the DELETE fails the
+    rows stay live and the next run archives them again, so the archive may
+    hold a row twice but never loses one.
+    """
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    pause = settings.RETENTION_BATCH_PAUSE if pause is None else pause
+    expired = policy.expired(days)
+
+    purged = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(expired.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            if archive:
+                _write_archive(policy, list(policy.records(pks)))
+            if policy.before_delete:
+                policy.before_delete(pks)
+            policy.model.objects.filter(pk__in=pks).delete()
+
+        purged += len(pks)
+        last_pk = pks[-1]
+        if stdout:
+            stdout.write(f"{policy.name}: purged {purged} row(s) up to id {last_pk}")
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)
+    return purged
+
+
+def _archive_files(policy, pk):
+    """Archive files whose primary-key range covers ``pk``, newest first."""
+    if not policy.archive_dir.is_dir():
+        return []
+    matches = []
+    for entry in os.scandir(policy.archive_dir):
+        if not entry.name.endswith('.ndjson.gz') or entry.name.startswith('.'):
+            continue
+        first, last = entry.name[:-len('.ndjson.gz')].split('-')
+        if int(first) <= pk <= int(last):
+            matches.append((entry.stat().st_mtime, entry.path))
+    return [path for _, path in sorted(matches, reverse=True)]
+
+
+def archived(policy, pk):
+    """The archived copy of row ``pk``, or None if it was never purged."""
+    for path in _archive_files(policy, pk):
+        with gzip.open(path, 'rt') as archive:
+            for line in archive:
+                record = json.loads(line)
+                if record['id'] == pk:
+                    return record
+    return None
+
+
+def lookup(policy, pk):
+    """
+    Read-through lookup of row ``pk``: the live row if it still exists,
+    otherwise its archived copy. Returns ``(source, record)`` with source
+    ``'live'`` or ``'archive'``, or ``(None, None)``.
+    """
+    record = policy.records([pk]).first()
+    if record is not None:
+        return 'live', json.loads(json.dumps(record, cls=DjangoJSONEncoder))
+    record = archived(policy, pk)
+    return ('archive', record) if record is not None else (None, None)
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from .consumers import UserNotificationConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/user-notifications/$", UserNotificationConsumer.as_asgi()),
+]
@@ -4,6 +4,7 @@ from rest_framework import serializers
 from auth_app.models import User
 from django.utils.timezone import now 
 from auth_app.serializers import UserDetailSerializer
+from core.exports import FORMATS
 from core.models import HighCostTransportRequest, MaintenanceRequest, MonthlyKilometerLog, RefuelingRequest, TransportRequest, Vehicle, Notification
 
 class TransportRequestSerializer(serializers.ModelSerializer):
@@ -241,26 +242,54 @@ class HighCostTransportRequestDetailSerializer(serializers.ModelSerializer):
     def get_employees(self, obj):
         return [user.full_name or user.email for user in obj.employees.all()]
 
+class VehicleAvailabilityQuerySerializer(serializers.Serializer):
+    start_day = serializers.DateField()
+    return_day = serializers.DateField()
+    capacity = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, data):
+        if data['return_day'] < data['start_day']:
+            raise serializers.ValidationError({"return_day": "Return date cannot be before the start date."})
+        return data
+
+class VehicleAvailabilityPlanSerializer(serializers.Serializer):
+    MAX_TRIPS = 200
+
+    trips = VehicleAvailabilityQuerySerializer(many=True, allow_empty=False)
+
+    def validate_trips(self, value):
+        if len(value) > self.MAX_TRIPS:
+            raise serializers.ValidationError(f"At most {self.MAX_TRIPS} trips can be planned at once.")
+        return value
+
+class ExportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    export_format = serializers.ChoiceField(choices=list(FORMATS), default='csv')
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_to'] < data['date_from']:
+            raise serializers.ValidationError({"date_to": "End date cannot be before the start date."})
+        return data
+
+def validate_month(value):
+    """Kilometer logs are keyed by a 'Month YYYY' label such as 'April 2025'."""
+    if not value.strip():
+        raise serializers.ValidationError("Month cannot be blank.")
+
+    try:
+        datetime.strptime(value, "%B %Y")
+    except ValueError:
+        raise serializers.ValidationError("Month must be in 'Month YYYY' format (e.g., 'April 2025').")
+
 class MonthlyKilometerLogSerializer(serializers.ModelSerializer):
     kilometers_driven = serializers.IntegerField(min_value=1)
-    month = serializers.CharField(max_length=30)
+    month = serializers.CharField(max_length=30, validators=[validate_month])
 
     class Meta:
         model = MonthlyKilometerLog
         fields = ['kilometers_driven', 'month']
 
-    def validate_month(self, value):
-        if not value.strip():
-            raise serializers.ValidationError("Month cannot be blank.")
-
-        try:
-            
-            datetime.strptime(value, "%B %Y")
-        except ValueError:
-            raise serializers.ValidationError("Month must be in 'Month YYYY' format (e.g., 'April 2025').")
-        
-        return value
-
     def validate(self, attrs):
         vehicle_id = self.context.get('view').kwargs.get('vehicle_id')
         month = attrs.get('month')
@@ -269,3 +298,9 @@ class MonthlyKilometerLogSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(f"Kilometers for {month} already recorded for this vehicle.")
 
         return attrs
+
+class MonthlyKilometerEntrySerializer(serializers.Serializer):
+    """One entry of a monthly kilometer batch; ``vehicle`` is an id or a license plate."""
+    vehicle = serializers.CharField(max_length=50)
+    kilometers_driven = serializers.IntegerField(min_value=1)
+    month = serializers.CharField(max_length=30, validators=[validate_month])
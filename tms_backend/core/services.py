@@ -1,13 +1,178 @@
-from django.utils.translation import gettext as _
-from django.utils import timezone
+import logging
+import string
+from collections import Counter
 from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.translation import gettext, gettext_noop as _
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, Q, QuerySet
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from auth_app.models import User
 from django.contrib.contenttypes.models import ContentType
-from .models import ActionLog, HighCostTransportRequest, RefuelingRequest, Vehicle
+from .models import ActionLog, HighCostTransportRequest, NotificationIntent, RefuelingRequest, Vehicle
 from core.models import MaintenanceRequest, TransportRequest, Notification
+from core.pagination import paginate_keyset
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadNotificationCounter:
+    """
+    Per-user unread notification counts kept in Django's cache.
+
+    Counts are adjusted in place when notifications are created or read. A cache
+    miss falls back to a COUNT(*) on the database, and entries expire after
+    ``UNREAD_COUNT_CACHE_TIMEOUT`` seconds so any drift is bounded. Notifications
+    are created and read in different processes, so without ``SHARED_CACHE``
+    nothing is cached and every read counts on the database.
+    """
+    KEY_TEMPLATE = "notifications:unread:{}"
+
+    @classmethod
+    def key(cls, user_id: int) -> str:
+        return cls.KEY_TEMPLATE.format(user_id)
+
+    @classmethod
+    def get(cls, user_id: int) -> int:
+        count = cache.get(cls.key(user_id)) if settings.SHARED_CACHE else None
+        if count is None:
+            count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+            if settings.SHARED_CACHE:
+                cache.add(cls.key(user_id), count, settings.UNREAD_COUNT_CACHE_TIMEOUT)
+        return count
+
+    @classmethod
+    def increment(cls, counts: dict) -> None:
+        """Apply ``{user_id: delta}`` to the cached counts once the transaction commits."""
+        if not settings.SHARED_CACHE:
+            return
+
+        def apply():
+            for user_id, delta in counts.items():
+                if not delta:
+                    continue
+                try:
+                    count = cache.incr(cls.key(user_id), delta)
+                except ValueError:
+                    # Not cached yet; the next read recomputes it from the database.
+                    continue
+                if count < 0:
+                    cache.delete(cls.key(user_id))
+        transaction.on_commit(apply)
+
+    @classmethod
+    def reset(cls, user_id: int, count: int = 0) -> None:
+        def apply():
+            if settings.SHARED_CACHE:
+                cache.set(cls.key(user_id), count, settings.UNREAD_COUNT_CACHE_TIMEOUT)
+            NotificationService.push_to_user(user_id, {"type": "unread.changed", "unread_count": count})
+        transaction.on_commit(apply)
+
+    @classmethod
+    def rebuild(cls, user_ids=None) -> int:
+        """Recompute counts from the database. Returns the number of users refreshed."""
+        if not settings.SHARED_CACHE:
+            return 0
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(id__in=user_ids)
+        counts = dict.fromkeys(users.values_list('id', flat=True), 0)
+        unread = Notification.objects.filter(recipient_id__in=list(counts), is_read=False)
+        for row in unread.values('recipient_id').annotate(total=Count('id')):
+            counts[row['recipient_id']] = row['total']
+        cache.set_many({cls.key(user_id): count for user_id, count in counts.items()},
+                       settings.UNREAD_COUNT_CACHE_TIMEOUT)
+        return len(counts)
+
+
+class Untranslated(str):
+    """
+    A context value that is itself a msgid. Templates translate it into their
+    own locale when rendering; stored metadata keeps the untranslated text.
+    """
+
+
+NO_PASSENGERS = Untranslated(_("No additional passengers"))
+UNKNOWN = Untranslated(_("Unknown"))
+NO_REASON = Untranslated(_("No reason provided."))
+
+
+class CompiledTemplate:
+    """A notification template translated into one locale, with its message parsed once."""
+
+    formatter = string.Formatter()
+
+    def __init__(self, title: str, message: str, priority: str, locale: str | None = None):
+        self.title = title
+        self.priority = priority
+        self.locale = locale
+        self.pieces = list(self.formatter.parse(message))
+        self.fields = {piece[1] for piece in self.pieces if piece[1]}
+
+    def render(self, context: dict) -> str:
+        """Fill the message from ``context``; only the fields it names are looked up."""
+        formatter = self.formatter
+        parts = []
+        for literal, field, format_spec, conversion in self.pieces:
+            parts.append(literal)
+            if field is not None:
+                value = formatter.get_field(field, (), context)[0]
+                if isinstance(value, Untranslated):
+                    value = self.translate(value)
+                value = formatter.convert_field(value, conversion)
+                parts.append(formatter.format_field(value, format_spec))
+        return ''.join(parts)
+
+    def translate(self, text: str) -> str:
+        with translation.override(self.locale):
+            return gettext(text)
+
+
+class NotificationTemplateRegistry:
+    """
+    Notification templates compiled on first use for each locale.
+
+    The source templates hold untranslated msgids; each ``(type, locale)`` pair
+    is translated and parsed once per process and then reused for every send.
+    """
+
+    def __init__(self, templates: dict):
+        self.templates = templates
+        self._compiled = {}
+
+    @staticmethod
+    def locale_for(language: str | None) -> str:
+        """The supported locale closest to ``language``, falling back to ``LANGUAGE_CODE``."""
+        try:
+            return translation.get_supported_language_variant(language or settings.LANGUAGE_CODE)
+        except LookupError:
+            return translation.get_supported_language_variant(settings.LANGUAGE_CODE)
+
+    def get(self, notification_type: str, language: str | None = None) -> CompiledTemplate:
+        locale = self.locale_for(language)
+        key = (notification_type, locale)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            template = self.templates.get(notification_type)
+            if not template:
+                raise ValueError(f"Invalid notification type: {notification_type}")
+            with translation.override(locale):
+                compiled = CompiledTemplate(
+                    gettext(template['title']), gettext(template['message']), template['priority'], locale
+                )
+            self._compiled[key] = compiled
+        return compiled
+
+    def clear(self) -> None:
+        self._compiled.clear()
 
 
 class NotificationService:
+    # Messages are marked for translation only; ``templates`` translates them per recipient locale.
     NOTIFICATION_TEMPLATES = {
         'new_request': {
             'title': _("New Transport Request"),
@@ -114,151 +279,301 @@ class NotificationService:
 },  
     }
 
+    templates = NotificationTemplateRegistry(NOTIFICATION_TEMPLATES)
+
+    REQUEST_FIELDS = {
+        TransportRequest: 'transport_request',
+        MaintenanceRequest: 'maintenance_request',
+        RefuelingRequest: 'refueling_request',
+        HighCostTransportRequest: 'highcost_request',
+    }
+
     @classmethod
-    def create_notification(cls, notification_type: str, transport_request: TransportRequest, 
-                          recipient: User, **kwargs) -> Notification:
+    def get_template(cls, notification_type: str, language: str | None = None) -> CompiledTemplate:
+        return cls.templates.get(notification_type, language)
+
+    @staticmethod
+    def _passengers(request_obj) -> str:
+        passengers = [p.full_name for p in request_obj.employees.all()]
+        return ", ".join(passengers) if passengers else NO_PASSENGERS
+
+    @classmethod
+    def build_context(cls, request_obj, **kwargs):
         """
-        Create a new notification
+        Build the template kwargs and the stored metadata for a request object.
+        Returns a ``(message_kwargs, metadata)`` tuple.
         """
-        template = cls.NOTIFICATION_TEMPLATES.get(notification_type)
-        if not template:
-            raise ValueError(f"Invalid notification type: {notification_type}")
-        print(kwargs)
-        passengers = list(transport_request.employees.all())
-        print("Passengers: ", passengers)
-        passengers_str = ", ".join([p.full_name for p in passengers]) if passengers else "No additional passengers"       
-        print(type(passengers_str))
-        message_kwargs = {
-        'request_id': transport_request.id,
-        'requester': transport_request.requester.full_name,
-        'destination': transport_request.destination,
-        'date': transport_request.start_day.strftime('%Y-%m-%d'),
-        'start_time': transport_request.start_time.strftime('%H:%M'),
-        'rejector': kwargs.get('rejector', 'Unknown'),
-        'rejection_reason': transport_request.rejection_message,
-        'passengers': passengers_str,
-        **kwargs
-        }
-       
-        print("Notification message kwargs:", message_kwargs)
-        notification = Notification.objects.create(
-            recipient=recipient,
-            transport_request=transport_request,
-            notification_type=notification_type,
-            title=template['title'],
-            message=template['message'].format(**message_kwargs),
-            priority=template['priority'],
-            action_required=notification_type not in ['approved', 'rejected'],
-            metadata={
-                'request_id': transport_request.id,
-                'requester_id': transport_request.requester.id,
-                'destination': transport_request.destination,
-                'date': transport_request.start_day.strftime('%Y-%m-%d'),
-                'rejection_reason': transport_request.rejection_message,
+        if isinstance(request_obj, TransportRequest):
+            passengers_str = cls._passengers(request_obj)
+            message_kwargs = {
+                'request_id': request_obj.id,
+                'requester': request_obj.requester.full_name,
+                'destination': request_obj.destination,
+                'date': request_obj.start_day.strftime('%Y-%m-%d'),
+                'start_time': request_obj.start_time.strftime('%H:%M'),
+                'rejector': kwargs.get('rejector', UNKNOWN),
+                'rejection_reason': request_obj.rejection_message,
+                'passengers': passengers_str,
+                **kwargs
+            }
+            metadata = {
+                'request_id': request_obj.id,
+                'requester_id': request_obj.requester_id,
+                'destination': request_obj.destination,
+                'date': request_obj.start_day.strftime('%Y-%m-%d'),
+                'rejection_reason': request_obj.rejection_message,
                 'passengers': passengers_str,
                 **kwargs
             }
+            return message_kwargs, metadata
+
+        if isinstance(request_obj, MaintenanceRequest):
+            request_data = {
+                'request_id': request_obj.id,
+                'requester': request_obj.requester.full_name,
+                'requesters_car_model': request_obj.requesters_car.model,
+                'requesters_car_license_plate': request_obj.requesters_car.license_plate,
+                'rejector': kwargs.get('rejector', UNKNOWN),
+                'rejection_reason': request_obj.rejection_message or NO_REASON,
+                **kwargs
+            }
+        elif isinstance(request_obj, RefuelingRequest):
+            request_data = {
+                'request_id': request_obj.id,
+                'requester': request_obj.requester.full_name,
+                'rejector': kwargs.get('rejector', UNKNOWN),
+                'approver': kwargs.get('approver', UNKNOWN),
+                'rejection_reason': request_obj.rejection_message or NO_REASON,
+                **kwargs
+            }
+        elif isinstance(request_obj, HighCostTransportRequest):
+            request_data = {
+                'request_id': request_obj.id,
+                'requester': request_obj.requester.full_name,
+                'destination': request_obj.destination,
+                'date': request_obj.start_day.strftime('%Y-%m-%d'),
+                'start_time': request_obj.start_time.strftime('%H:%M'),
+                'rejector': kwargs.get('rejector', UNKNOWN),
+                'rejection_reason': request_obj.rejection_message or NO_REASON,
+                'approver': kwargs.get('approver', UNKNOWN),
+                'passengers': cls._passengers(request_obj),
+                **kwargs
+            }
+        else:
+            raise ValueError(f"Unsupported request type: {type(request_obj).__name__}")
+        return request_data, request_data
+
+    @staticmethod
+    def _recipient_ids(recipients) -> list[int]:
+        """Resolve users, ids or a User queryset into a de-duplicated list of ids."""
+        if isinstance(recipients, QuerySet):
+            ids = recipients.values_list('id', flat=True)
+        else:
+            ids = [getattr(recipient, 'pk', recipient) for recipient in recipients if recipient is not None]
+        return list(dict.fromkeys(ids))
+
+    @staticmethod
+    def _recipient_languages(recipients) -> dict[int, str]:
+        """
+        Map each recipient id to the user's preferred language, de-duplicated and
+        in order. Users and querysets carry the language already; bare ids are
+        looked up together in one query.
+        """
+        if isinstance(recipients, QuerySet):
+            return dict(recipients.values_list('id', 'preferred_language'))
+        languages = {}
+        for recipient in recipients:
+            if isinstance(recipient, User):
+                languages.setdefault(recipient.pk, recipient.preferred_language)
+            elif recipient is not None:
+                languages.setdefault(recipient, None)
+        missing = [recipient_id for recipient_id, language in languages.items() if language is None]
+        if missing:
+            languages.update(User.objects.filter(id__in=missing).values_list('id', 'preferred_language'))
+        return languages
+
+    @classmethod
+    def notify_recipients(cls, notification_type: str, request_obj, recipients, **kwargs) -> list[Notification]:
+        """
+        Fan a notification for ``request_obj`` out to many recipients.
+
+        Each recipient gets the message in their preferred language. It is
+        rendered once per locale present in the fan-out, not once per recipient,
+        and every row is written with a single ``bulk_create``, so the cost does
+        not grow with the number of recipients. ``recipients`` may be a User
+        queryset (only ids and languages are fetched) or an iterable of users /
+        user ids.
+        """
+        cls.get_template(notification_type)
+        languages = cls._recipient_languages(recipients)
+        if not languages:
+            return []
+
+        message_kwargs, metadata = cls.build_context(request_obj, **kwargs)
+        logger.debug("Rendering %s notification for %s recipient(s)", notification_type, len(languages))
+        request_field = cls.REQUEST_FIELDS[type(request_obj)]
+        action_required = not notification_type.endswith(('approved', 'rejected'))
+
+        rendered = {}
+        notifications = []
+        for recipient_id, language in languages.items():
+            if language not in rendered:
+                template = cls.get_template(notification_type, language)
+                rendered[language] = (template, template.render(message_kwargs))
+            template, message = rendered[language]
+            notifications.append(Notification(
+                recipient_id=recipient_id,
+                notification_type=notification_type,
+                title=template.title,
+                message=message,
+                priority=template.priority,
+                action_required=action_required,
+                metadata=metadata,
+                **{request_field: request_obj}
+            ))
+        notifications = Notification.objects.bulk_create(notifications)
+        UnreadNotificationCounter.increment(dict.fromkeys(languages, 1))
+        transaction.on_commit(lambda: cls.push_notifications(notifications))
+        return notifications
+
+    @classmethod
+    def enqueue(cls, notification_type: str, request_obj, recipients=None, roles=None, **kwargs) -> NotificationIntent:
+        """
+        Record a notification intent for ``request_obj`` in the current transaction.
+
+        ``recipients`` are explicit users / user ids, ``roles`` are expanded to the
+        active users holding them at delivery time. The intent is delivered by the
+        ``deliver_notifications`` worker, or right after commit when
+        ``NOTIFICATION_DELIVERY_MODE`` is ``"inline"``.
+        """
+        cls.get_template(notification_type)
+        intent = NotificationIntent.objects.create(
+            notification_type=notification_type,
+            content_type=ContentType.objects.get_for_model(request_obj),
+            object_id=request_obj.id,
+            recipient_ids=cls._recipient_ids(recipients or []),
+            recipient_roles=list(roles or []),
+            context=kwargs,
         )
-        return notification
+        if settings.NOTIFICATION_DELIVERY_MODE == 'inline':
+            transaction.on_commit(lambda: cls.deliver_intents(NotificationIntent.objects.filter(id=intent.id)))
+        return intent
+
+    @staticmethod
+    def backoff(attempts: int) -> timedelta:
+        return timedelta(seconds=settings.NOTIFICATION_INTENT_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+    @classmethod
+    def deliver_intents(cls, queryset=None, batch_size: int = 100) -> list[NotificationIntent]:
+        """
+        Expand due pending intents into Notification rows and push them over websockets.
+        Rows are claimed with ``SKIP LOCKED`` so several workers can run side by side.
+        A failed intent is retried after an exponential backoff until
+        ``NOTIFICATION_INTENT_MAX_ATTEMPTS`` is reached. Returns the intents processed.
+        """
+        if queryset is None:
+            queryset = NotificationIntent.objects.all()
+
+        with transaction.atomic():
+            intents = list(
+                queryset.select_for_update(skip_locked=True)
+                .filter(status=NotificationIntent.PENDING, next_attempt_at__lte=timezone.now())
+                .select_related('content_type')
+                .order_by('id')[:batch_size]
+            )
+            for intent in intents:
+                cls._deliver_intent(intent)
+        return intents
+
+    @classmethod
+    def _deliver_intent(cls, intent: NotificationIntent) -> None:
+        try:
+            with transaction.atomic():
+                request_obj = intent.request_object
+                if request_obj is None:
+                    raise ValueError(f"{intent.content_type} #{intent.object_id} no longer exists")
+                recipients = User.objects.filter(
+                    Q(id__in=intent.recipient_ids) | Q(role__in=intent.recipient_roles, is_active=True)
+                )
+                notifications = cls.notify_recipients(intent.notification_type, request_obj, recipients, **intent.context)
+        except Exception as exc:
+            logger.exception("Failed to deliver notification intent %s", intent.id)
+            intent.attempts += 1
+            intent.last_error = str(exc)
+            if intent.attempts >= settings.NOTIFICATION_INTENT_MAX_ATTEMPTS:
+                intent.status = NotificationIntent.FAILED
+            else:
+                intent.next_attempt_at = timezone.now() + cls.backoff(intent.attempts)
+            intent.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+            return
+
+        intent.status = NotificationIntent.DELIVERED
+        intent.processed_at = timezone.now()
+        intent.save(update_fields=['status', 'processed_at'])
+
+    @staticmethod
+    def push_to_user(user_id: int, event: dict) -> None:
+        """Send a channel-layer event to the ``user_<id>`` group; failures are only logged."""
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(f"user_{user_id}", event)
+        except Exception:
+            logger.exception("Failed to push %s to user %s", event.get("type"), user_id)
+
+    @classmethod
+    def push_notifications(cls, notifications) -> None:
+        """Push freshly created notifications to each recipient's ``user_<id>`` group."""
+        for notification in notifications:
+            cls.push_to_user(notification.recipient_id, {
+                "type": "notification.created",
+                "notification": {
+                    "id": notification.id,
+                    "notification_type": notification.notification_type,
+                    "title": notification.title,
+                    "message": notification.message,
+                    "priority": notification.priority,
+                    "action_required": notification.action_required,
+                    "metadata": notification.metadata,
+                    "created_at": notification.created_at.isoformat(),
+                },
+                "unread_delta": 1,
+            })
+
+    @classmethod
+    def create_notification(cls, notification_type: str, transport_request: TransportRequest, 
+                          recipient: User, **kwargs) -> Notification:
+        """
+        Create a new notification
+        """
+        notifications = cls.notify_recipients(notification_type, transport_request, [recipient], **kwargs)
+        return notifications[0] if notifications else None
     
     @classmethod
     def send_maintenance_notification(cls, notification_type: str, maintenance_request: MaintenanceRequest, recipient: User, **kwargs):
         """
         Send a notification specifically for maintenance requests without affecting transport request logic.
         """
-        template = cls.NOTIFICATION_TEMPLATES.get(notification_type)
-        if not template:
-            raise ValueError(f"Invalid notification type: {notification_type}")
-
-        request_data = {
-            'request_id': maintenance_request.id,
-            'requester': maintenance_request.requester.full_name,
-            'requesters_car_model':maintenance_request.requesters_car.model,
-            'requesters_car_license_plate':maintenance_request.requesters_car.license_plate,
-            'rejector': kwargs.get('rejector', 'Unknown'),
-            'rejection_reason': maintenance_request.rejection_message or "No reason provided.",
-            **kwargs
-        }
-
-        notification = Notification.objects.create(
-            recipient=recipient,
-            maintenance_request=maintenance_request,
-            notification_type=notification_type,
-            title=template['title'],
-            message=template['message'].format(**request_data),
-            priority=template['priority'],
-            action_required=notification_type not in ['maintenance_approved', 'maintenance_rejected'],
-            metadata=request_data
-        )
-
-        return notification
+        notifications = cls.notify_recipients(notification_type, maintenance_request, [recipient], **kwargs)
+        return notifications[0] if notifications else None
     
     @classmethod
     def send_refueling_notification(cls, notification_type: str, refueling_request: RefuelingRequest, recipient: User, **kwargs):
         """
         Send a notification specifically for refueling requests.
         """
-        template = cls.NOTIFICATION_TEMPLATES.get(notification_type)
-        if not template:
-            raise ValueError(f"Invalid notification type: {notification_type}")
-
-        request_data = {
-            'request_id': refueling_request.id,
-            'requester': refueling_request.requester.full_name,
-            'rejector': kwargs.get('rejector', 'Unknown'),
-            'approver': kwargs.get('approver', 'Unknown'),
-            'rejection_reason': refueling_request.rejection_message or "No reason provided.",
-            **kwargs
-        }
-
-        notification = Notification.objects.create(
-            recipient=recipient,
-            refueling_request=refueling_request,
-            notification_type=notification_type,
-            title=template['title'],
-            message=template['message'].format(**request_data),
-            priority=template['priority'],
-            action_required=notification_type not in ['refueling_approved', 'refueling_rejected'],
-            metadata=request_data
-        )
-        return notification
+        notifications = cls.notify_recipients(notification_type, refueling_request, [recipient], **kwargs)
+        return notifications[0] if notifications else None
 
     @classmethod
     def send_highcost_notification(cls, notification_type: str, highcost_request: HighCostTransportRequest, recipient: User, **kwargs):
-            """
-            Send a notification specifically for high-cost transport requests.
-            """
-            template = cls.NOTIFICATION_TEMPLATES.get(notification_type)
-            if not template:
-                raise ValueError(f"Invalid notification type: {notification_type}")
-
-            passengers = list(highcost_request.employees.all())
-            passengers_str = ", ".join([p.full_name for p in passengers]) if passengers else "No additional passengers"
-
-            request_data = {
-                'request_id': highcost_request.id,
-                'requester': highcost_request.requester.full_name,
-                'destination': highcost_request.destination,
-                'date': highcost_request.start_day.strftime('%Y-%m-%d'),
-                'start_time': highcost_request.start_time.strftime('%H:%M'),
-                'rejector': kwargs.get('rejector', 'Unknown'),
-                'rejection_reason': highcost_request.rejection_message or "No reason provided.",
-                'approver': kwargs.get('approver', 'Unknown'),
-                'passengers': passengers_str,
-                **kwargs
-            }
+        """
+        Send a notification specifically for high-cost transport requests.
+        """
+        notifications = cls.notify_recipients(notification_type, highcost_request, [recipient], **kwargs)
+        return notifications[0] if notifications else None
 
-            notification = Notification.objects.create(
-                recipient=recipient,
-                highcost_request=highcost_request,
-                notification_type=notification_type,
-                title=template['title'],
-                message=template['message'].format(**request_data),
-                priority=template['priority'],
-                action_required=notification_type not in ['highcost_approved', 'highcost_rejected'],
-                metadata=request_data
-            )
-            return notification
     @classmethod
     def send_service_notification(cls, vehicle: Vehicle, recipients: list[User], notification_type: str = 'service_due'):
         """
@@ -272,67 +587,106 @@ class NotificationService:
         Raises:
             ValueError: If the notification template for the given type is missing.
         """
-        template = cls.NOTIFICATION_TEMPLATES.get(notification_type)
-        if not template:
-            # Log this properly in real applications
-            raise ValueError(f"Missing '{notification_type}' template in NOTIFICATION_TEMPLATES.")
-
-        request_data = {
-            'vehicle_model': vehicle.model,
-            'license_plate': vehicle.license_plate,
-            'kilometer': vehicle.total_kilometers
-        }
-
-        notifications = [
-            Notification(
-                recipient=recipient,
-                vehicle=vehicle,
-                notification_type=notification_type,
-                title=template['title'],
-                message=template['message'].format(**request_data),
-                priority=template['priority'],
-                action_required=True,
-                metadata=request_data
-            ) for recipient in recipients
-        ]
+        return cls.send_service_notifications({vehicle: recipients}, notification_type)
+
+    @classmethod
+    def send_service_notifications(cls, recipients_by_vehicle: dict, notification_type: str = 'service_due'):
+        """
+        Service due notifications for many vehicles at once: one insert, one
+        unread-count update and one websocket push pass after commit.
+        ``recipients_by_vehicle`` maps each vehicle to the users to notify.
+        """
+        cls.get_template(notification_type)
+
+        notifications = []
+        for vehicle, recipients in recipients_by_vehicle.items():
+            request_data = {
+                'vehicle_model': vehicle.model,
+                'license_plate': vehicle.license_plate,
+                'kilometer': vehicle.total_kilometers
+            }
+            rendered = {}
+            for recipient in recipients:
+                language = recipient.preferred_language
+                if language not in rendered:
+                    template = cls.get_template(notification_type, language)
+                    rendered[language] = (template, template.render(request_data))
+                template, message = rendered[language]
+                notifications.append(Notification(
+                    recipient=recipient,
+                    vehicle=vehicle,
+                    notification_type=notification_type,
+                    title=template.title,
+                    message=message,
+                    priority=template.priority,
+                    action_required=True,
+                    metadata=request_data
+                ))
+        if not notifications:
+            return []
+
+        notifications = Notification.objects.bulk_create(notifications)
+        UnreadNotificationCounter.increment(Counter(notification.recipient_id for notification in notifications))
+        transaction.on_commit(lambda: cls.push_notifications(notifications))
+        return notifications
 
-        Notification.objects.bulk_create(notifications)
+    @classmethod
+    def mark_as_read(cls, notification_id: int, user_id: int = None) -> bool:
+        """
+        Mark a notification as read. Returns False if it was already read or does not exist.
+        """
+        queryset = Notification.objects.filter(id=notification_id, is_read=False)
+        if user_id is not None:
+            queryset = queryset.filter(recipient_id=user_id)
+        recipient_id = queryset.values_list('recipient_id', flat=True).first() if user_id is None else user_id
+        if not queryset.update(is_read=True):
+            return False
+        UnreadNotificationCounter.increment({recipient_id: -1})
+        transaction.on_commit(lambda: cls.push_to_user(recipient_id, {
+            "type": "unread.changed",
+            "unread_delta": -1,
+            "notification_id": notification_id,
+        }))
+        return True
 
     @classmethod
-    def mark_as_read(cls, notification_id: int) -> None:
+    def mark_all_as_read(cls, user_id: int) -> int:
         """
-        Mark a notification as read
+        Mark all notifications of a user as read
         """
-        Notification.objects.filter(id=notification_id).update(is_read=True)
+        updated = Notification.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True)
+        UnreadNotificationCounter.reset(user_id)
+        return updated
 
     @classmethod
-    def get_user_notifications(cls, user_id: int, unread_only: bool = False, 
-                             page: int = 1, page_size: int = 20):
+    def get_user_notifications(cls, user_id: int, unread_only: bool = False,
+                             cursor: str = None, page_size: int = 20):
         """
-        Get notifications for a user with pagination
+        Get a page of notifications for a user, newest first.
+        Returns ``(notifications, next_cursor)``; pass ``next_cursor`` back to get the next page.
         """
-        queryset = Notification.objects.filter(recipient_id=user_id)
+        queryset = Notification.objects.filter(recipient_id=user_id).select_related('recipient')
         if unread_only:
             queryset = queryset.filter(is_read=False)
-        
-        start = (page - 1) * page_size
-        end = start + page_size
-        return queryset[start:end]
+
+        return paginate_keyset(queryset, cursor, page_size)
 
     @classmethod
     def get_unread_count(cls, user_id: int) -> int:
         """
         Get count of unread notifications for a user
         """
-        return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        return UnreadNotificationCounter.get(user_id)
 
     @classmethod
     def clean_old_notifications(cls, days: int = 90) -> int:
         """
-        Clean notifications older than specified days
-        """    
-        cutoff_date = timezone.now() - timedelta(days=days)
-        return Notification.objects.filter(created_at__lt=cutoff_date).delete()[0]
+        Clean notifications older than specified days, archiving them first.
+        Deletes in bounded batches; see core.retention.
+        """
+        from core.retention import POLICIES, purge
+
+        return purge(POLICIES['notifications'], days=days)
     
 def log_action(request_obj, user, action, remarks=None):
     ActionLog.objects.create(
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.dashboard import FleetDashboard
+from core.mileage import close_service_alerts
+from core.models import HighCostTransportRequest, MaintenanceRequest, RefuelingRequest, TransportRequest, Vehicle
+
+REQUEST_MODELS = (TransportRequest, HighCostTransportRequest, MaintenanceRequest, RefuelingRequest)
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, created, **kwargs):
+    loaded_state = getattr(instance, 'loaded_state', None)
+    if created:
+        FleetDashboard.vehicle_status_changed(None, instance.status)
+    elif loaded_state is not None:
+        FleetDashboard.vehicle_status_changed(loaded_state['status'], instance.status)
+        if loaded_state['last_service_kilometers'] != instance.last_service_kilometers:
+            close_service_alerts([instance.id])
+    instance.remember_state()
+
+
+@receiver(post_delete, sender=Vehicle)
+def remove_vehicle_rollups(sender, instance, **kwargs):
+    FleetDashboard.vehicle_status_changed(instance.status, None)
+
+
+def update_request_rollups(sender, instance, created, **kwargs):
+    old_state = None if created else getattr(instance, 'loaded_state', None)
+    if created or old_state is not None:
+        FleetDashboard.request_changed(instance, old_state, instance.tracked_state())
+    instance.remember_state()
+
+
+def remove_request_rollups(sender, instance, **kwargs):
+    FleetDashboard.request_changed(instance, getattr(instance, 'loaded_state', None) or instance.tracked_state(), None)
+
+
+for model in REQUEST_MODELS:
+    post_save.connect(update_request_rollups, sender=model, dispatch_uid=f"rollups_save_{model.__name__}")
+    post_delete.connect(remove_request_rollups, sender=model, dispatch_uid=f"rollups_delete_{model.__name__}")
@@ -1,3 +1,1621 @@
-from django.test import TestCase
+"""
+Query budget and N+1 regression suite for the HTTP API.
 
-# Create your tests here.
+A fleet of users, vehicles and workflow requests is seeded once, then every
+GET route in ``tms_backend/urls.py`` is requested as a user of each role and
+every write route once as the role that drives it. Each response must stay
+within the endpoint's query budget and latency ceiling, and no SQL statement
+may repeat per row (the N+1 signature).
+
+The fleet is sized by ``TMS_BENCH_FLEET_SIZE`` (requests per workflow) and
+the ceiling by ``TMS_BENCH_LATENCY_MS``, so CI can run a larger fleet than a
+laptop::
+
+    TMS_BENCH_FLEET_SIZE=5000 python manage.py test core
+"""
+import csv
+import gzip
+import io
+import json
+import math
+import os
+import pstats
+import re
+import tempfile
+import time
+from collections import Counter
+from datetime import date, time as dt_time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import URLResolver, get_resolver, reverse
+from rest_framework.test import APITestCase
+
+from auth_app.models import Department, User, UserStatusHistory
+from auth_app.serializers import CustomTokenObtainPairSerializer
+from core.availability import AvailabilityIndex, _booked, available_vehicles, book_vehicle, is_vehicle_free, start_due_trips
+from core.dashboard import FleetDashboard
+from core.exports import CHUNK_SIZE, DATASETS
+from core.mileage import (
+    KilometerBatchError,
+    close_service_alerts,
+    ingest_kilometers,
+    record_kilometers,
+    sweep_service_due,
+    validate_entries,
+)
+from core.profiling import load_report, profile_path
+from core.retention import POLICIES, lookup, purge
+from core.serializers import MonthlyKilometerLogSerializer
+from core.services import NotificationService, UnreadNotificationCounter
+from core.workflows import (
+    HighCostTransportRequestWorkflow,
+    MaintenanceRequestWorkflow,
+    RefuelingRequestWorkflow,
+    TransportRequestWorkflow,
+    WorkflowError,
+)
+from core.models import (
+    ActionLog,
+    DashboardCounter,
+    HighCostTransportRequest,
+    MaintenanceRequest,
+    MonthlyKilometerLog,
+    Notification,
+    NotificationIntent,
+    RefuelingRequest,
+    TransportRequest,
+    TransportRequestActionLog,
+    Vehicle,
+)
+
+FLEET_SIZE = int(os.getenv("TMS_BENCH_FLEET_SIZE", "1000"))
+LATENCY_CEILING_MS = float(os.getenv("TMS_BENCH_LATENCY_MS", "1000"))
+PASSWORD = "correct-horse-battery"
+
+# A statement repeated more often than this within one request is treated as
+# a per-row query.
+N_PLUS_ONE_THRESHOLD = 5
+
+# Every named GET route: url name -> (query budget, url kwargs). Kwarg values
+# name the fixture attribute whose primary key fills the URL, or are used as
+# they are when no such fixture exists.
+GET_ENDPOINTS = {
+    "api-root": (0, {}),
+    "department-list": (1, {}),
+    "department-detail": (1, {"pk": "department"}),
+    "userstatushistory-list": (2, {}),
+    "userstatushistory-detail": (1, {"pk": "status_history"}),
+    "users": (2, {}),
+    "user-list": (2, {}),
+    "current-user": (0, {}),
+    "user-detail": (1, {"user_id": "requesting_user"}),
+    "approved-users": (3, {}),
+    "department-employees": (2, {"department_id": "department"}),
+    "vehicle-list": (2, {}),
+    "vehicle-detail": (1, {"pk": "vehicle"}),
+    "available-drivers": (1, {}),
+    "available-vehicles": (2, {}),
+    "my-assigned-vehicle": (1, {}),
+    "fleet-dashboard": (1, {}),
+    "archive-lookup": (1, {"policy": "notifications", "pk": "notification"}),
+    "metrics": (0, {}),
+    "profile-list": (0, {}),
+    "profile-detail": (0, {"profile_id": "missing"}),
+    "profile-download": (0, {"profile_id": "missing"}),
+    "transport-request-list": (2, {}),
+    "transport-request-history": (3, {}),
+    "notifications": (2, {}),
+    "notification-unread-count": (1, {}),  # 0 once cached in a SHARED_CACHE
+    "list-maintenance-request": (1, {}),
+    "maintenance-request-detail": (1, {"pk": "maintenance_request"}),
+    "maintenance-request-own": (2, {}),
+    "list-refueling-request": (1, {}),
+    "refueling-request-detail": (1, {"pk": "refueling_request"}),
+    "refueling-request-own": (2, {}),
+    "list-highcost-request": (2, {}),
+    "highcost-request-detail": (2, {"id": "highcost_request"}),
+}
+
+# Every named write route: url name -> (query budget, method, acting role, url
+# kwargs, payload). Kwargs resolve like GET_ENDPOINTS; a callable payload is
+# built from the test case before queries are captured. Each write runs once,
+# inside a savepoint that is rolled back, against the targets seeded by
+# ``_seed_write_targets``. A role of None posts anonymously.
+WRITE_ENDPOINTS = {
+    "token_obtain_pair": (2, "post", None, {}, lambda test: {"email": test.employee.email, "password": PASSWORD}),
+    "token_refresh": (14, "post", None, {}, lambda test: {"refresh": test._refresh_token(test.employee)}),
+    "logout": (7, "post", User.EMPLOYEE, {}, lambda test: {"refresh": test._refresh_token(test.employee)}),
+    "register": (4, "post", None, {}, lambda test: {
+        "full_name": "New Hire", "email": "new.hire@bench.test", "phone_number": "+251911000000",
+        "role": User.EMPLOYEE, "department": test.department.pk, "password": PASSWORD, "confirm_password": PASSWORD,
+    }),
+    "approve": (6, "post", User.SYSTEM_ADMIN, {"user_id": "pending_user"}, {"action": "approve"}),
+    "bulk-approve": (6, "post", User.SYSTEM_ADMIN, {}, lambda test: {
+        "action": "approve", "user_ids": list(User.objects.filter(is_pending=True).values_list("id", flat=True)),
+    }),
+    "resubmit": (5, "patch", None, {"user_id": "pending_user"}, {"phone_number": "+251911000001"}),
+    # Both the activate and the deactivate route are named "activate"; reverse() finds deactivate.
+    "activate": (4, "post", User.SYSTEM_ADMIN, {"user_id": "employee"}, {}),
+    "bulk-deactivate": (6, "post", User.SYSTEM_ADMIN, {}, lambda test: {
+        "user_ids": list(User.objects.filter(role=User.EMPLOYEE).values_list("id", flat=True)),
+    }),
+    "update-role": (3, "patch", User.SYSTEM_ADMIN, {"user_id": "employee"}, {"role": User.DRIVER}),
+    "create-transport-request": (8, "post", User.EMPLOYEE, {}, lambda test: {
+        **test._trip_window(), "start_time": "08:00", "destination": "Adama", "reason": "Field visit",
+        "employees": [test.employee.pk],
+    }),
+    "transport-request-action": (
+        10, "post", User.TRANSPORT_MANAGER, {"request_id": "forwarded_transport_request"},
+        lambda test: {"action": "approve", "vehicle_id": test.spare_vehicle.pk},
+    ),
+    "complete-trip-transport-request": (3, "post", User.DRIVER, {"request_id": "driver_transport_request"}, {}),
+    "mark-notification-read": (2, "post", User.EMPLOYEE, {"notification_id": "notification"}, {}),
+    "mark-all-notifications-read": (1, "post", User.EMPLOYEE, {}, {}),
+    "create-maintenance-request": (3, "post", User.DRIVER, {}, lambda test: {
+        "date": test._trip_window()["start_day"], "reason": "Brake inspection",
+    }),
+    "maintenance-request-action": (7, "post", User.TRANSPORT_MANAGER, {"request_id": "maintenance_request"}, {"action": "forward"}),
+    "submit-maintenance-files": (2, "patch", User.GENERAL_SYSTEM, {"request_id": "general_system_maintenance_request"}, lambda test: {
+        "maintenance_letter_file": SimpleUploadedFile("letter.pdf", b"%PDF-1.4"),
+        "maintenance_receipt_file": SimpleUploadedFile("receipt.pdf", b"%PDF-1.4"),
+        "maintenance_total_cost": "1500.00",
+    }),
+    "create-refueling-request": (3, "post", User.DRIVER, {}, {"destination": "Depot 1"}),
+    "estimate-refueling-request": (
+        3, "post", User.TRANSPORT_MANAGER, {"request_id": "refueling_request"},
+        {"estimated_distance_km": 240, "fuel_price_per_liter": 75},
+    ),
+    "refueling-request-action": (7, "post", User.BUDGET_MANAGER, {"request_id": "budget_refueling_request"}, {"action": "approve"}),
+    "highcost-request-create": (8, "post", User.DEPARTMENT_MANAGER, {}, lambda test: {
+        **test._trip_window(), "start_time": "07:30", "destination": "Region 1", "reason": "Project delivery",
+        "employees": [test.employee.pk],
+    }),
+    "estimate-highcost-request": (
+        5, "post", User.TRANSPORT_MANAGER, {"request_id": "approved_highcost_request"},
+        lambda test: {"estimated_distance_km": 600, "fuel_price_per_liter": 75, "estimated_vehicle_id": test.spare_vehicle.pk},
+    ),
+    "highcost-request-action": (7, "post", User.BUDGET_MANAGER, {"request_id": "budget_highcost_request"}, {"action": "approve"}),
+    "highcost-request-vehicle-assign": (7, "post", User.TRANSPORT_MANAGER, {"request_id": "approved_highcost_request"}, {}),
+    "complete-trip-highcost-request": (3, "post", User.DRIVER, {"request_id": "driver_highcost_request"}, {}),
+    "add-monthly-kilometers": (
+        9, "post", User.TRANSPORT_MANAGER, {"vehicle_id": "spare_vehicle"},
+        {"month": "April 2025", "kilometers_driven": 1200},
+    ),
+    "bulk-monthly-kilometers": (9, "post", User.TRANSPORT_MANAGER, {}, lambda test: {"entries": [
+        {"vehicle": plate, "month": "April 2025", "kilometers_driven": 1200}
+        for plate in Vehicle.objects.values_list("license_plate", flat=True)
+    ]}),
+    "available-vehicles-plan": (3, "post", User.TRANSPORT_MANAGER, {}, lambda test: {"trips": [
+        {"start_day": date.today() + timedelta(days=day), "return_day": date.today() + timedelta(days=day + 2), "capacity": 4}
+        for day in range(0, 30, 3)
+    ]}),
+}
+
+# Write routes that take file uploads and so are sent as multipart forms.
+MULTIPART_ROUTES = {"submit-maintenance-files"}
+
+# Routes that stream a whole table; test_exports bounds their queries per chunk.
+STREAMING_ROUTES = {"export"}
+
+# Endpoints whose serializers still load relations row by row. Their budgets
+# and N+1 checks are not enforced until the views eager-load those relations.
+KNOWN_N_PLUS_ONE = set()
+
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_IN_LIST = re.compile(r"IN \((?:\?, )*\?\)")
+
+
+def _route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def _sql_template(sql):
+    """Strip literals so the same statement with different parameters compares equal."""
+    return _SQL_IN_LIST.sub("IN (?)", _SQL_LITERAL.sub("?", sql))
+
+
+class QueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        other_department = Department.objects.create(name="Logistics")
+
+        cls.role_users = {}
+        for role, label in User.ROLE_CHOICES:
+            cls.role_users[role] = User.objects.create(
+                email=f"role{role}@bench.test",
+                full_name=label,
+                role=User.EMPLOYEE,
+                department=cls.department,
+                is_active=True,
+                is_pending=False,
+            )
+        # Assigned after creation, because User.save inspects the department manager.
+        User.objects.filter(id__in=[user.id for user in cls.role_users.values()]).update(
+            role=Case(*(When(id=user.id, then=Value(role)) for role, user in cls.role_users.items()))
+        )
+        for role, user in cls.role_users.items():
+            user.role = role
+        Department.objects.filter(id=cls.department.id).update(
+            department_manager=cls.role_users[User.DEPARTMENT_MANAGER]
+        )
+
+        employees = User.objects.bulk_create([
+            User(
+                email=f"employee{i}@bench.test",
+                full_name=f"Employee {i}",
+                role=User.EMPLOYEE,
+                department=cls.department if i % 2 else other_department,
+                is_active=True,
+                is_pending=i % 10 == 0,
+            )
+            for i in range(max(FLEET_SIZE // 5, 10))
+        ])
+        drivers = User.objects.bulk_create([
+            User(
+                email=f"driver{i}@bench.test",
+                full_name=f"Driver {i}",
+                role=User.DRIVER,
+                is_active=True,
+                is_pending=False,
+            )
+            for i in range(max(FLEET_SIZE // 20, 5))
+        ])
+        drivers[0] = cls.role_users[User.DRIVER]
+        vehicles = Vehicle.objects.bulk_create([
+            Vehicle(
+                license_plate=f"BENCH-{i:05d}",
+                model=f"Model {i % 7}",
+                capacity=4 + i % 10,
+                fuel_efficiency=Decimal("8.50"),
+                status=Vehicle.AVAILABLE if i % 3 else Vehicle.IN_USE,
+                driver=driver,
+            )
+            for i, driver in enumerate(drivers)
+        ])
+        cls.vehicle = vehicles[0]
+
+        requesters = [cls.role_users[User.EMPLOYEE], *employees]
+        approver_stages = [
+            ("pending", User.DEPARTMENT_MANAGER),
+            ("forwarded", User.TRANSPORT_MANAGER),
+            ("forwarded", User.CEO),
+            ("forwarded", User.GENERAL_SYSTEM),
+            ("forwarded", User.BUDGET_MANAGER),
+            ("forwarded", User.FINANCE_MANAGER),
+            ("approved", User.TRANSPORT_MANAGER),
+            ("rejected", User.TRANSPORT_MANAGER),
+        ]
+        today = date.today()
+
+        def stage(i):
+            return approver_stages[i % len(approver_stages)]
+
+        transport_requests = TransportRequest.objects.bulk_create([
+            TransportRequest(
+                requester=requesters[i % len(requesters)],
+                start_day=today + timedelta(days=i % 30),
+                return_day=today + timedelta(days=i % 30 + 2),
+                start_time=dt_time(8, 0),
+                destination=f"Site {i % 50}",
+                reason="Field visit",
+                vehicle=vehicles[i % len(vehicles)] if stage(i)[0] == "approved" else None,
+                status=stage(i)[0],
+                current_approver_role=stage(i)[1],
+            )
+            for i in range(FLEET_SIZE)
+        ])
+        highcost_requests = HighCostTransportRequest.objects.bulk_create([
+            HighCostTransportRequest(
+                requester=requesters[i % len(requesters)],
+                start_day=today + timedelta(days=i % 30),
+                return_day=today + timedelta(days=i % 30 + 3),
+                start_time=dt_time(7, 30),
+                destination=f"Region {i % 20}",
+                reason="Project delivery",
+                vehicle=vehicles[i % len(vehicles)] if stage(i)[0] == "approved" else None,
+                estimated_vehicle=vehicles[(i + 1) % len(vehicles)],
+                vehicle_assigned=stage(i)[0] == "approved" and i % 2 == 0,
+                status=stage(i)[0],
+                current_approver_role=stage(i)[1],
+            )
+            for i in range(FLEET_SIZE)
+        ])
+        cls.highcost_request = highcost_requests[0]
+
+        for model, rows in (
+            (TransportRequest, transport_requests),
+            (HighCostTransportRequest, highcost_requests),
+        ):
+            through = model.employees.through
+            through.objects.bulk_create([
+                through(**{f"{model._meta.model_name}_id": row.id, "user_id": requesters[(i + k) % len(requesters)].id})
+                for i, row in enumerate(rows)
+                for k in range(1, 4)
+            ])
+
+        cls.maintenance_request = MaintenanceRequest.objects.bulk_create([
+            MaintenanceRequest(
+                requester=vehicle.driver,
+                requesters_car=vehicle,
+                reason="Brake inspection",
+                date=today + timedelta(days=i % 14),
+                status=stage(i + 1)[0],
+                current_approver_role=stage(i + 1)[1],
+            )
+            for i, vehicle in zip(range(FLEET_SIZE), _cycle(vehicles))
+        ])[0]
+        cls.refueling_request = RefuelingRequest.objects.bulk_create([
+            RefuelingRequest(
+                requester=vehicle.driver,
+                requesters_car=vehicle,
+                destination=f"Depot {i % 10}",
+                status=stage(i + 1)[0],
+                current_approver_role=stage(i + 1)[1],
+            )
+            for i, vehicle in zip(range(FLEET_SIZE), _cycle(vehicles))
+        ])[0]
+
+        notifications = []
+        for user in cls.role_users.values():
+            notifications += Notification.objects.bulk_create([
+                Notification(
+                    recipient=user,
+                    transport_request=transport_requests[i],
+                    notification_type="new_request",
+                    title="New Transport Request",
+                    message="A transport request needs your attention.",
+                    is_read=i % 3 == 0,
+                )
+                for i in range(min(FLEET_SIZE, 150))
+            ])
+            ActionLog.objects.bulk_create([
+                ActionLog(
+                    content_type=ContentType.objects.get_for_model(TransportRequest),
+                    object_id=transport_requests[i].id,
+                    action_by=user,
+                    action="forwarded",
+                )
+                for i in range(min(FLEET_SIZE, 150))
+            ])
+            TransportRequestActionLog.objects.bulk_create([
+                TransportRequestActionLog(transport_request=transport_requests[i], action_by=user, action="forwarded")
+                for i in range(min(FLEET_SIZE, 150))
+            ])
+
+        cls.notification = notifications[0]
+
+        history = UserStatusHistory.objects.bulk_create([
+            UserStatusHistory(user=employees[i % len(employees)], status="approve")
+            for i in range(min(FLEET_SIZE, 150))
+        ])
+        cls.status_history = history[0]
+        cls._seed_write_targets()
+
+    @classmethod
+    def _seed_write_targets(cls):
+        """One request in the state each write route acts on, on days the fleet leaves free."""
+        cls.employee = cls.role_users[User.EMPLOYEE]
+        cls.employee.set_password(PASSWORD)
+        cls.employee.save(update_fields=["password"])
+        cls.pending_user = _user(User.EMPLOYEE, "pending@bench.test", department=cls.department)
+        User.objects.filter(id=cls.pending_user.id).update(is_active=False, is_pending=True)
+
+        spare_driver = _user(User.DRIVER, "spare.driver@bench.test")
+        cls.spare_vehicle = Vehicle.objects.create(
+            license_plate="BENCH-SPARE", model="Spare", capacity=12, fuel_efficiency=Decimal("8.50"), driver=spare_driver,
+        )
+        window = cls._trip_window()
+        trip = {**window, "start_time": dt_time(8, 0), "destination": "Adama", "reason": "Field visit"}
+        cls.forwarded_transport_request = TransportRequest.objects.create(
+            requester=cls.employee, status="forwarded", current_approver_role=User.TRANSPORT_MANAGER, **trip,
+        )
+        cls.driver_transport_request = TransportRequest.objects.create(
+            requester=cls.employee, status="approved", vehicle=cls.vehicle, **trip,
+        )
+        cls.budget_highcost_request = HighCostTransportRequest.objects.create(
+            requester=cls.role_users[User.DEPARTMENT_MANAGER], status="forwarded",
+            current_approver_role=User.BUDGET_MANAGER, **trip,
+        )
+        cls.approved_highcost_request = HighCostTransportRequest.objects.create(
+            requester=cls.role_users[User.DEPARTMENT_MANAGER], status="approved",
+            estimated_vehicle=cls.spare_vehicle, **trip,
+        )
+        cls.driver_highcost_request = HighCostTransportRequest.objects.create(
+            requester=cls.role_users[User.DEPARTMENT_MANAGER], status="approved", vehicle=cls.vehicle,
+            vehicle_assigned=True, **trip,
+        )
+        cls.general_system_maintenance_request = MaintenanceRequest.objects.create(
+            requester=cls.vehicle.driver, requesters_car=cls.vehicle, reason="Brake inspection",
+            date=window["start_day"], status="forwarded", current_approver_role=User.GENERAL_SYSTEM,
+        )
+        cls.budget_refueling_request = RefuelingRequest.objects.create(
+            requester=cls.vehicle.driver, requesters_car=cls.vehicle, destination="Depot 1",
+            status="forwarded", current_approver_role=User.BUDGET_MANAGER,
+        )
+
+    @staticmethod
+    def _trip_window():
+        start_day = date.today() + timedelta(days=40)
+        return {"start_day": start_day, "return_day": start_day + timedelta(days=2)}
+
+    @staticmethod
+    def _refresh_token(user):
+        return str(CustomTokenObtainPairSerializer().get_token(user))
+
+    def _url(self, name, kwargs, user):
+        def value(attr):
+            if attr == "requesting_user":
+                return user.pk
+            return getattr(self, attr).pk if hasattr(self, attr) else attr
+
+        return reverse(name, kwargs={key: value(attr) for key, attr in kwargs.items()})
+
+    def _request(self, user, url, params=None):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url, params or {"page_size": 100})
+            if response.streaming:
+                # Drain the stream while queries are still being captured.
+                response.streaming_content = [response.getvalue()]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        return response, queries.captured_queries, elapsed_ms
+
+    def test_every_route_is_covered(self):
+        routes = set(_route_names(get_resolver().url_patterns))
+        uncovered = routes - set(GET_ENDPOINTS) - set(WRITE_ENDPOINTS) - STREAMING_ROUTES
+        self.assertFalse(uncovered, f"Add a query budget for: {sorted(uncovered)}")
+        self.assertFalse((set(GET_ENDPOINTS) | set(WRITE_ENDPOINTS)) - routes, "Budgets reference routes that no longer exist.")
+
+    def test_query_budgets(self):
+        for name, (budget, kwargs) in GET_ENDPOINTS.items():
+            for role, user in self.role_users.items():
+                with self.subTest(endpoint=name, role=user.get_role_display()):
+                    response, queries, elapsed_ms = self._request(user, self._url(name, kwargs, user))
+
+                    self.assertLess(response.status_code, 500)
+                    self.assertLess(elapsed_ms, LATENCY_CEILING_MS, f"{name} took {elapsed_ms:.0f}ms")
+                    if name in KNOWN_N_PLUS_ONE:
+                        continue
+
+                    statements = "\n".join(query["sql"] for query in queries)
+                    self.assertLessEqual(len(queries), budget, f"{name} ran {len(queries)} queries:\n{statements}")
+                    repeated = [
+                        (template, count)
+                        for template, count in Counter(_sql_template(query["sql"]) for query in queries).items()
+                        if count > N_PLUS_ONE_THRESHOLD
+                    ]
+                    self.assertFalse(repeated, f"{name} repeats a query per row: {repeated}")
+
+    def _write(self, name, method, role, kwargs, payload):
+        user = self.role_users[role] if role else None
+        url = self._url(name, kwargs, user)
+        data = payload(self) if callable(payload) else payload
+        request_format = "multipart" if name in MULTIPART_ROUTES else "json"
+        self.client.force_authenticate(user)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(self.client, method)(url, data, format=request_format)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        return response, queries.captured_queries, elapsed_ms
+
+    def test_write_budgets(self):
+        for name, (budget, method, role, kwargs, payload) in WRITE_ENDPOINTS.items():
+            with self.subTest(endpoint=name), tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root):
+                response, queries, elapsed_ms = self._write(name, method, role, kwargs, payload)
+
+                self.assertLess(response.status_code, 300, getattr(response, "data", response))
+                self.assertLess(elapsed_ms, LATENCY_CEILING_MS, f"{name} took {elapsed_ms:.0f}ms")
+                statements = "\n".join(query["sql"] for query in queries)
+                self.assertLessEqual(len(queries), budget, f"{name} ran {len(queries)} queries:\n{statements}")
+                repeated = [
+                    (template, count)
+                    for template, count in Counter(_sql_template(query["sql"]) for query in queries).items()
+                    if count > N_PLUS_ONE_THRESHOLD
+                ]
+                self.assertFalse(repeated, f"{name} repeats a query per row: {repeated}")
+
+
+    def test_exports(self):
+        finance = self.role_users[User.FINANCE_MANAGER]
+        for dataset_name, dataset in DATASETS.items():
+            total = dataset.model.objects.count()
+            chunks = max(math.ceil(total / CHUNK_SIZE), 1)
+            budget = chunks * (1 + len(dataset.prefetch_related))
+            for export_format in ("csv", "ndjson"):
+                with self.subTest(dataset=dataset_name, export_format=export_format):
+                    url = reverse("export", kwargs={"dataset": dataset_name})
+                    response, queries, elapsed_ms = self._request(finance, url, {"export_format": export_format})
+
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLess(elapsed_ms, LATENCY_CEILING_MS, f"{dataset_name} took {elapsed_ms:.0f}ms")
+                    self.assertLessEqual(len(queries), budget)
+                    body = response.getvalue().decode()
+                    if export_format == "csv":
+                        rows = list(csv.DictReader(io.StringIO(body)))
+                    else:
+                        rows = [json.loads(line) for line in body.splitlines()]
+                    self.assertEqual(len(rows), total)
+                    self.assertEqual(list(rows[0]), dataset.headers)
+
+        response, _, _ = self._request(self.role_users[User.EMPLOYEE], reverse("export", kwargs={"dataset": "transport"}))
+        self.assertEqual(response.status_code, 403)
+
+
+WORKFLOWS = (
+    TransportRequestWorkflow,
+    HighCostTransportRequestWorkflow,
+    RefuelingRequestWorkflow,
+    MaintenanceRequestWorkflow,
+)
+
+
+def _cycle(items):
+    while True:
+        yield from items
+
+
+def _user(role, email, **fields):
+    """An active user holding ``role``; set after creation, as User.save inspects department managers."""
+    user = User.objects.create(email=email, full_name=email.split("@")[0].title(), is_active=True, is_pending=False, **fields)
+    if role != User.EMPLOYEE:
+        User.objects.filter(id=user.id).update(role=role)
+        user.refresh_from_db()
+    return user
+
+
+def _transport_request(requester, start_day=None, days=2, **fields):
+    start_day = start_day or date.today()
+    return TransportRequest.objects.create(
+        requester=requester,
+        start_day=start_day,
+        return_day=start_day + timedelta(days=days),
+        start_time=dt_time(8, 0),
+        destination="Adama",
+        reason="Field visit",
+        **fields,
+    )
+
+
+class NotificationOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.requester = _user(User.EMPLOYEE, "requester@outbox.test", department=cls.department)
+        cls.manager = _user(User.TRANSPORT_MANAGER, "manager@outbox.test")
+        cls.request = _transport_request(cls.requester)
+
+    def _deliver_once(self):
+        out = io.StringIO()
+        call_command("deliver_notifications", "--once", stdout=out)
+        return out.getvalue()
+
+    def test_delivers_pending_intent(self):
+        intent = NotificationService.enqueue("new_request", self.request, recipients=[self.manager])
+
+        self.assertIn("Processed 1 notification intent(s)", self._deliver_once())
+        intent.refresh_from_db()
+        self.assertEqual(intent.status, NotificationIntent.DELIVERED)
+        self.assertTrue(Notification.objects.filter(recipient=self.manager, transport_request=self.request).exists())
+
+    def test_in_memory_channel_layer_is_reported(self):
+        with self.assertLogs("core.management.commands.deliver_notifications", "ERROR") as logs:
+            self._deliver_once()
+        self.assertIn("channel layer is in-memory", logs.output[0])
+
+        redis_layer = {"default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": ["redis://localhost:6379/0"]}}}
+        with override_settings(CHANNEL_LAYERS=redis_layer), \
+                self.assertNoLogs("core.management.commands.deliver_notifications", "ERROR"):
+            self._deliver_once()
+
+    def test_failed_intent_is_retried_after_backoff(self):
+        intent = NotificationService.enqueue("new_request", self.request, recipients=[self.manager])
+
+        with mock.patch.object(NotificationService, "notify_recipients", side_effect=RuntimeError("channel layer down")), \
+                self.assertLogs("core.services", "ERROR"):
+            output = self._deliver_once()
+        self.assertIn("Processed 1 notification intent(s)", output)
+        intent.refresh_from_db()
+        self.assertEqual(intent.status, NotificationIntent.PENDING)
+        self.assertEqual(intent.attempts, 1)
+        self.assertEqual(intent.last_error, "channel layer down")
+        self.assertGreater(intent.next_attempt_at, timezone.now())
+
+        # Not due yet: a second pass leaves it alone.
+        self.assertEqual(NotificationService.deliver_intents(), [])
+
+        NotificationIntent.objects.filter(id=intent.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(len(NotificationService.deliver_intents()), 1)
+        intent.refresh_from_db()
+        self.assertEqual(intent.status, NotificationIntent.DELIVERED)
+
+    @override_settings(NOTIFICATION_INTENT_RETRY_BACKOFF=10, NOTIFICATION_INTENT_MAX_ATTEMPTS=5)
+    def test_backoff_doubles_until_attempts_run_out(self):
+        intent = NotificationService.enqueue("new_request", self.request, recipients=[self.manager])
+        delays = []
+        with mock.patch.object(NotificationService, "notify_recipients", side_effect=RuntimeError("boom")), \
+                self.assertLogs("core.services", "ERROR"):
+            for _ in range(5):
+                before = timezone.now()
+                NotificationService.deliver_intents()
+                intent.refresh_from_db()
+                if intent.status == NotificationIntent.PENDING:
+                    delays.append(round((intent.next_attempt_at - before).total_seconds() / 10))
+                NotificationIntent.objects.filter(id=intent.id).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(delays, [1, 2, 4, 8])
+        self.assertEqual(intent.status, NotificationIntent.FAILED)
+        self.assertEqual(intent.attempts, 5)
+
+
+@override_settings(SHARED_CACHE=True)
+class UnreadNotificationCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = _user(User.EMPLOYEE, "reader@unread.test")
+        cls.request = _transport_request(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def _notify(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                NotificationService.notify_recipients("new_request", self.request, [self.user])[0] for _ in range(count)
+            ]
+
+    def _cached(self):
+        return cache.get(UnreadNotificationCounter.key(self.user.id))
+
+    def test_new_notifications_increment_the_cached_count(self):
+        self.assertEqual(NotificationService.get_unread_count(self.user.id), 0)
+        self._notify(2)
+
+        self.assertEqual(self._cached(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.get_unread_count(self.user.id), 2)
+
+    def test_uncached_count_is_read_from_the_database(self):
+        self._notify(2)
+        self.assertIsNone(self._cached())
+
+        self.assertEqual(NotificationService.get_unread_count(self.user.id), 2)
+        self.assertEqual(self._cached(), 2)
+
+    def test_mark_as_read_decrements_once(self):
+        first, _ = self._notify(2)
+        NotificationService.get_unread_count(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(NotificationService.mark_as_read(first.id, self.user.id))
+            self.assertFalse(NotificationService.mark_as_read(first.id, self.user.id))
+        self.assertEqual(self._cached(), 1)
+
+    def test_mark_all_as_read_resets_the_count(self):
+        self._notify(3)
+        NotificationService.get_unread_count(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(NotificationService.mark_all_as_read(self.user.id), 3)
+        self.assertEqual(self._cached(), 0)
+
+    def test_repair_recomputes_drifted_counts(self):
+        self._notify(2)
+        cache.set(UnreadNotificationCounter.key(self.user.id), 9)
+
+        out = io.StringIO()
+        call_command("repair_unread_counts", "--user", str(self.user.id), stdout=out)
+        self.assertIn("Repaired unread counts for 1 user(s)", out.getvalue())
+        self.assertEqual(self._cached(), 2)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_local_cache_is_never_trusted(self):
+        cache.set(UnreadNotificationCounter.key(self.user.id), 9)
+        self._notify(1)
+
+        self.assertEqual(NotificationService.get_unread_count(self.user.id), 1)
+        self.assertEqual(self._cached(), 9)
+        self.assertEqual(UnreadNotificationCounter.rebuild(), 0)
+
+
+class NotificationLocaleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.requester = _user(User.EMPLOYEE, "requester@locale.test", preferred_language="am")
+        cls.manager = _user(User.TRANSPORT_MANAGER, "manager@locale.test")
+        cls.request = HighCostTransportRequest.objects.create(
+            requester=cls.requester,
+            start_day=date(2026, 3, 2),
+            return_day=date(2026, 3, 4),
+            start_time=dt_time(8, 0),
+            destination="Adama",
+            reason="Field visit",
+        )
+
+    def test_renders_each_recipient_in_their_language(self):
+        notifications = NotificationService.notify_recipients("highcost_rejected", self.request, [self.requester, self.manager])
+        amharic, english = sorted(notifications, key=lambda notification: notification.recipient_id != self.requester.id)
+
+        self.assertEqual(amharic.title, "ከፍተኛ ወጪ ያለው የትራንስፖርት ጥያቄ ውድቅ ተደርጓል")
+        self.assertEqual(amharic.message, (
+            f"ወደ Adama በ2026-03-02 ሰዓት 08:00 ያቀረቡት ከፍተኛ ወጪ ያለው የትራንስፖርት ጥያቄ #{self.request.id} በያልታወቀ ውድቅ ተደርጓል። "
+            "ውድቅ የተደረገበት ምክንያት፦ ምክንያት አልተገለጸም።። ተሳፋሪዎች፦ ተጨማሪ ተሳፋሪ የለም።"
+        ))
+        self.assertEqual(english.title, "High-Cost Transport Request Rejected")
+        self.assertIn("rejected by Unknown. Rejection Reason: No reason provided..", english.message)
+        self.assertIn("Passengers: No additional passengers.", english.message)
+        # Metadata is data, not display text: it keeps the untranslated fallbacks.
+        self.assertEqual(amharic.metadata["passengers"], "No additional passengers")
+
+    def test_unsupported_language_falls_back_to_english(self):
+        User.objects.filter(id=self.requester.id).update(preferred_language="fr")
+
+        [notification] = NotificationService.notify_recipients("highcost_forwarded", self.request, [self.requester.id])
+        self.assertEqual(notification.title, "High-Cost Transport Request Forwarded")
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.requester = _user(User.EMPLOYEE, "requester@pages.test", department=cls.department)
+        cls.requests = [_transport_request(cls.requester) for _ in range(5)]
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.requester, notification_type="new_request", title="t", message="m")
+            for _ in range(5)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.requester)
+
+    def _walk(self, url):
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            if not response.data["next_cursor"]:
+                return seen
+            params = {"page_size": 2, "cursor": response.data["next_cursor"]}
+
+    def test_cursor_walks_every_row_once(self):
+        transport_ids = self._walk(reverse("transport-request-list"))
+        self.assertEqual(transport_ids, sorted((request.id for request in self.requests), reverse=True))
+        notification_ids = self._walk(reverse("notifications"))
+        self.assertEqual(len(notification_ids), 5)
+        self.assertEqual(len(set(notification_ids)), 5)
+
+    def test_page_numbers_are_rejected(self):
+        for name in ("transport-request-list", "notifications"):
+            with self.subTest(endpoint=name):
+                response = self.client.get(reverse(name), {"page": 2})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("page", response.data)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(reverse("transport-request-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ApprovalWorkflowTests(TestCase):
+    """Forward, reject and approve through ``ApprovalWorkflow.perform`` for each request type."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.requester = _user(User.EMPLOYEE, "requester@workflow.test", department=cls.department)
+        cls.approvers = {
+            role: _user(role, f"role{role}@workflow.test", department=cls.department)
+            for role in (
+                User.DEPARTMENT_MANAGER, User.TRANSPORT_MANAGER, User.CEO, User.FINANCE_MANAGER,
+                User.GENERAL_SYSTEM, User.BUDGET_MANAGER,
+            )
+        }
+        cls.driver = _user(User.DRIVER, "driver@workflow.test")
+        cls.vehicle = Vehicle.objects.create(
+            license_plate="WF-001", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"), driver=cls.driver,
+        )
+
+    def _request(self, workflow, role, status="forwarded"):
+        """A request of ``workflow``'s model waiting on ``role``."""
+        state = {"status": status, "current_approver_role": role}
+        if workflow.model is TransportRequest:
+            return _transport_request(self.requester, **state)
+        if workflow.model is HighCostTransportRequest:
+            return HighCostTransportRequest.objects.create(
+                requester=self.approvers[User.DEPARTMENT_MANAGER], start_day=date.today(),
+                return_day=date.today() + timedelta(days=3), start_time=dt_time(7, 30), destination="Gondar",
+                reason="Project delivery", estimated_distance_km=700, fuel_price_per_liter=Decimal("75.00"), **state,
+            )
+        if workflow.model is RefuelingRequest:
+            return RefuelingRequest.objects.create(
+                requester=self.driver, requesters_car=self.vehicle, destination="Depot",
+                estimated_distance_km=240, fuel_price_per_liter=Decimal("75.00"), **state,
+            )
+        return MaintenanceRequest.objects.create(
+            requester=self.driver, requesters_car=self.vehicle, reason="Brake inspection", date=date.today(), **state,
+        )
+
+    def _perform(self, workflow, request_obj, role, action, **data):
+        return workflow.perform(request_obj.id, self.approvers[role], action, data)
+
+    def _intents(self, request_obj):
+        return NotificationIntent.objects.filter(
+            content_type=ContentType.objects.get_for_model(request_obj), object_id=request_obj.id,
+        )
+
+    def _actions(self, request_obj):
+        return list(ActionLog.objects.filter(
+            content_type=ContentType.objects.get_for_model(request_obj), object_id=request_obj.id,
+        ).values_list("action", flat=True))
+
+    def test_forward_walks_each_approval_chain(self):
+        for workflow in WORKFLOWS:
+            for role, next_role in workflow.transitions.items():
+                with self.subTest(workflow=workflow.__name__, role=role):
+                    request_obj = self._request(workflow, role)
+                    if workflow is MaintenanceRequestWorkflow and role == User.GENERAL_SYSTEM:
+                        request_obj.maintenance_letter = "letters/letter.pdf"
+                        request_obj.receipt_file = "receipts/receipt.pdf"
+                        request_obj.maintenance_total_cost = Decimal("1500.00")
+                        request_obj.save()
+
+                    updated = self._perform(workflow, request_obj, role, "forward")
+
+                    request_obj.refresh_from_db()
+                    self.assertEqual((request_obj.status, request_obj.current_approver_role), ("forwarded", next_role))
+                    self.assertEqual(updated.current_approver_role, next_role)
+                    intent = self._intents(request_obj).get()
+                    self.assertEqual(intent.notification_type, workflow.notification_types["forward"])
+                    self.assertEqual(intent.recipient_roles, [next_role])
+                    self.assertEqual(self._actions(request_obj), ["forwarded"])
+
+    def test_forward_needs_the_stage_data(self):
+        cases = [
+            (HighCostTransportRequestWorkflow, User.TRANSPORT_MANAGER, {"estimated_distance_km": None}),
+            (RefuelingRequestWorkflow, User.TRANSPORT_MANAGER, {"fuel_price_per_liter": None}),
+            (MaintenanceRequestWorkflow, User.GENERAL_SYSTEM, {}),
+        ]
+        for workflow, role, missing in cases:
+            with self.subTest(workflow=workflow.__name__):
+                request_obj = self._request(workflow, role)
+                type(request_obj).objects.filter(id=request_obj.id).update(**missing)
+
+                with self.assertRaises(WorkflowError):
+                    self._perform(workflow, request_obj, role, "forward")
+                request_obj.refresh_from_db()
+                self.assertEqual(request_obj.current_approver_role, role)
+                self.assertFalse(self._intents(request_obj).exists())
+
+    def test_reject_notifies_the_requester(self):
+        for workflow in WORKFLOWS:
+            with self.subTest(workflow=workflow.__name__):
+                role = next(iter(workflow.transitions))
+                request_obj = self._request(workflow, role, status="pending")
+                if workflow.rejection_message_required:
+                    with self.assertRaises(WorkflowError):
+                        self._perform(workflow, request_obj, role, "reject", rejection_message="  ")
+
+                self._perform(workflow, request_obj, role, "reject", rejection_message="Budget exhausted")
+
+                request_obj.refresh_from_db()
+                self.assertEqual(request_obj.status, "rejected")
+                self.assertEqual(request_obj.rejection_message, "Budget exhausted")
+                intent = self._intents(request_obj).get()
+                self.assertEqual(intent.notification_type, workflow.notification_types["reject"])
+                self.assertEqual(intent.recipient_ids, [request_obj.requester_id])
+                self.assertEqual(intent.context["rejection_reason"], "Budget exhausted")
+                self.assertEqual(self._actions(request_obj), ["rejected"])
+
+    def test_approve_by_the_final_approver(self):
+        for workflow in WORKFLOWS:
+            with self.subTest(workflow=workflow.__name__):
+                request_obj = self._request(workflow, workflow.approver_role)
+                data = {"vehicle_id": self.vehicle.id} if workflow is TransportRequestWorkflow else {}
+
+                self._perform(workflow, request_obj, workflow.approver_role, "approve", **data)
+
+                request_obj.refresh_from_db()
+                self.assertEqual(request_obj.status, "approved")
+                self.assertEqual(self._actions(request_obj), ["approved"])
+                types = set(self._intents(request_obj).values_list("notification_type", flat=True))
+                expected = {
+                    TransportRequestWorkflow: {"approved", "assigned"},
+                    HighCostTransportRequestWorkflow: {"highcost_approved"},
+                    RefuelingRequestWorkflow: {"refueling_approved"},
+                    MaintenanceRequestWorkflow: set(),
+                }[workflow]
+                self.assertEqual(types, expected)
+                if workflow is TransportRequestWorkflow:
+                    self.assertEqual(request_obj.vehicle_id, self.vehicle.id)
+                    self.vehicle.refresh_from_db()
+                    self.assertEqual(self.vehicle.status, Vehicle.IN_USE)
+                    Vehicle.objects.filter(id=self.vehicle.id).update(status=Vehicle.AVAILABLE)
+                    TransportRequest.objects.filter(id=request_obj.id).update(trip_completed=True)
+
+    def test_only_the_approver_role_can_approve(self):
+        for workflow in WORKFLOWS:
+            role = next(role for role in workflow.transitions if role != workflow.approver_role)
+            with self.subTest(workflow=workflow.__name__):
+                request_obj = self._request(workflow, role)
+                with self.assertRaises(WorkflowError) as raised:
+                    self._perform(workflow, request_obj, role, "approve", vehicle_id=self.vehicle.id)
+                self.assertEqual(raised.exception.status_code, 403)
+
+    def test_second_approval_is_refused(self):
+        for workflow in WORKFLOWS:
+            with self.subTest(workflow=workflow.__name__):
+                request_obj = self._request(workflow, workflow.approver_role)
+                self._perform(workflow, request_obj, workflow.approver_role, "approve", vehicle_id=self.vehicle.id)
+
+                with self.assertRaisesMessage(WorkflowError, "already been approved"):
+                    self._perform(workflow, request_obj, workflow.approver_role, "approve", vehicle_id=self.vehicle.id)
+                with self.assertRaisesMessage(WorkflowError, "already been approved"):
+                    self._perform(workflow, request_obj, workflow.approver_role, "reject", rejection_message="Late")
+                self.assertEqual(self._actions(request_obj), ["approved"])
+                if workflow is TransportRequestWorkflow:
+                    Vehicle.objects.filter(id=self.vehicle.id).update(status=Vehicle.AVAILABLE)
+                    TransportRequest.objects.filter(id=request_obj.id).update(trip_completed=True)
+
+    def test_wrong_role_and_unknown_action(self):
+        request_obj = self._request(TransportRequestWorkflow, User.CEO)
+        with self.assertRaises(WorkflowError) as raised:
+            self._perform(TransportRequestWorkflow, request_obj, User.FINANCE_MANAGER, "forward")
+        self.assertEqual(raised.exception.status_code, 403)
+        with self.assertRaisesMessage(WorkflowError, "Invalid action."):
+            self._perform(TransportRequestWorkflow, request_obj, User.CEO, "escalate")
+
+    def test_failed_transition_rolls_back_the_booking_intents_and_log(self):
+        manager = User.TRANSPORT_MANAGER
+        request_obj = self._request(TransportRequestWorkflow, manager)
+
+        # The vehicle is booked and claimed, the intents and the log are
+        # written, then saving the request fails.
+        with mock.patch.object(TransportRequest, "save", side_effect=WorkflowError("Could not save.")):
+            with self.assertRaisesMessage(WorkflowError, "Could not save."):
+                self._perform(TransportRequestWorkflow, request_obj, manager, "approve", vehicle_id=self.vehicle.id)
+
+        self.assertFalse(self._intents(request_obj).exists())
+        self.assertEqual(self._actions(request_obj), [])
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.status, Vehicle.AVAILABLE)
+        request_obj.refresh_from_db()
+        self.assertEqual((request_obj.status, request_obj.vehicle_id), ("forwarded", None))
+
+    def test_driverless_vehicle_is_released(self):
+        spare = Vehicle.objects.create(license_plate="WF-002", model="Corolla", capacity=4, fuel_efficiency=Decimal("12.00"))
+        request_obj = self._request(TransportRequestWorkflow, User.TRANSPORT_MANAGER)
+
+        with self.assertRaisesMessage(WorkflowError, "does not have an assigned driver"):
+            self._perform(TransportRequestWorkflow, request_obj, User.TRANSPORT_MANAGER, "approve", vehicle_id=spare.id)
+
+        spare.refresh_from_db()
+        self.assertEqual(spare.status, Vehicle.AVAILABLE)
+        self.assertFalse(self._intents(request_obj).exists())
+        self.assertEqual(self._actions(request_obj), [])
+
+
+class VehicleClaimTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(license_plate="CLAIM-001", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"))
+
+    def _in_use(self):
+        return FleetDashboard.snapshot()["vehicles"].get(Vehicle.IN_USE, 0)
+
+    def test_only_the_first_of_two_claims_wins(self):
+        first, second = Vehicle.objects.get(id=self.vehicle.id), Vehicle.objects.get(id=self.vehicle.id)
+        in_use = self._in_use()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(first.claim())
+            self.assertFalse(second.claim())
+
+        self.assertEqual(first.status, Vehicle.IN_USE)
+        self.assertEqual(second.status, Vehicle.AVAILABLE)
+        self.assertEqual(Vehicle.objects.get(id=self.vehicle.id).status, Vehicle.IN_USE)
+        self.assertEqual(self._in_use(), in_use + 1)
+
+    def test_mark_as_in_use_refuses_a_claimed_vehicle(self):
+        stale = Vehicle.objects.get(id=self.vehicle.id)
+        Vehicle.objects.get(id=self.vehicle.id).mark_as_in_use()
+
+        with self.assertRaises(ValidationError):
+            stale.mark_as_in_use()
+        with self.assertRaises(ValidationError):
+            Vehicle.objects.get(id=self.vehicle.id).mark_as_in_use()
+
+    def test_claim_leaves_unavailable_vehicles_alone(self):
+        Vehicle.objects.filter(id=self.vehicle.id).update(status=Vehicle.MAINTENANCE)
+        self.assertFalse(Vehicle.objects.get(id=self.vehicle.id).claim())
+        self.assertEqual(Vehicle.objects.get(id=self.vehicle.id).status, Vehicle.MAINTENANCE)
+
+
+class VehicleAvailabilityTests(APITestCase):
+    """Bookings cover ``start_day``..``return_day`` inclusive, whichever way availability is asked."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.requester = _user(User.EMPLOYEE, "requester@availability.test", department=cls.department)
+        cls.manager = _user(User.TRANSPORT_MANAGER, "manager@availability.test")
+        cls.vehicle = Vehicle.objects.create(license_plate="AV-001", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"))
+        cls.start = date.today() + timedelta(days=10)
+        # Booked for the three days from ten days out.
+        cls.booking = _transport_request(cls.requester, start_day=cls.start, status="approved", vehicle=cls.vehicle)
+
+    def _day(self, offset):
+        return self.start + timedelta(days=offset)
+
+    def _answers(self, first, last):
+        """Whether the window is free, according to each of the three ways of asking."""
+        start_day, return_day = self._day(first), self._day(last)
+        return {
+            "booked": not _booked(TransportRequest, start_day, return_day).filter(vehicle=self.vehicle).exists(),
+            "is_vehicle_free": is_vehicle_free(self.vehicle, start_day, return_day),
+            "index": AvailabilityIndex.build(start_day, return_day).is_free(self.vehicle.id, start_day, return_day),
+        }
+
+    def test_overlapping_windows_are_taken(self):
+        for first, last in [(-1, 0), (2, 4), (1, 1), (0, 2), (-3, 5), (0, 0), (2, 2)]:
+            with self.subTest(window=(first, last)):
+                self.assertEqual(set(self._answers(first, last).values()), {False})
+
+    def test_adjacent_windows_are_free(self):
+        for first, last in [(-3, -1), (3, 5), (-1, -1), (3, 3)]:
+            with self.subTest(window=(first, last)):
+                self.assertEqual(set(self._answers(first, last).values()), {True})
+
+    def test_only_live_bookings_count(self):
+        for state in ({"trip_completed": True}, {"status": "forwarded"}, {"status": "rejected"}):
+            with self.subTest(state=state):
+                TransportRequest.objects.filter(id=self.booking.id).update(**state)
+                self.assertEqual(set(self._answers(1, 1).values()), {True})
+                TransportRequest.objects.filter(id=self.booking.id).update(status="approved", trip_completed=False)
+
+    def test_highcost_bookings_and_the_booking_itself(self):
+        HighCostTransportRequest.objects.create(
+            requester=self.requester, start_day=self._day(5), return_day=self._day(6), start_time=dt_time(7, 30),
+            destination="Gondar", reason="Project delivery", status="approved", vehicle=self.vehicle,
+        )
+        self.assertFalse(is_vehicle_free(self.vehicle, self._day(6), self._day(8)))
+        self.assertFalse(AvailabilityIndex.build(self._day(6), self._day(8)).is_free(self.vehicle.id, self._day(6), self._day(8)))
+        self.assertTrue(is_vehicle_free(self.vehicle, self._day(7), self._day(9)))
+
+        self.assertTrue(is_vehicle_free(self.vehicle, self._day(0), self._day(2), exclude=self.booking))
+        self.assertEqual(
+            list(available_vehicles(self._day(0), self._day(2), exclude=self.booking)), [self.vehicle]
+        )
+        self.assertEqual(list(available_vehicles(self._day(0), self._day(2))), [])
+
+    def test_index_answers_several_windows_at_once(self):
+        _transport_request(self.requester, start_day=self._day(20), days=0, status="approved", vehicle=self.vehicle)
+        index = AvailabilityIndex.build(self._day(0), self._day(30))
+        expected = {(3, 19): True, (13, 19): True, (2, 3): False, (19, 20): False, (20, 20): False, (21, 30): True, (-1, 25): False}
+        for (first, last), free in expected.items():
+            with self.subTest(window=(first, last)):
+                self.assertEqual(index.is_free(self.vehicle.id, self._day(first), self._day(last)), free)
+                self.assertEqual(is_vehicle_free(self.vehicle, self._day(first), self._day(last)), free)
+
+    def test_future_booking_starts_with_its_trip(self):
+        request_obj = _transport_request(self.requester, start_day=self._day(-8), status="forwarded")
+        with transaction.atomic():
+            book_vehicle(self.vehicle.id, request_obj)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.status, Vehicle.AVAILABLE)
+        TransportRequest.objects.filter(id=request_obj.id).update(status="approved", vehicle=self.vehicle)
+        in_use = FleetDashboard.snapshot()["vehicles"][Vehicle.IN_USE]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(start_due_trips(self._day(-9)), 0)
+            self.assertEqual(start_due_trips(self._day(-7)), 1)
+            self.assertEqual(start_due_trips(self._day(-7)), 0)
+
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.status, Vehicle.IN_USE)
+        self.assertEqual(FleetDashboard.snapshot()["vehicles"][Vehicle.IN_USE], in_use + 1)
+
+    def test_start_due_trips_command(self):
+        _transport_request(self.requester, status="approved", vehicle=self.vehicle)
+        out = io.StringIO()
+        call_command("start_due_trips", "--once", stdout=out)
+        self.assertIn("Moved 1 vehicle(s) to in use.", out.getvalue())
+
+    def test_list_without_dates_leaves_out_trips_starting_today(self):
+        spare = Vehicle.objects.create(license_plate="AV-002", model="Corolla", capacity=4, fuel_efficiency=Decimal("12.00"))
+        self.client.force_authenticate(self.manager)
+        url = reverse("available-vehicles")
+
+        self.assertEqual([row["id"] for row in self.client.get(url).data["results"]], [self.vehicle.id, spare.id])
+        # Booked for today but not swept to in use yet.
+        _transport_request(self.requester, status="approved", vehicle=spare)
+        self.assertEqual([row["id"] for row in self.client.get(url).data["results"]], [self.vehicle.id])
+
+
+class FleetDashboardTests(TestCase):
+    """The incrementally kept counters must agree with a rebuild from the source tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Operations")
+        cls.requester = _user(User.EMPLOYEE, "requester@dashboard.test", department=cls.department)
+        cls.users = {
+            role: _user(role, f"role{role}@dashboard.test", department=cls.department)
+            for role in (User.DEPARTMENT_MANAGER, User.TRANSPORT_MANAGER, User.CEO, User.FINANCE_MANAGER,
+                         User.GENERAL_SYSTEM, User.BUDGET_MANAGER)
+        }
+        cls.drivers = [_user(User.DRIVER, f"driver{index}@dashboard.test") for index in range(3)]
+
+    def _matches_rebuild(self):
+        incremental = FleetDashboard.snapshot()
+        FleetDashboard.rebuild()
+        self.assertEqual(incremental, FleetDashboard.snapshot())
+        return incremental
+
+    def _act(self, workflow, request_obj, role, action, **data):
+        return workflow.perform(request_obj.id, self.users[role], action, data)
+
+    def test_counters_match_a_rebuild_after_workflow_transitions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicles = [
+                Vehicle.objects.create(
+                    license_plate=f"DB-{index}", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"), driver=driver,
+                )
+                for index, driver in enumerate(self.drivers)
+            ]
+            transport = [_transport_request(self.requester, status="pending", current_approver_role=User.DEPARTMENT_MANAGER) for _ in range(3)]
+            later = _transport_request(
+                self.requester, start_day=date.today() + timedelta(days=5),
+                status="forwarded", current_approver_role=User.TRANSPORT_MANAGER,
+            )
+            highcost = HighCostTransportRequest.objects.create(
+                requester=self.users[User.DEPARTMENT_MANAGER], start_day=date.today(), return_day=date.today() + timedelta(days=2),
+                start_time=dt_time(7, 30), destination="Gondar", reason="Project delivery", current_approver_role=User.CEO,
+                estimated_distance_km=700, fuel_price_per_liter=Decimal("75.00"), total_cost=Decimal("6176.47"),
+            )
+            refueling = RefuelingRequest.objects.create(
+                requester=self.drivers[0], requesters_car=vehicles[0], destination="Depot",
+                current_approver_role=User.TRANSPORT_MANAGER, estimated_distance_km=240,
+                fuel_price_per_liter=Decimal("75.00"), total_cost=Decimal("2117.65"),
+            )
+        self._matches_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Transport: one walks the whole chain and books a vehicle, one is rejected.
+            for role in (User.DEPARTMENT_MANAGER, User.TRANSPORT_MANAGER, User.CEO, User.FINANCE_MANAGER):
+                self._act(TransportRequestWorkflow, transport[0], role, "forward")
+            self._act(TransportRequestWorkflow, transport[0], User.TRANSPORT_MANAGER, "approve", vehicle_id=vehicles[0].id)
+            self._act(TransportRequestWorkflow, transport[1], User.DEPARTMENT_MANAGER, "reject")
+            self._act(TransportRequestWorkflow, later, User.TRANSPORT_MANAGER, "approve", vehicle_id=vehicles[1].id)
+
+            for role in (User.CEO, User.GENERAL_SYSTEM, User.TRANSPORT_MANAGER):
+                self._act(HighCostTransportRequestWorkflow, highcost, role, "forward")
+            self._act(HighCostTransportRequestWorkflow, highcost, User.BUDGET_MANAGER, "approve")
+
+            for role in (User.TRANSPORT_MANAGER, User.GENERAL_SYSTEM, User.CEO):
+                self._act(RefuelingRequestWorkflow, refueling, role, "forward")
+            self._act(RefuelingRequestWorkflow, refueling, User.BUDGET_MANAGER, "approve")
+        snapshot = self._matches_rebuild()
+        self.assertEqual(snapshot["vehicles"][Vehicle.IN_USE], 1)
+        self.assertEqual(snapshot["month_to_date_spend"]["highcost"], Decimal("6176.47"))
+        self.assertEqual(snapshot["month_to_date_spend"]["fuel"], Decimal("2117.65"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            start_due_trips(date.today() + timedelta(days=5))
+            Vehicle.objects.get(id=vehicles[0].id).mark_as_available()
+            Vehicle.objects.get(id=vehicles[2].id).mark_as_maintenance()
+            TransportRequest.objects.get(id=transport[2].id).delete()
+        snapshot = self._matches_rebuild()
+        self.assertEqual(snapshot["vehicles"], {
+            Vehicle.AVAILABLE: 1, Vehicle.IN_USE: 1, Vehicle.SERVICE: 0, Vehicle.MAINTENANCE: 1,
+        })
+
+    def test_counters_wait_for_the_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Vehicle.objects.create(license_plate="DB-9", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"))
+            self.assertFalse(DashboardCounter.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+
+        # A transition that fails rolls its deltas back with it.
+        request_obj = _transport_request(self.requester, status="forwarded", current_approver_role=User.TRANSPORT_MANAGER)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(WorkflowError):
+                self._act(TransportRequestWorkflow, request_obj, User.TRANSPORT_MANAGER, "approve", vehicle_id=0)
+        self.assertEqual(callbacks, [])
+
+
+class KilometerIngestionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = _user(User.TRANSPORT_MANAGER, "manager@mileage.test")
+        cls.general = _user(User.GENERAL_SYSTEM, "general@mileage.test")
+        cls.driver = _user(User.DRIVER, "driver@mileage.test")
+        cls.near_service = Vehicle.objects.create(
+            license_plate="KM-001", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"),
+            total_kilometers=4500.0, driver=cls.driver,
+        )
+        cls.fresh = Vehicle.objects.create(
+            license_plate="KM-002", model="Coaster", capacity=30, fuel_efficiency=Decimal("12.00"),
+        )
+
+    def _totals(self):
+        return dict(Vehicle.objects.values_list("license_plate", "total_kilometers"))
+
+    def _errors(self, entries):
+        with self.assertRaises(KilometerBatchError) as raised:
+            ingest_kilometers(entries)
+        return raised.exception.errors
+
+    def test_records_every_entry_and_adds_to_the_current_totals(self):
+        entries = validate_entries([
+            {"vehicle": "KM-002", "month": "April 2025", "kilometers_driven": 100},
+            {"vehicle": str(self.fresh.id), "month": "May 2025", "kilometers_driven": 50},
+            {"vehicle": "KM-001", "month": "April 2025", "kilometers_driven": 200},
+        ])
+        # Kilometers recorded meanwhile are added to, not overwritten by the stale vehicles above.
+        Vehicle.objects.filter(id=self.fresh.id).update(total_kilometers=1000.0)
+
+        with CaptureQueriesContext(connection) as queries:
+            logs, due = record_kilometers(entries, recorded_by=self.manager)
+
+        self.assertEqual(self._totals(), {"KM-001": 4700.0, "KM-002": 1150.0})
+        self.assertEqual(due, [])
+        self.assertEqual(
+            sorted(MonthlyKilometerLog.objects.values_list("vehicle__license_plate", "month", "kilometers_driven")),
+            [("KM-001", "April 2025", 200), ("KM-002", "April 2025", 100), ("KM-002", "May 2025", 50)],
+        )
+        self.assertEqual({log.recorded_by_id for log in logs}, {self.manager.id})
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+    def test_an_id_wins_over_a_plate_made_of_the_same_digits(self):
+        lookalike = Vehicle.objects.create(
+            license_plate=str(self.fresh.id), model="Corolla", capacity=4, fuel_efficiency=Decimal("6.00"),
+        )
+        [(vehicle, _, _)] = validate_entries([
+            {"vehicle": str(self.fresh.id), "month": "April 2025", "kilometers_driven": 10},
+        ])
+        self.assertEqual(vehicle, self.fresh)
+        self.assertNotEqual(vehicle, lookalike)
+
+    def test_batch_is_refused_as_a_whole(self):
+        MonthlyKilometerLog.objects.create(vehicle=self.fresh, month="March 2025", kilometers_driven=10)
+
+        errors = self._errors([
+            {"vehicle": "KM-001", "month": "April 2025", "kilometers_driven": 200},
+            {"vehicle": str(self.near_service.id), "month": "April 2025", "kilometers_driven": 300},
+            {"vehicle": "KM-002", "month": "March 2025", "kilometers_driven": 100},
+            {"vehicle": "KM-404", "month": "April 2025", "kilometers_driven": 100},
+        ])
+
+        self.assertEqual(errors, {
+            1: {"month": ["April 2025 is listed more than once for this vehicle."]},
+            2: {"month": ["Kilometers for March 2025 already recorded for this vehicle."]},
+            3: {"vehicle": ["Vehicle KM-404 does not exist."]},
+        })
+        self.assertEqual(MonthlyKilometerLog.objects.count(), 1)
+        self.assertEqual(self._totals(), {"KM-001": 4500.0, "KM-002": 0.0})
+
+    def test_month_must_be_a_month_label(self):
+        errors = self._errors([
+            {"vehicle": "KM-001", "month": "2025-04", "kilometers_driven": 200},
+            {"vehicle": "KM-002", "month": "April 2025", "kilometers_driven": 0},
+        ])
+        self.assertEqual(errors[0]["month"], ["Month must be in 'Month YYYY' format (e.g., 'April 2025')."])
+        self.assertIn("kilometers_driven", errors[1])
+
+        view = mock.Mock(kwargs={"vehicle_id": self.fresh.id})
+        serializer = MonthlyKilometerLogSerializer(
+            data={"month": "2025-04", "kilometers_driven": 10}, context={"view": view},
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors["month"], errors[0]["month"])
+
+    def test_vehicles_crossing_their_interval_are_alerted_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _, due = ingest_kilometers([{"vehicle": "KM-001", "month": "April 2025", "kilometers_driven": 600}])
+        self.assertEqual(due, [self.near_service])
+
+        alerts = Notification.objects.filter(vehicle=self.near_service, notification_type="service_due")
+        self.assertCountEqual(
+            alerts.values_list("recipient_id", flat=True), [self.manager.id, self.general.id, self.driver.id]
+        )
+        self.assertTrue(all(alert.action_required for alert in alerts))
+
+        _, due = ingest_kilometers([{"vehicle": "KM-001", "month": "May 2025", "kilometers_driven": 600}])
+        self.assertEqual(due, [])
+        self.assertEqual(alerts.count(), 3)
+
+
+class RetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = _user(User.TRANSPORT_MANAGER, "manager@retention.test")
+        cls.request = _transport_request(cls.manager)
+        cls.vehicle = Vehicle.objects.create(
+            license_plate="RET-001", model="Hilux", capacity=5, fuel_efficiency=Decimal("8.50"), total_kilometers=6000.0,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.archive_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(RETENTION_ARCHIVE_DIR=self.archive_dir))
+
+    def _purge_notifications(self, **options):
+        return purge(POLICIES["notifications"], pause=0, **options)
+
+    def _notifications(self, count, age_days=400):
+        created = [
+            NotificationService.create_notification("new_request", self.request, self.manager) for _ in range(count)
+        ]
+        Notification.objects.filter(id__in=[notification.id for notification in created]).update(
+            created_at=timezone.now() - timedelta(days=age_days)
+        )
+        return [notification.id for notification in created]
+
+    def _archive(self):
+        directory = os.path.join(self.archive_dir, "notifications")
+        archive = {}
+        for name in sorted(os.listdir(directory)):
+            with gzip.open(os.path.join(directory, name), "rt") as lines:
+                archive[name] = [json.loads(line)["id"] for line in lines]
+        return archive
+
+    def test_purges_in_batches_and_archives_each_primary_key_range(self):
+        old = self._notifications(5)
+        recent = self._notifications(1, age_days=1)
+
+        out = io.StringIO()
+        call_command(
+            "purge_retention", "--policy", "notifications", "--batch-size", "2", "--pause", "0", "-v", "2", stdout=out,
+        )
+        self.assertIn("notifications: purged 5 row(s).", out.getvalue())
+        self.assertEqual(out.getvalue().count("notifications: purged "), 4)
+
+        self.assertEqual(list(Notification.objects.values_list("id", flat=True)), recent)
+        self.assertEqual(self._archive(), {
+            f"{batch[0]:012d}-{batch[-1]:012d}.ndjson.gz": batch for batch in (old[0:2], old[2:4], old[4:])
+        })
+
+    def test_lookup_reads_purged_rows_from_the_archive(self):
+        [notification_id] = self._notifications(1)
+        self.assertEqual(lookup(POLICIES["notifications"], notification_id)[0], "live")
+
+        self._purge_notifications()
+        source, record = lookup(POLICIES["notifications"], notification_id)
+        self.assertEqual(source, "archive")
+        self.assertEqual(record["id"], notification_id)
+        self.assertEqual(record["recipient_id"], self.manager.id)
+        self.assertEqual(record["notification_type"], "new_request")
+        self.assertEqual(lookup(POLICIES["notifications"], notification_id + 1000), (None, None))
+
+    def test_no_archive_only_deletes(self):
+        self._notifications(2)
+        self.assertEqual(self._purge_notifications(archive=False), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.archive_dir, "notifications")))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_purging_unread_notifications_releases_their_count(self):
+        read, unread = self._notifications(2)
+        self._notifications(1, age_days=1)
+        Notification.objects.filter(id=read).update(is_read=True)
+        self.assertEqual(NotificationService.get_unread_count(self.manager.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._purge_notifications(), 2)
+        self.assertEqual(cache.get(UnreadNotificationCounter.key(self.manager.id)), 1)
+
+    def test_purge_keeps_open_service_alerts(self):
+        sweep_service_due()
+        alert = Notification.objects.get(vehicle=self.vehicle, notification_type="service_due")
+        [old] = self._notifications(1)
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(self._purge_notifications(), 1)
+        self.assertFalse(Notification.objects.filter(id=old).exists())
+        self.assertTrue(Notification.objects.filter(id=alert.id).exists())
+
+        # The sweep still sees the alert and does not raise another one.
+        self.assertEqual(sweep_service_due(), [])
+        self.assertEqual(Notification.objects.filter(vehicle=self.vehicle, notification_type="service_due").count(), 1)
+
+    def test_purge_removes_closed_service_alerts(self):
+        sweep_service_due()
+        close_service_alerts([self.vehicle.id])
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(self._purge_notifications(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+
+def _samples(text):
+    """``{series: value}`` for every sample line of a Prometheus text exposition."""
+    return {
+        series: float(value)
+        for series, value in (line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#"))
+    }
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, METRICS_TOKEN="scrape-secret")
+class RequestMetricsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = _user(User.SYSTEM_ADMIN, "admin@metrics.test")
+        cls.finance = _user(User.FINANCE_MANAGER, "finance@metrics.test")
+        cls.employee = _user(User.EMPLOYEE, "employee@metrics.test")
+        _transport_request(cls.employee)
+
+    def _scrape(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse("metrics"), HTTP_X_METRICS_TOKEN="scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return _samples(response.content.decode())
+
+    def _delta(self, before, after, series):
+        return after.get(series, 0) - before.get(series, 0)
+
+    def test_records_a_request_by_view_role_and_method(self):
+        labels = '{view="notification-unread-count",role="employee",method="GET"}'
+        before = self._scrape()
+
+        self.client.force_authenticate(self.employee)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("notification-unread-count"))
+        self.assertEqual(response.status_code, 200)
+        # Count now: the scrape below starts a request, which resets the query log.
+        query_count = len(queries)
+
+        after = self._scrape()
+        self.assertEqual(self._delta(
+            before, after, 'tms_http_requests_total{view="notification-unread-count",role="employee",method="GET",status="200"}'
+        ), 1)
+        self.assertEqual(self._delta(before, after, f"tms_http_request_duration_seconds_count{labels}"), 1)
+        self.assertEqual(self._delta(before, after, f"tms_http_request_db_queries_count{labels}"), 1)
+        self.assertEqual(self._delta(before, after, f"tms_http_request_db_queries_sum{labels}"), query_count)
+        self.assertEqual(self._delta(before, after, f"tms_http_response_size_bytes_sum{labels}"), len(response.content))
+        bucket = 'tms_http_request_db_queries_bucket{view="notification-unread-count",role="employee",method="GET",le="+Inf"}'
+        self.assertEqual(self._delta(before, after, bucket), 1)
+
+    def test_streamed_export_is_recorded_once_drained(self):
+        labels = '{view="export",role="finance_manager",method="GET"}'
+        before = self._scrape()
+
+        self.client.force_authenticate(self.finance)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("export", kwargs={"dataset": "transport"}), {"export_format": "csv"})
+        query_count = len(queries)
+        self.assertTrue(response.streaming)
+        self.assertEqual(self._delta(before, self._scrape(), f"tms_http_response_size_bytes_count{labels}"), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            body = response.getvalue()
+        stream_query_count = len(queries)
+        self.assertEqual(len(list(csv.reader(io.StringIO(body.decode())))), 2)
+
+        after = self._scrape()
+        self.assertEqual(self._delta(before, after, f"tms_http_response_size_bytes_count{labels}"), 1)
+        self.assertEqual(self._delta(before, after, f"tms_http_response_size_bytes_sum{labels}"), len(body))
+        self.assertGreater(stream_query_count, 0)
+        self.assertEqual(
+            self._delta(before, after, f"tms_http_request_db_queries_sum{labels}"), query_count + stream_query_count
+        )
+
+    def test_metrics_require_a_system_admin_or_the_scrape_token(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_X_METRICS_TOKEN="wrong").status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_X_METRICS_TOKEN="scrape-secret").status_code, 200)
+
+        self.client.force_authenticate(self.employee)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_scrape_token_is_refused_when_none_is_configured(self):
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_X_METRICS_TOKEN="").status_code, 401)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_X_METRICS_TOKEN="anything").status_code, 401)
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True)
+class RequestProfilerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = _user(User.SYSTEM_ADMIN, "admin@profiler.test")
+        cls.employee = _user(User.EMPLOYEE, "employee@profiler.test")
+
+    def setUp(self):
+        self.profile_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(REQUEST_PROFILE_DIR=self.profile_dir))
+
+    def _get(self, user, **extra):
+        access = CustomTokenObtainPairSerializer().get_token(user).access_token
+        return self.client.get(reverse("notification-unread-count"), HTTP_AUTHORIZATION=f"Bearer {access}", **extra)
+
+    def _stored(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_unflagged_and_non_admin_requests_are_not_profiled(self):
+        response = self._get(self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+
+        response = self._get(self.employee, HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(self._stored(), [])
+
+    def test_flagged_admin_request_writes_a_profile(self):
+        response = self._get(self.admin, HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+        self.assertEqual(self._stored(), [f"{profile_id}.json", f"{profile_id}.prof"])
+
+        report = load_report(profile_id)
+        self.assertEqual(report["id"], profile_id)
+        self.assertEqual(report["view"], "notification-unread-count")
+        self.assertEqual(report["user_id"], self.admin.id)
+        self.assertEqual(report["status"], 200)
+        self.assertTrue(report["functions"])
+        pstats.Stats(str(profile_path(profile_id, ".prof")))
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(reverse("profile-list")).data[0]["id"], profile_id)
+
+    def test_profile_query_parameter_flags_a_request(self):
+        access = CustomTokenObtainPairSerializer().get_token(self.admin).access_token
+        response = self.client.get(
+            reverse("notification-unread-count"), {"profile": "true"}, HTTP_AUTHORIZATION=f"Bearer {access}"
+        )
+        self.assertIn("X-Profile-Id", response)
+
+    @override_settings(REQUEST_PROFILE_KEEP=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        profile_ids = [self._get(self.admin, HTTP_X_PROFILE="1")["X-Profile-Id"] for _ in range(3)]
+        kept = [f"{profile_id}{suffix}" for profile_id in profile_ids[1:] for suffix in (".json", ".prof")]
+        self.assertEqual(self._stored(), kept)
+        self.assertIsNone(load_report(profile_ids[0]))
+
+    def test_profile_path_rejects_ids_outside_the_profile_directory(self):
+        # ../x.json exists, so only the id check stands between the caller and it.
+        nested = os.path.join(self.profile_dir, "nested")
+        os.mkdir(nested)
+        with open(os.path.join(self.profile_dir, "x.json"), "w") as outside:
+            outside.write("{}")
+
+        with override_settings(REQUEST_PROFILE_DIR=nested):
+            self.assertIsNone(profile_path("../x", ".json"))
+            self.assertIsNone(profile_path("nested/../../x", ".json"))
+            self.assertIsNone(profile_path("missing", ".json"))
+            self.assertIsNone(load_report("../x"))
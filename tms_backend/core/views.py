@@ -1,24 +1,43 @@
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
-from auth_app.permissions import IsDepartmentManager, IsTransportManager
+from auth_app.permissions import IsDepartmentManager, IsSystemAdmin, IsTransportManager
 from auth_app.serializers import UserDetailSerializer
 from core import serializers
 from core.models import HighCostTransportRequest, MaintenanceRequest, MonthlyKilometerLog, RefuelingRequest, TransportRequest, Vehicle, Notification
-from core.permissions import IsAllowedVehicleUser
-from core.serializers import AssignedVehicleSerializer, HighCostTransportRequestDetailSerializer, HighCostTransportRequestSerializer, MaintenanceRequestSerializer, MonthlyKilometerLogSerializer, RefuelingRequestDetailSerializer, RefuelingRequestSerializer, TransportRequestSerializer, NotificationSerializer, VehicleSerializer
-from core.services import NotificationService, RefuelingEstimator, log_action
+from core.availability import AvailabilityIndex, VehicleUnavailable, available_vehicles, book_vehicle, is_vehicle_free
+from core.dashboard import FleetDashboard
+from core.exports import DATASETS, stream_export
+from core.metrics import REGISTRY
+from core.mileage import KilometerBatchError, ingest_kilometers, parse_kilometer_csv, record_kilometers
+from core.pagination import KeysetPagination
+from core.profiling import list_profiles, load_report, profile_path
+from core.permissions import IsAllowedVehicleUser, IsExportUser, IsMetricsScraper
+from core.retention import POLICIES, lookup
+from core.serializers import AssignedVehicleSerializer, ExportQuerySerializer, HighCostTransportRequestDetailSerializer, HighCostTransportRequestSerializer, MaintenanceRequestSerializer, MonthlyKilometerLogSerializer, RefuelingRequestDetailSerializer, RefuelingRequestSerializer, TransportRequestSerializer, NotificationSerializer, VehicleAvailabilityPlanSerializer, VehicleAvailabilityQuerySerializer, VehicleSerializer
+from core.services import NotificationService, RefuelingEstimator
+from core.workflows import (
+    HighCostTransportRequestWorkflow,
+    MaintenanceRequestWorkflow,
+    RefuelingRequestWorkflow,
+    TransportRequestWorkflow,
+    WorkflowError,
+)
 from auth_app.models import User
+from django.db import transaction
 from django.db.models import Q
 from django.core.exceptions import ValidationError
 from rest_framework.generics import RetrieveAPIView
 from django.core.exceptions import PermissionDenied
 from rest_framework import serializers  
 from rest_framework.exceptions import ValidationError  
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 
+import csv
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,7 +54,7 @@ class MyAssignedVehicleView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class VehicleViewSet(ModelViewSet):
-    queryset = Vehicle.objects.all()
+    queryset = Vehicle.objects.select_related("driver")
     serializer_class = VehicleSerializer
     permission_classes = [IsTransportManager]
 
@@ -48,10 +67,129 @@ class VehicleViewSet(ModelViewSet):
         return Response(serializer.data)
 
 class AvailableVehiclesListView(generics.ListAPIView):
-    queryset = Vehicle.objects.filter(status=Vehicle.AVAILABLE).select_related("driver")
+    """
+    Vehicles available right now, or with ``?start_day=&return_day=`` (and an
+    optional ``capacity``) the vehicles with no booking in that date range.
+    A vehicle whose booked trip starts today counts as taken even before
+    ``start_due_trips`` has moved it to in use.
+    """
     serializer_class = VehicleSerializer
     permission_classes = [IsTransportManager]
 
+    def get_queryset(self):
+        params = self.request.query_params
+        if 'start_day' not in params and 'return_day' not in params:
+            today = timezone.localdate()
+            return available_vehicles(today, today).filter(
+                status=Vehicle.AVAILABLE
+            ).select_related("driver").order_by("id")
+        query = VehicleAvailabilityQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        window = query.validated_data
+        return available_vehicles(
+            window['start_day'], window['return_day'], min_capacity=window['capacity']
+        ).select_related("driver").order_by("id")
+
+
+class VehicleAvailabilityPlanView(APIView):
+    """
+    Free vehicles for several trips at once, answered from one in-memory
+    availability index instead of a query per trip.
+    """
+    permission_classes = [IsTransportManager]
+
+    def post(self, request):
+        serializer = VehicleAvailabilityPlanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trips = serializer.validated_data['trips']
+
+        index = AvailabilityIndex.build(
+            min(trip['start_day'] for trip in trips),
+            max(trip['return_day'] for trip in trips),
+        )
+        results = [
+            {
+                **trip,
+                "vehicles": VehicleSerializer(
+                    index.free_vehicles(trip['start_day'], trip['return_day'], trip['capacity']), many=True
+                ).data,
+            }
+            for trip in trips
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+class FleetDashboardView(APIView):
+    permission_classes = [IsTransportManager]
+
+    def get(self, request):
+        return Response(FleetDashboard.snapshot(), status=status.HTTP_200_OK)
+
+class ExportView(APIView):
+    """
+    Stream every row of a dataset for a period as CSV or NDJSON, unfiltered by
+    role. ``date_from`` / ``date_to`` are inclusive days; both are optional.
+    """
+    permission_classes = [IsExportUser]
+
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            return Response(
+                {"error": f"Unknown dataset. Choose one of: {', '.join(DATASETS)}."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        query = ExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return stream_export(dataset, **query.validated_data)
+
+class ArchiveLookupView(APIView):
+    """Look up a notification or log row by id, whether it is still live or already archived."""
+    permission_classes = [IsExportUser]
+
+    def get(self, request, policy, pk):
+        if policy not in POLICIES:
+            return Response(
+                {"error": f"Unknown archive. Choose one of: {', '.join(POLICIES)}."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        source, record = lookup(POLICIES[policy], pk)
+        if record is None:
+            return Response({"error": "Record not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"source": source, "record": record}, status=status.HTTP_200_OK)
+
+class MetricsView(APIView):
+    """Request metrics of this worker process in the Prometheus text format."""
+    permission_classes = [IsMetricsScraper]
+
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type=REGISTRY.CONTENT_TYPE)
+
+class RequestProfileListView(APIView):
+    """Stored request profiles, newest first. Send ``X-Profile: 1`` on any request to record one."""
+    permission_classes = [IsSystemAdmin]
+
+    def get(self, request):
+        return Response(list_profiles(), status=status.HTTP_200_OK)
+
+class RequestProfileDetailView(APIView):
+    """The report of one profile: request details, slowest functions and largest allocation sites."""
+    permission_classes = [IsSystemAdmin]
+
+    def get(self, request, profile_id):
+        report = load_report(profile_id)
+        if report is None:
+            return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(report, status=status.HTTP_200_OK)
+
+class RequestProfileDownloadView(APIView):
+    """Download one profile's pstats dump, for snakeviz or ``python -m pstats``."""
+    permission_classes = [IsSystemAdmin]
+
+    def get(self, request, profile_id):
+        path = profile_path(profile_id, '.prof')
+        if path is None:
+            return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name, content_type='application/octet-stream')
+
 class AvailableDriversView(APIView):
     permission_classes = [IsTransportManager]
 
@@ -80,117 +218,40 @@ class HighCostTransportRequestCreateView(generics.CreateAPIView):
         )
 
 class HighCostTransportRequestListView(generics.ListAPIView):
-    queryset = HighCostTransportRequest.objects.all()
+    queryset = HighCostTransportRequest.objects.select_related("requester").prefetch_related("employees")
     serializer_class = HighCostTransportRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if user.role == user.CEO:
-            return HighCostTransportRequest.objects.filter(status='pending')
+            return queryset.filter(status='pending')
         elif user.role == user.TRANSPORT_MANAGER:
-            return HighCostTransportRequest.objects.filter(
+            return queryset.filter(
                 Q(status='forwarded', current_approver_role=User.TRANSPORT_MANAGER) | Q(status='approved', vehicle_assigned=False))
         elif user.role == user.GENERAL_SYSTEM:
-            return HighCostTransportRequest.objects.filter(status="forwarded",current_approver_role=User.GENERAL_SYSTEM)
+            return queryset.filter(status="forwarded",current_approver_role=User.GENERAL_SYSTEM)
         elif user.role == user.BUDGET_MANAGER:
-            return HighCostTransportRequest.objects.filter(status="forwarded",current_approver_role=User.BUDGET_MANAGER)
+            return queryset.filter(status="forwarded",current_approver_role=User.BUDGET_MANAGER)
         elif user.role == user.FINANCE_MANAGER:
             # Finance manager sees approved requests
-            return HighCostTransportRequest.objects.filter(status='approved')   
+            return queryset.filter(status='approved')   
         elif user.role == User.DRIVER:
-            return HighCostTransportRequest.objects.filter(vehicle__driver=user,status='approved')  # Optional: restrict to approved requests only
-        return HighCostTransportRequest.objects.filter(requester=user)
+            return queryset.filter(vehicle__driver=user,status='approved')  # Optional: restrict to approved requests only
+        return queryset.filter(requester=user)
 
 class HighCostTransportRequestActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_next_approver_role(self, current_role):
-        role_hierarchy = {
-            User.CEO: User.GENERAL_SYSTEM,
-            User.GENERAL_SYSTEM: User.TRANSPORT_MANAGER,
-            User.TRANSPORT_MANAGER: User.BUDGET_MANAGER
-        }
-        return role_hierarchy.get(current_role, None)
-
     def post(self, request, request_id):
-        highcost_request = get_object_or_404(HighCostTransportRequest, id=request_id)
         action = request.data.get("action")
-        current_role = request.user.role
-
-        if current_role != highcost_request.current_approver_role:
-            return Response({"error": "Unauthorized action."}, status=403)
-
-        if action not in ['forward', 'reject', 'approve']:
-            return Response({"error": "Invalid action."}, status=400)
-
-        # ========== FORWARD ==========
-        if action == 'forward':
-            if current_role == User.TRANSPORT_MANAGER:
-                if not highcost_request.estimated_distance_km or not highcost_request.fuel_price_per_liter:
-                    return Response({
-                        "error": "You must estimate distance and fuel price before forwarding."
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            next_role = self.get_next_approver_role(current_role)
-            if not next_role:
-                return Response({"error": "No further approver available."}, status=400)
-
-            highcost_request.status = 'forwarded'
-            highcost_request.current_approver_role = next_role
-            highcost_request.save()
-
-            next_approvers =User.objects.filter(role=next_role, is_active=True) 
-            for approver in next_approvers:
-                NotificationService.send_highcost_notification(
-                    'highcost_forwarded',
-                    highcost_request,
-                    approver
-                )
-
-        # ========== REJECT ==========
-        elif action == 'reject':
-            rejection_message = request.data.get("rejection_message", "").strip()
-            if not rejection_message:
-                return Response({"error": "Rejection message is required."}, status=400)
-
-            highcost_request.status = 'rejected'
-            highcost_request.rejection_message = rejection_message
-            highcost_request.save()
-
-            NotificationService.send_highcost_notification(
-                'highcost_rejected',
-                highcost_request,
-                highcost_request.requester,
-                rejector=request.user.full_name,
-                rejection_reason=rejection_message
-            )
-
-        # ========== APPROVE (BUDGET_MANAGER) ==========
-        elif action == 'approve':
-            if current_role == User.BUDGET_MANAGER and highcost_request.current_approver_role == User.BUDGET_MANAGER:
-                highcost_request.status = 'approved'
-                highcost_request.save()
-
-                # Notify the requester and stakeholders
-                NotificationService.send_highcost_notification(
-                    'highcost_approved',
-                    highcost_request,
-                    highcost_request.requester
-                )
-                NotificationService.send_highcost_notification(
-                    'highcost_approved',
-                    highcost_request,
-                    User.objects.get(role=User.FINANCE_MANAGER)
-                )
-                NotificationService.send_highcost_notification(
-                    'highcost_approved',
-                    highcost_request,
-                    User.objects.get(role=User.TRANSPORT_MANAGER)
-                )
-            else:
-                return Response({"error": "Approval not allowed at this stage."}, status=403)
-
-        return Response({"message": f"Request {action}ed successfully."}, status=200)
+        try:
+            HighCostTransportRequestWorkflow.perform(request_id, request.user, action, request.data)
+        except WorkflowError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        return Response({"message": f"Request {action}ed successfully."}, status=status.HTTP_200_OK)
 
 
 class HighCostTransportEstimateView(APIView):
@@ -218,7 +279,8 @@ class HighCostTransportEstimateView(APIView):
         # Fetch and validate vehicle
         try:
             vehicle = Vehicle.objects.get(id=estimated_vehicle_id)
-            if not vehicle.fuel_efficiency or vehicle.fuel_efficiency <= 0 or vehicle.status != Vehicle.AVAILABLE:
+            if (not vehicle.fuel_efficiency or vehicle.fuel_efficiency <= 0
+                    or not is_vehicle_free(vehicle, highcost_request.start_day, highcost_request.return_day)):
                 return Response({
                     "error": "Selected vehicle must be available and have a valid fuel efficiency greater than zero."
                 }, status=400)            
@@ -248,44 +310,35 @@ class HighCostTransportEstimateView(APIView):
 class AssignVehicleAfterBudgetApprovalView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, request_id):
-        highcost_request = get_object_or_404(HighCostTransportRequest, id=request_id)
-
         if request.user.role != User.TRANSPORT_MANAGER:
             return Response({"error": "Unauthorized"}, status=403)
 
+        highcost_request = get_object_or_404(HighCostTransportRequest.objects.select_for_update(), id=request_id)
+
         if highcost_request.status != 'approved':
             return Response({"error": "Vehicle can only be assigned after budget approval."}, status=400)
+        if highcost_request.vehicle_assigned:
+            return Response({"error": "A vehicle is already assigned to this request."}, status=400)
 
-        vehicle = highcost_request.estimated_vehicle
-        if vehicle.status != Vehicle.AVAILABLE:
-            return Response({"error": "Selected vehicle is not available."}, status=400)
-
+        if not highcost_request.estimated_vehicle_id:
+            return Response({"error": "No vehicle was estimated for this request."}, status=400)
         try:
-            vehicle.mark_as_in_use()
-        except ValidationError as e:
-            return Response({"error": str(e)}, status=400)
-
-
-        # NotificationService.send_highcost_notification(
-        #       'assigned', highcost_request, highcost_request.vehicle.driver,
-        #         vehicle=f"{highcost_request.vehicle.model} ({highcost_request.vehicle.license_plate})", destination=highcost_request.destination,
-        #         date=highcost_request.start_day.strftime('%Y-%m-%d'), start_time=highcost_request.start_time.strftime('%H:%M')
-        # )
-        # NotificationService.send_highcost_notification(
-        #       'assigned', highcost_request, highcost_request.requester,
-        #         vehicle=f"{highcost_request.vehicle.model} ({highcost_request.vehicle.license_plate})", destination=highcost_request.destination,
-        #         date=highcost_request.start_day.strftime('%Y-%m-%d'), start_time=highcost_request.start_time.strftime('%H:%M')
-        # )
+            vehicle = book_vehicle(highcost_request.estimated_vehicle_id, highcost_request)
+        except VehicleUnavailable:
+            return Response({"error": "Selected vehicle is not available."}, status=400)
 
         highcost_request.vehicle = vehicle
         highcost_request.vehicle_assigned = True
-        highcost_request.save()
+        highcost_request.save(update_fields=['vehicle', 'vehicle_assigned', 'updated_at'])
         return Response({"message": "Vehicle assigned and status updated successfully."}, status=200)
 
 
 class HighCostTransportRequestDetailView(generics.RetrieveAPIView):
-    queryset = HighCostTransportRequest.objects.all()
+    queryset = HighCostTransportRequest.objects.select_related(
+        "requester", "vehicle", "estimated_vehicle"
+    ).prefetch_related("employees")
     serializer_class = HighCostTransportRequestDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
@@ -320,26 +373,28 @@ class TransportRequestCreateView(generics.CreateAPIView):
 
 
 class TransportRequestListView(generics.ListAPIView):
-    queryset = TransportRequest.objects.all()
+    queryset = TransportRequest.objects.select_related("requester").prefetch_related("employees")
     serializer_class = TransportRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if user.role == user.DEPARTMENT_MANAGER:
-            return TransportRequest.objects.filter(status='pending',requester__department=user.department)
+            return queryset.filter(status='pending',requester__department=user.department)
         elif user.role == user.TRANSPORT_MANAGER:
-            return TransportRequest.objects.filter(status='forwarded',current_approver_role=User.TRANSPORT_MANAGER)
+            return queryset.filter(status='forwarded',current_approver_role=User.TRANSPORT_MANAGER)
         elif user.role == user.CEO:
             # CEO can see all approved requests
-            return TransportRequest.objects.filter(status='forwarded',current_approver_role=User.CEO)
+            return queryset.filter(status='forwarded',current_approver_role=User.CEO)
         elif user.role == user.FINANCE_MANAGER:
             # Finance manager sees approved requests
-            return TransportRequest.objects.filter(status='forwarded',current_approver_role=User.FINANCE_MANAGER)
+            return queryset.filter(status='forwarded',current_approver_role=User.FINANCE_MANAGER)
         # Regular users see their own requests         
         elif user.role == User.DRIVER:
-            return TransportRequest.objects.filter(vehicle__driver=user,status='approved')  # Optional: restrict to approved requests only
-        return TransportRequest.objects.filter(requester=user)
+            return queryset.filter(vehicle__driver=user,status='approved')  # Optional: restrict to approved requests only
+        return queryset.filter(requester=user)
     
 class MaintenanceRequestCreateView(generics.CreateAPIView):
     serializer_class = MaintenanceRequestSerializer
@@ -410,32 +465,35 @@ class RefuelingRequestCreateView(generics.CreateAPIView):
             recipient=transport_manager
         )
 class RefuelingRequestListView(generics.ListAPIView):
-    queryset = RefuelingRequest.objects.all()
+    queryset = RefuelingRequest.objects.select_related("requester", "requesters_car")
     serializer_class = RefuelingRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if user.role == user.TRANSPORT_MANAGER:
-            return RefuelingRequest.objects.filter(status='pending')
+            return queryset.filter(status='pending')
         elif user.role == user.CEO:
-            return RefuelingRequest.objects.filter(status='forwarded',current_approver_role=User.CEO)
+            return queryset.filter(status='forwarded',current_approver_role=User.CEO)
         elif user.role == user.GENERAL_SYSTEM:
-            return RefuelingRequest.objects.filter(status="forwarded",current_approver_role=User.GENERAL_SYSTEM)
+            return queryset.filter(status="forwarded",current_approver_role=User.GENERAL_SYSTEM)
         elif user.role == user.BUDGET_MANAGER:
-            return RefuelingRequest.objects.filter(status="forwarded",current_approver_role=User.BUDGET_MANAGER)
+            return queryset.filter(status="forwarded",current_approver_role=User.BUDGET_MANAGER)
         elif user.role == user.FINANCE_MANAGER:
             # Finance manager sees approved requests
-            return RefuelingRequest.objects.filter(status='approved')
-        return RefuelingRequest.objects.filter(requester=user)
+            return queryset.filter(status='approved')
+        return queryset.filter(requester=user)
     
 class RefuelingRequestOwnListView(generics.ListAPIView):
+    queryset = RefuelingRequest.objects.select_related("requester", "requesters_car")
     serializer_class = RefuelingRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return RefuelingRequest.objects.filter(requester=user)
+        return super().get_queryset().filter(requester=user)
 class RefuelingRequestEstimateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -472,7 +530,7 @@ class RefuelingRequestEstimateView(APIView):
 class RefuelingRequestDetailView(RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = RefuelingRequestDetailSerializer
-    queryset = RefuelingRequest.objects.all()
+    queryset = RefuelingRequest.objects.select_related("requester", "requesters_car")
 
     def get(self, request, *args, **kwargs):
         refueling_request = self.get_object()
@@ -494,124 +552,52 @@ class RefuelingRequestDetailView(RetrieveAPIView):
 class RefuelingRequestActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_next_approver_role(self, current_role):
-        """Determine the next approver based on hierarchy."""
-        role_hierarchy = {
-            User.TRANSPORT_MANAGER: User.GENERAL_SYSTEM,
-            User.GENERAL_SYSTEM: User.CEO,
-            User.CEO: User.BUDGET_MANAGER,
-        }
-        return role_hierarchy.get(current_role, None)
-
     def post(self, request, request_id):
-        refueling_request = get_object_or_404(RefuelingRequest, id=request_id)
         action = request.data.get("action")
+        try:
+            RefuelingRequestWorkflow.perform(request_id, request.user, action, request.data)
+        except WorkflowError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        return Response({"message": f"Request {action}ed successfully."}, status=status.HTTP_200_OK)
 
-        if action not in ['forward', 'reject', 'approve']:
-            return Response({"error": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
-
-        current_role = request.user.role
-        if current_role != refueling_request.current_approver_role:
-            return Response({"error": "You are not authorized to act on this request."}, status=status.HTTP_403_FORBIDDEN)
-
-        # ====== FORWARD ACTION ======
-        if action == 'forward':
-            if current_role == User.TRANSPORT_MANAGER:
-                # Ensure estimation is already completed before forwarding
-                if not refueling_request.estimated_distance_km or not refueling_request.fuel_price_per_liter:
-                    return Response({
-                        "error": "You must estimate distance and fuel price before forwarding."
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            next_role = self.get_next_approver_role(current_role)
-            if not next_role:
-                return Response({"error": "No further approver available."}, status=status.HTTP_400_BAD_REQUEST)
-
-            refueling_request.status = 'forwarded'
-            refueling_request.current_approver_role = next_role
-            # # # Notify the next approver
-
-            next_approvers = User.objects.filter(role=next_role, is_active=True)
-            for approver in next_approvers:
-                NotificationService.send_refueling_notification(
-                    notification_type='refueling_forwarded',
-                    refueling_request=refueling_request,
-                    recipient=approver
-                )
-            refueling_request.save()
-
-        # ====== REJECT ACTION ======
-        elif action == 'reject':
-            rejection_message = request.data.get("rejection_message", "").strip()
-            if not rejection_message:
-                return Response({"error": "Rejection message is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-            refueling_request.status = 'rejected'
-            refueling_request.rejection_message = rejection_message
-            refueling_request.save()
-
-            # # # Notify requester of rejection
-            NotificationService.send_refueling_notification(
-                'refueling_rejected', refueling_request, refueling_request.requester,
-                rejector=request.user.full_name, rejection_reason=rejection_message
-                )
-        # ====== APPROVE ACTION ======
-        elif action == 'approve':
-            if current_role == User.BUDGET_MANAGER and refueling_request.current_approver_role == User.BUDGET_MANAGER:
-                # Final approval by Transport Manager after Finance Manager has approved
-                refueling_request.status = 'approved'
-                refueling_request.save()
-                
-                finance_manger= User.objects.filter(role=User.FINANCE_MANAGER).first()
-                # # # Notify the original requester of approval
-                NotificationService.send_refueling_notification(
-                    'refueling_approved', refueling_request, refueling_request.requester,
-                    approver=request.user.full_name
-                )
-                NotificationService.send_refueling_notification(
-                   'refueling_approved',refueling_request, finance_manger,approver=request.user.full_name
-                )
-            else:
-                return Response({"error": f"{request.user.get_role_display()} cannot approve this request at this stage."}, 
-                                status=status.HTTP_403_FORBIDDEN)
-        else:
-             Response({"error": "Unexpected error occurred."}, status=status.HTTP_400_BAD_REQUEST)
-        return  Response({"message": f"Request {action}ed successfully."}, status=status.HTTP_200_OK)
-   
 class MaintenanceRequestListView(generics.ListAPIView):
-    queryset = MaintenanceRequest.objects.all()
+    queryset = MaintenanceRequest.objects.select_related("requester", "requesters_car")
     serializer_class = MaintenanceRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         if user.role == User.TRANSPORT_MANAGER:
-            return MaintenanceRequest.objects.filter(status='pending', current_approver_role=User.TRANSPORT_MANAGER)
+            return queryset.filter(status='pending', current_approver_role=User.TRANSPORT_MANAGER)
         elif user.role == User.GENERAL_SYSTEM:
-            return MaintenanceRequest.objects.filter(status='forwarded', current_approver_role=User.GENERAL_SYSTEM)
+            return queryset.filter(status='forwarded', current_approver_role=User.GENERAL_SYSTEM)
         elif user.role == User.CEO:
-            return MaintenanceRequest.objects.filter(status='forwarded', current_approver_role=User.CEO)
+            return queryset.filter(status='forwarded', current_approver_role=User.CEO)
         elif user.role == User.BUDGET_MANAGER:
-            return MaintenanceRequest.objects.filter(status='forwarded', current_approver_role=User.BUDGET_MANAGER)
+            return queryset.filter(status='forwarded', current_approver_role=User.BUDGET_MANAGER)
         elif user.role == User.FINANCE_MANAGER:
-            return MaintenanceRequest.objects.filter(status='approved')
-        return MaintenanceRequest.objects.none()
+            return queryset.filter(status='approved')
+        return queryset.none()
     
 class MaintenanceRequestOwnListView(generics.ListAPIView):
+    queryset = MaintenanceRequest.objects.select_related("requester", "requesters_car")
     serializer_class = MaintenanceRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return MaintenanceRequest.objects.filter(requester=user)
+        return super().get_queryset().filter(requester=user)
 
 class MaintenanceRequestDetailView(generics.RetrieveAPIView):
-    queryset = MaintenanceRequest.objects.all()
+    queryset = MaintenanceRequest.objects.select_related("requester", "requesters_car")
     serializer_class = MaintenanceRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         request_id = self.kwargs.get("pk")
-        obj = get_object_or_404(MaintenanceRequest, id=request_id)
+        obj = get_object_or_404(self.get_queryset(), id=request_id)
 
         user = self.request.user
 
@@ -631,108 +617,16 @@ class MaintenanceRequestDetailView(generics.RetrieveAPIView):
 class MaintenanceRequestActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_next_approver_role(self, current_role):
-        """Define approver hierarchy."""
-        role_hierarchy = {
-            User.TRANSPORT_MANAGER: User.GENERAL_SYSTEM,
-            User.GENERAL_SYSTEM: User.CEO,
-            User.CEO: User.BUDGET_MANAGER,
-        }
-        return role_hierarchy.get(current_role, None)
-
     def post(self, request, request_id):
-        maintenance_request = get_object_or_404(MaintenanceRequest, id=request_id)
         action = request.data.get("action")
+        try:
+            MaintenanceRequestWorkflow.perform(request_id, request.user, action, request.data)
+        except WorkflowError as e:
+            return Response({"error": e.message}, status=e.status_code)
 
-        if action not in ['forward', 'reject', 'approve']:
-            return Response({"error": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
-
-        current_role = request.user.role
-
-        if current_role != maintenance_request.current_approver_role:
-            return Response({"error": "You are not authorized to act on this request."}, status=status.HTTP_403_FORBIDDEN)
-
-        # ===== FORWARD LOGIC =====
-        if action == 'forward':
-            # General System MUST submit files and cost before forwarding
-            if current_role == User.GENERAL_SYSTEM:
-                missing = []
-
-                if not maintenance_request.maintenance_letter:
-                    missing.append('maintenance_letter')
-                if not maintenance_request.receipt_file:
-                    missing.append('receipt_file')
-                if maintenance_request.maintenance_total_cost is None:
-                    missing.append('maintenance_total_cost')
-
-                if missing:
-                    return Response(
-                        {"error": f"The following fields must be submitted before forwarding: {', '.join(missing)}"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-            next_role = self.get_next_approver_role(current_role)
-            if not next_role:
-                return Response({"error": "No further approver available."}, status=status.HTTP_400_BAD_REQUEST)
-
-            maintenance_request.status = 'forwarded'
-            maintenance_request.current_approver_role = next_role
-            maintenance_request.save()
-
-            # Notify next approver(s)
-            next_approvers = User.objects.filter(role=next_role, is_active=True)
-            for approver in next_approvers:
-                NotificationService.send_maintenance_notification(
-                    'maintenance_forwarded', maintenance_request, approver
-                )
-
-            return Response({"message": "Request forwarded successfully."}, status=status.HTTP_200_OK)
-
-        # ===== REJECT LOGIC =====
-        elif action == 'reject':
-            rejection_message = request.data.get("rejection_message", "").strip()
-            if not rejection_message:
-                return Response({"error": "Rejection message is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-            maintenance_request.status = 'rejected'
-            maintenance_request.rejection_message = rejection_message
-            maintenance_request.save()
-
-            NotificationService.send_maintenance_notification(
-                'maintenance_rejected', maintenance_request, maintenance_request.requester,
-                rejector=request.user.full_name, rejection_reason=rejection_message
-            )
-
-            return Response({"message": "Request rejected successfully."}, status=status.HTTP_200_OK)
-
-        # ===== APPROVE LOGIC =====
-        elif action == 'approve':
-            if current_role == User.BUDGET_MANAGER:
-                # Final approval
-                maintenance_request.status = 'approved'
-                maintenance_request.save()
-
-                # # Notify requester
-                # NotificationService.send_maintenance_notification(
-                #     'maintenance_approved', maintenance_request, maintenance_request.requester,
-                #     approver=request.user.full_name
-                # )
-
-                # # Notify finance manager
-                # finance_managers = User.objects.filter(role=User.FINANCE_MANAGER, is_active=True)
-                # for fm in finance_managers:
-                #     NotificationService.send_maintenance_notification(
-                #         'maintenance_approved', maintenance_request, recipient=fm
-                #     )
-
-                return Response({"message": "Request approved successfully and finance notified."}, status=status.HTTP_200_OK)
-
-            else:
-                return Response({
-                    "error": f"{request.user.get_role_display()} cannot approve this request at this stage."
-                }, status=status.HTTP_403_FORBIDDEN)
-
-        return Response({"error": "Unexpected action or failure."}, status=status.HTTP_400_BAD_REQUEST)
+        if action == 'approve':
+            return Response({"message": "Request approved successfully and finance notified."}, status=status.HTTP_200_OK)
+        return Response({"message": f"Request {action}ed successfully."}, status=status.HTTP_200_OK)
 
 
 class MaintenanceFileSubmissionView(APIView):
@@ -772,110 +666,29 @@ class MaintenanceFileSubmissionView(APIView):
 class TransportRequestActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_next_approver_role(self, current_role):
-        """Determine the next approver based on hierarchy."""
-        role_hierarchy = {
-            User.DEPARTMENT_MANAGER: User.TRANSPORT_MANAGER,
-            User.TRANSPORT_MANAGER: User.CEO,
-            User.CEO: User.FINANCE_MANAGER,
-            User.FINANCE_MANAGER: User.TRANSPORT_MANAGER,
-        }
-        return role_hierarchy.get(current_role, None)  
     def post(self, request, request_id):
-        transport_request = get_object_or_404(TransportRequest, id=request_id)
         action = request.data.get("action")
-
-        if action not in ['forward', 'reject', 'approve']:
-            return Response({"error": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if request.user.role == User.DEPARTMENT_MANAGER and transport_request.requester.department != request.user.department:
-            return Response(
-                {"error": "You can only manage requests from employees in your department."},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        current_role = request.user.role
-        if current_role != transport_request.current_approver_role:
-            return Response({"error": "You are not authorized to act on this request."}, status=status.HTTP_403_FORBIDDEN)
-
-        if action == 'forward':
-            next_role = self.get_next_approver_role(current_role)
-            if not next_role:
-                return Response({"error": "No further approver available."}, status=status.HTTP_400_BAD_REQUEST)
-
-            transport_request.status = 'forwarded'
-            transport_request.current_approver_role = next_role
-
-            # Notify the next approver
-            next_approvers = User.objects.filter(role=next_role, is_active=True)
-            for approver in next_approvers:
-                NotificationService.create_notification('forwarded', transport_request, approver)
-            log_action(transport_request, request.user, 'forwarded')
-
-        elif action == 'reject':
-            transport_request.status = 'rejected'
-            transport_request.rejection_message = request.data.get("rejection_message", "")
-
-            # Notify requester of rejection
-            NotificationService.create_notification(
-                'rejected', transport_request, transport_request.requester, rejector=request.user.full_name
-            )
-            log_action(transport_request, request.user, 'rejected', remarks=transport_request.rejection_message)
-
-        elif action == 'approve' and current_role == User.TRANSPORT_MANAGER:
-            vehicle_id = request.data.get("vehicle_id")
-            vehicle = Vehicle.objects.select_related("driver").filter(id=vehicle_id).first()
-
-            if not vehicle:
-                return Response({"error": "Invalid vehicle ID."}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if vehicle.status != Vehicle.AVAILABLE:
-                return Response({"error":"Vehicle is not available"})
-
-            if not vehicle.driver:
-                return Response({"error": "Selected vehicle does not have an assigned driver."}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Notify requester and driver
-            NotificationService.create_notification(
-                'approved', transport_request, transport_request.requester,
-                approver=request.user.full_name, vehicle=f"{vehicle.model} ({vehicle.license_plate})",
-                driver=vehicle.driver.full_name, destination=transport_request.destination,
-                date=transport_request.start_day.strftime('%Y-%m-%d'), start_time=transport_request.start_time.strftime('%H:%M')
-            )
-
-            NotificationService.create_notification(
-                'assigned', transport_request, vehicle.driver,
-                vehicle=f"{vehicle.model} ({vehicle.license_plate})", destination=transport_request.destination,
-                date=transport_request.start_day.strftime('%Y-%m-%d'), start_time=transport_request.start_time.strftime('%H:%M')
-            )
-
-            transport_request.vehicle = vehicle
-            transport_request.status = 'approved'
-            vehicle.mark_as_in_use()
-            log_action(transport_request, request.user, 'approved', remarks=f"Vehicle: {vehicle.license_plate}")
-
-        else:
-            return Response({"error": f"{current_role} cannot perform {action}."}, status=status.HTTP_403_FORBIDDEN)
-
-        transport_request.save()
+        try:
+            TransportRequestWorkflow.perform(request_id, request.user, action, request.data)
+        except WorkflowError as e:
+            return Response({"error": e.message}, status=e.status_code)
         return Response({"message": f"Request {action}ed successfully."}, status=status.HTTP_200_OK)
 
 class TransportRequestHistoryView(generics.ListAPIView):
+    queryset = TransportRequest.objects.select_related("requester").prefetch_related("employees")
     serializer_class = TransportRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return TransportRequest.objects.filter(action_logs__action_by=user).distinct()
+        return super().get_queryset().filter(action_logs__action_by=user).distinct()
 
 class TripCompletionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, request_id):
-        if 'highcost-requests' in request.path:
-            trip_request = get_object_or_404(HighCostTransportRequest, id=request_id)
-        else:
-            trip_request = get_object_or_404(TransportRequest, id=request_id)
+        model = HighCostTransportRequest if 'highcost-requests' in request.path else TransportRequest
+        trip_request = get_object_or_404(model.objects.select_related("vehicle__driver"), id=request_id)
 
         # Validate vehicle and driver
         if not trip_request.vehicle:
@@ -909,19 +722,24 @@ class NotificationListView(APIView):
         Get user's notifications with pagination
         """
         unread_only = request.query_params.get('unread_only', 'false').lower() == 'true'
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
-
-        notifications = NotificationService.get_user_notifications(
-            request.user.id, 
-            unread_only=unread_only,
-            page=page,
-            page_size=page_size
-        )
+        paginator = KeysetPagination()
+        paginator.check_query_params(request)
+        page_size = paginator.get_page_size(request)
+
+        try:
+            notifications, next_cursor = NotificationService.get_user_notifications(
+                request.user.id,
+                unread_only=unread_only,
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = NotificationSerializer(notifications, many=True)
         return Response({
             'results': serializer.data,
+            'next_cursor': next_cursor,
             'unread_count': NotificationService.get_unread_count(request.user.id)
         })
 
@@ -933,18 +751,14 @@ class NotificationMarkReadView(APIView):
         """
         Mark a notification as read
         """
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                recipient=request.user
-            )
-            notification.mark_as_read()
+        if NotificationService.mark_as_read(notification_id, user_id=request.user.id):
             return Response(status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
-            return Response(
-                {"error": "Notification not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        if Notification.objects.filter(id=notification_id, recipient=request.user).exists():
+            return Response(status=status.HTTP_200_OK)
+        return Response(
+            {"error": "Notification not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
 
 
 class NotificationMarkAllReadView(APIView):
@@ -954,7 +768,7 @@ class NotificationMarkAllReadView(APIView):
         """
         Mark all notifications as read for the current user
         """
-        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        NotificationService.mark_all_as_read(request.user.id)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -974,37 +788,42 @@ class AddMonthlyKilometersView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         vehicle_id = self.kwargs.get('vehicle_id')
-        vehicle = get_object_or_404(Vehicle, id=vehicle_id)
+        vehicle = get_object_or_404(Vehicle.objects.select_related('driver'), id=vehicle_id)
 
         kilometers = serializer.validated_data['kilometers_driven']
         month = serializer.validated_data['month']
 
-        # Save the log
-        MonthlyKilometerLog.objects.create(
-            vehicle=vehicle,
-            kilometers_driven=kilometers,
-            month=month,
-            recorded_by=self.request.user
-        )
+        # Save the log, add the kilometers and notify if the vehicle is due for service
+        record_kilometers([(vehicle, month, kilometers)], recorded_by=self.request.user)
 
-        # Update vehicle total kilometers
-        vehicle.total_kilometers += kilometers
-        vehicle.save()
 
-        # Check service threshold
-        if (vehicle.total_kilometers - vehicle.last_service_kilometers) >= 5000:
-            self.send_service_notification(vehicle)
-              
-        transport_managers = User.objects.filter(role=User.TRANSPORT_MANAGER, is_active=True)
-        general_systems = User.objects.filter(role=User.GENERAL_SYSTEM, is_active=True)
-        driver = vehicle.driver  # or vehicle.assigned_driver depending on your model
+class BulkMonthlyKilometersView(APIView):
+    """
+    Record a month of kilometers for many vehicles at once. Accepts a JSON
+    ``entries`` list or a CSV ``file`` with ``vehicle,month,kilometers_driven``
+    columns; the whole batch is rejected if any entry is invalid.
+    """
+    permission_classes = [IsTransportManager]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
 
-        if not driver:
-            raise ValueError("Vehicle has no assigned driver.")
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload:
+            try:
+                entries = parse_kilometer_csv(upload.read().decode('utf-8-sig'))
+            except (UnicodeDecodeError, csv.Error):
+                return Response({"error": "File must be a UTF-8 CSV."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            entries = request.data.get('entries')
+        if not isinstance(entries, list) or not entries:
+            return Response({"error": "Provide a non-empty entries list or a CSV file."}, status=status.HTTP_400_BAD_REQUEST)
 
-        recipients = list(transport_managers) + list(general_systems) + [driver]
+        try:
+            logs, due_vehicles = ingest_kilometers(entries, recorded_by=request.user)
+        except KilometerBatchError as e:
+            return Response({"errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        NotificationService.send_service_notification(
-            vehicle=vehicle,
-            recipients=recipients
-        )
\ No newline at end of file
+        return Response({
+            "recorded": len(logs),
+            "service_due": [vehicle.license_plate for vehicle in due_vehicles],
+        }, status=status.HTTP_201_CREATED)
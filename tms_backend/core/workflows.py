@@ -0,0 +1,234 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+
+from auth_app.models import User
+from core.availability import VehicleUnavailable, book_vehicle
+from core.models import HighCostTransportRequest, MaintenanceRequest, RefuelingRequest, TransportRequest
+from core.services import NotificationService, log_action
+
+
+class WorkflowError(Exception):
+    """A transition that cannot be applied; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ApprovalWorkflow:
+    """
+    Forward / reject / approve transitions for a request model.
+
+    Subclasses declare the approval chain (``transitions``: current approver role
+    -> next approver role), the role allowed to give final approval and the
+    notification types to emit. ``perform`` locks the request row for the whole
+    transition, so two approvers acting at once are serialized and the second
+    one sees the state left by the first. Notification intents and the action
+    log are written in the same transaction and only delivered once it commits.
+    """
+    model = None
+    transitions = {}
+    approver_role = None
+    notification_types = {}
+    rejection_message_required = True
+    ACTIONS = ('forward', 'reject', 'approve')
+    OPEN_STATUSES = ('pending', 'forwarded')
+
+    def __init__(self, request_obj, user, data):
+        self.request_obj = request_obj
+        self.user = user
+        self.data = data
+        self.changed_fields = {'updated_at'}
+
+    @classmethod
+    def get_queryset(cls):
+        return cls.model.objects.select_related('requester')
+
+    @classmethod
+    def perform(cls, request_id, user, action, data):
+        """Apply ``action`` to the request with ``request_id`` as ``user`` and return the updated request."""
+        if action not in cls.ACTIONS:
+            raise WorkflowError("Invalid action.")
+
+        with transaction.atomic():
+            request_obj = get_object_or_404(cls.get_queryset().select_for_update(of=('self',)), id=request_id)
+            workflow = cls(request_obj, user, data)
+            workflow.check_actor()
+            getattr(workflow, action)()
+            request_obj.save(update_fields=workflow.changed_fields)
+        return request_obj
+
+    def set(self, **values):
+        for field, value in values.items():
+            setattr(self.request_obj, field, value)
+        self.changed_fields.update(values)
+
+    def check_actor(self):
+        if self.user.role != self.request_obj.current_approver_role:
+            raise WorkflowError("You are not authorized to act on this request.", status.HTTP_403_FORBIDDEN)
+        if self.request_obj.status not in self.OPEN_STATUSES:
+            raise WorkflowError(f"This request has already been {self.request_obj.status}.")
+
+    def validate_forward(self):
+        pass
+
+    def forward(self):
+        self.validate_forward()
+        next_role = self.transitions.get(self.user.role)
+        if not next_role:
+            raise WorkflowError("No further approver available.")
+
+        self.set(status='forwarded', current_approver_role=next_role)
+        NotificationService.enqueue(self.notification_types['forward'], self.request_obj, roles=[next_role])
+        log_action(self.request_obj, self.user, 'forwarded')
+
+    def reject(self):
+        rejection_message = (self.data.get("rejection_message") or "").strip()
+        if self.rejection_message_required and not rejection_message:
+            raise WorkflowError("Rejection message is required.")
+
+        self.set(status='rejected', rejection_message=rejection_message)
+        NotificationService.enqueue(
+            self.notification_types['reject'], self.request_obj,
+            recipients=[self.request_obj.requester_id],
+            rejector=self.user.full_name, rejection_reason=rejection_message
+        )
+        log_action(self.request_obj, self.user, 'rejected', remarks=rejection_message)
+
+    def check_approver(self):
+        if self.user.role != self.approver_role:
+            raise WorkflowError(
+                f"{self.user.get_role_display()} cannot approve this request at this stage.",
+                status.HTTP_403_FORBIDDEN
+            )
+
+    def approve(self):
+        self.check_approver()
+        self.set(status='approved')
+        self.notify_approved()
+        log_action(self.request_obj, self.user, 'approved')
+
+    def notify_approved(self):
+        pass
+
+    def require_estimate(self):
+        if not self.request_obj.estimated_distance_km or not self.request_obj.fuel_price_per_liter:
+            raise WorkflowError("You must estimate distance and fuel price before forwarding.")
+
+
+class TransportRequestWorkflow(ApprovalWorkflow):
+    model = TransportRequest
+    transitions = {
+        User.DEPARTMENT_MANAGER: User.TRANSPORT_MANAGER,
+        User.TRANSPORT_MANAGER: User.CEO,
+        User.CEO: User.FINANCE_MANAGER,
+        User.FINANCE_MANAGER: User.TRANSPORT_MANAGER,
+    }
+    approver_role = User.TRANSPORT_MANAGER
+    notification_types = {'forward': 'forwarded', 'reject': 'rejected'}
+    rejection_message_required = False
+
+    def check_actor(self):
+        if self.user.role == User.DEPARTMENT_MANAGER and self.request_obj.requester.department_id != self.user.department_id:
+            raise WorkflowError(
+                "You can only manage requests from employees in your department.", status.HTTP_403_FORBIDDEN
+            )
+        super().check_actor()
+
+    def approve(self):
+        self.check_approver()
+
+        try:
+            vehicle = book_vehicle(self.data.get("vehicle_id"), self.request_obj)
+        except VehicleUnavailable as e:
+            raise WorkflowError(str(e))
+        # Raising rolls back the booking along with the rest of the transition.
+        if not vehicle.driver_id:
+            raise WorkflowError("Selected vehicle does not have an assigned driver.")
+
+        self.set(status='approved', vehicle=vehicle)
+
+        request_obj = self.request_obj
+        vehicle_name = f"{vehicle.model} ({vehicle.license_plate})"
+        trip = {
+            'destination': request_obj.destination,
+            'date': request_obj.start_day.strftime('%Y-%m-%d'),
+            'start_time': request_obj.start_time.strftime('%H:%M'),
+        }
+        NotificationService.enqueue(
+            'approved', request_obj, recipients=[request_obj.requester_id],
+            approver=self.user.full_name, vehicle=vehicle_name, driver=vehicle.driver.full_name, **trip
+        )
+        NotificationService.enqueue('assigned', request_obj, recipients=[vehicle.driver_id], vehicle=vehicle_name, **trip)
+        log_action(request_obj, self.user, 'approved', remarks=f"Vehicle: {vehicle.license_plate}")
+
+
+class HighCostTransportRequestWorkflow(ApprovalWorkflow):
+    model = HighCostTransportRequest
+    transitions = {
+        User.CEO: User.GENERAL_SYSTEM,
+        User.GENERAL_SYSTEM: User.TRANSPORT_MANAGER,
+        User.TRANSPORT_MANAGER: User.BUDGET_MANAGER,
+    }
+    approver_role = User.BUDGET_MANAGER
+    notification_types = {'forward': 'highcost_forwarded', 'reject': 'highcost_rejected'}
+
+    def validate_forward(self):
+        if self.user.role == User.TRANSPORT_MANAGER:
+            self.require_estimate()
+
+    def notify_approved(self):
+        NotificationService.enqueue(
+            'highcost_approved', self.request_obj,
+            recipients=[self.request_obj.requester_id],
+            roles=[User.FINANCE_MANAGER, User.TRANSPORT_MANAGER]
+        )
+
+
+class RefuelingRequestWorkflow(ApprovalWorkflow):
+    model = RefuelingRequest
+    transitions = {
+        User.TRANSPORT_MANAGER: User.GENERAL_SYSTEM,
+        User.GENERAL_SYSTEM: User.CEO,
+        User.CEO: User.BUDGET_MANAGER,
+    }
+    approver_role = User.BUDGET_MANAGER
+    notification_types = {'forward': 'refueling_forwarded', 'reject': 'refueling_rejected'}
+
+    def validate_forward(self):
+        if self.user.role == User.TRANSPORT_MANAGER:
+            self.require_estimate()
+
+    def notify_approved(self):
+        NotificationService.enqueue(
+            'refueling_approved', self.request_obj,
+            recipients=[self.request_obj.requester_id], roles=[User.FINANCE_MANAGER],
+            approver=self.user.full_name
+        )
+
+
+class MaintenanceRequestWorkflow(ApprovalWorkflow):
+    model = MaintenanceRequest
+    transitions = {
+        User.TRANSPORT_MANAGER: User.GENERAL_SYSTEM,
+        User.GENERAL_SYSTEM: User.CEO,
+        User.CEO: User.BUDGET_MANAGER,
+    }
+    approver_role = User.BUDGET_MANAGER
+    notification_types = {'forward': 'maintenance_forwarded', 'reject': 'maintenance_rejected'}
+
+    def validate_forward(self):
+        # General System must submit the files and cost before forwarding.
+        if self.user.role != User.GENERAL_SYSTEM:
+            return
+        missing = []
+        if not self.request_obj.maintenance_letter:
+            missing.append('maintenance_letter')
+        if not self.request_obj.receipt_file:
+            missing.append('receipt_file')
+        if self.request_obj.maintenance_total_cost is None:
+            missing.append('maintenance_total_cost')
+        if missing:
+            raise WorkflowError(f"The following fields must be submitted before forwarding: {', '.join(missing)}")
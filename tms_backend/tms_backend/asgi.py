@@ -12,10 +12,18 @@ import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-from auth_app.routing import websocket_urlpatterns
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tms_backend.settings")
 
+# Initialise Django before importing consumers, which import models.
+django_asgi_application = get_asgi_application()
+
+from auth_app.authentication import JWTAuthMiddleware  # noqa: E402
+from auth_app.routing import websocket_urlpatterns as auth_websocket_urlpatterns  # noqa: E402
+from core.routing import websocket_urlpatterns as core_websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+    "http": django_asgi_application,
+    "websocket": AuthMiddlewareStack(
+        JWTAuthMiddleware(URLRouter(auth_websocket_urlpatterns + core_websocket_urlpatterns))
+    ),
 })
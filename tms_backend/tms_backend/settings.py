@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
+import json
 import os
 from dotenv import load_dotenv
 
@@ -22,11 +23,23 @@ load_dotenv(override=True)
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'  
-EMAIL_PORT = 587  
-EMAIL_USE_TLS = True 
+EMAIL_HOST = os.getenv("EMAIL_HOST", 'smtp.gmail.com')
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
 EMAIL_HOST_USER=os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD= os.getenv("EMAIL_HOST_PASSWORD")
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", 'mebrhit765@gmail.com')
+
+# "outbox": emails are queued as OutboundEmail rows and sent by the
+# `send_queued_emails` worker. "inline": sent right after commit in the same
+# process (local development).
+EMAIL_DELIVERY_MODE = os.getenv("EMAIL_DELIVERY_MODE", "outbox")
+EMAIL_MAX_ATTEMPTS = 6
+# Seconds before the first retry; doubled on every further failure.
+EMAIL_RETRY_BACKOFF = 60
+# Seconds a claimed batch stays hidden from other workers while it is sent.
+EMAIL_CLAIM_TIMEOUT = 1800
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -82,6 +95,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,8 +104,45 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "core.middleware.RequestProfilerMiddleware",
 ]
 
+# Per-request wall time, query count/time and response size, exported at
+# /metrics/ for system admins or scrapers sending X-Metrics-Token. Requests
+# slower than REQUEST_METRICS_SLOW_SECONDS are logged as well.
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() == "true"
+REQUEST_METRICS_SLOW_SECONDS = float(os.getenv("REQUEST_METRICS_SLOW_SECONDS", "1.0"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# A system admin sending `X-Profile: 1` (or `?profile=1`) gets that request run
+# under cProfile and tracemalloc; the newest REQUEST_PROFILE_KEEP profiles are
+# kept in REQUEST_PROFILE_DIR and served at /profiles/.
+REQUEST_PROFILING_ENABLED = os.getenv("REQUEST_PROFILING_ENABLED", "true").lower() == "true"
+REQUEST_PROFILE_DIR = os.getenv("REQUEST_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+REQUEST_PROFILE_KEEP = 100
+REQUEST_PROFILE_TRACE_FRAMES = 1
+
+# One JSON object per line (LOG_FORMAT=json) so extra fields such as a slow
+# request's timings stay queryable; LOG_FORMAT=text for local development.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "tms_backend.log.JsonFormatter"},
+        "text": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": os.getenv("LOG_FORMAT", "json"),
+        },
+    },
+    "root": {
+        "handlers": ["console"],
+        "level": os.getenv("LOG_LEVEL", "INFO"),
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # 'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -113,6 +164,14 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Authenticate API requests from the role/department claims in the access
+# token instead of loading the user row; the full row is fetched lazily.
+# Only honoured with a shared cache (REDIS_URL), see the auth_app.E001 check.
+JWT_STATELESS_USER = os.getenv("JWT_STATELESS_USER", "false").lower() == "true"
+
+# Seconds a process trusts its own copy of the token revocation cache.
+TOKEN_REVOCATION_LOCAL_TTL = 5
+
 ROOT_URLCONF = "tms_backend.urls"
 
 TEMPLATES = [
@@ -134,12 +193,88 @@ TEMPLATES = [
 WSGI_APPLICATION = "tms_backend.wsgi.application"
 ASGI_APPLICATION = "tms_backend.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",  # Use Redis for production
-    },
+REDIS_URL = os.getenv("REDIS_URL")
+# Any Redis-protocol server works here; without one the in-memory layer is
+# used, which only reaches websockets held by the same process.
+CHANNEL_REDIS_URL = os.getenv("CHANNEL_REDIS_URL", REDIS_URL)
+
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [CHANNEL_REDIS_URL],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Whether CACHES["default"] is one cache seen by every process. Values that
+# other processes have to see (unread counts, token revocations and versions)
+# are only trusted from the cache when it is; a per-process LocMemCache would
+# leave every other worker serving stale values.
+SHARED_CACHE = bool(REDIS_URL)
+
+# Seconds after a registration event during which further events for the
+# same user are dropped, so repeated saves reach the admin websocket as one
+# event (0 sends every one), and how many pending registrations an admin
+# receives on connect.
+ADMIN_BROADCAST_WINDOW = 1.0
+ADMIN_SNAPSHOT_SIZE = 10
+
+# Seconds a cached unread-notification count lives before it is recomputed.
+UNREAD_COUNT_CACHE_TIMEOUT = 300
+
+# "outbox": approval views only record NotificationIntent rows and the
+# `deliver_notifications` worker expands them. "inline": deliver right after
+# commit in the same process (local development and tests). A failed intent
+# is retried after NOTIFICATION_INTENT_RETRY_BACKOFF seconds, doubling each time.
+NOTIFICATION_DELIVERY_MODE = os.getenv("NOTIFICATION_DELIVERY_MODE", "outbox")
+NOTIFICATION_INTENT_MAX_ATTEMPTS = 5
+NOTIFICATION_INTENT_RETRY_BACKOFF = 10
+
+# Kilometers a vehicle may run between services. A vehicle model's interval
+# wins over its fuel type's; everything else uses the default. Override with
+# a JSON object, e.g. VEHICLE_SERVICE_INTERVALS_KM='{"fuel_type": {"naphtha": 7500}}'.
+VEHICLE_SERVICE_INTERVALS_KM = {
+    "default": 5000,
+    "fuel_type": {},
+    "model": {},
+    **json.loads(os.getenv("VEHICLE_SERVICE_INTERVALS_KM", "{}")),
 }
 
+# `purge_retention` archives rows older than these many days to gzip NDJSON
+# files under RETENTION_ARCHIVE_DIR, then deletes them in batches of
+# RETENTION_BATCH_SIZE rows with RETENTION_BATCH_PAUSE seconds in between.
+RETENTION_DAYS = {
+    "notifications": int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90")),
+    "action-log": int(os.getenv("ACTION_LOG_RETENTION_DAYS", "730")),
+    "transport-action-log": int(os.getenv("ACTION_LOG_RETENTION_DAYS", "730")),
+    "user-status-history": int(os.getenv("USER_STATUS_HISTORY_RETENTION_DAYS", "730")),
+}
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_PAUSE = 0.2
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -189,10 +324,21 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = "en-us"
 
+# The locales users can pick as preferred_language; each one other than
+# English ships a catalogue under locale/.
+LANGUAGES = [
+    ("en", "English"),
+    ("am", "Amharic"),
+]
+
 TIME_ZONE = "UTC"
 
 USE_I18N = True
 
+# Translation catalogues for notifications, rendered in each user's preferred_language.
+# Rebuild them with `python manage.py makemessages -l am` and `compilemessages`.
+LOCALE_PATHS = [BASE_DIR / "locale"]
+
 USE_TZ = True
 
 
@@ -9,7 +9,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
-from core.views import AddMonthlyKilometersView, AvailableDriversView, AvailableVehiclesListView, MyAssignedVehicleView, VehicleViewSet
+from core.views import AddMonthlyKilometersView, ArchiveLookupView, AvailableDriversView, AvailableVehiclesListView, BulkMonthlyKilometersView, ExportView, FleetDashboardView, MetricsView, MyAssignedVehicleView, RequestProfileDetailView, RequestProfileDownloadView, RequestProfileListView, VehicleAvailabilityPlanView, VehicleViewSet
 
 router = DefaultRouter()
 router.register(r'vehicles',VehicleViewSet)
@@ -18,10 +18,19 @@ urlpatterns = [
     path("transport-requests/",include(core_urls)),
     path('available-drivers/', AvailableDriversView.as_view(), name='available-drivers'),
     path('available-vehicles/', AvailableVehiclesListView.as_view(), name='available-vehicles'), 
+    path('available-vehicles/plan/', VehicleAvailabilityPlanView.as_view(), name='available-vehicles-plan'),
     path('my-vehicle/', MyAssignedVehicleView.as_view(), name='my-assigned-vehicle'),
+    path('dashboard/', FleetDashboardView.as_view(), name='fleet-dashboard'),
+    path('exports/<slug:dataset>/', ExportView.as_view(), name='export'),
+    path('archive/<slug:policy>/<int:pk>/', ArchiveLookupView.as_view(), name='archive-lookup'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('profiles/', RequestProfileListView.as_view(), name='profile-list'),
+    path('profiles/<slug:profile_id>/', RequestProfileDetailView.as_view(), name='profile-detail'),
+    path('profiles/<slug:profile_id>/download/', RequestProfileDownloadView.as_view(), name='profile-download'),
     path("maintenance-requests/",include(maintenance_urls)),
     path("refueling_requests/",include(refueling_urls)),
     path("highcost-requests/",include(highcost_urls)),
+    path("vehicles/monthly-kilometers/bulk/", BulkMonthlyKilometersView.as_view(), name="bulk-monthly-kilometers"),
     path("vehicles/<int:vehicle_id>/add-monthly-kilometers/",AddMonthlyKilometersView.as_view(),name="add-monthly-kilometers"),
     path("",include(router.urls))
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)